@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+HTTP API for title generation (plain ASGI, served with uvicorn).
+
+    POST /v1/title   {"old_title": "...", "description": "..."}
+    POST /v1/titles  {"items": [{"old_title": "...", "description": "..."}, ...]}
+    GET  /health
+
+Concurrent /v1/title requests are micro-batched: requests arriving within a
+few milliseconds share one packed upstream completion. The completion backend
+is chosen with TITLE_BACKEND as in the app.
+
+Run:
+    python api_server.py --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from microbatch import MicroBatcher
+from scheduler import get_scheduler
+from title_engine import request_title, request_titles_packed
+
+MAX_BATCH = int(os.getenv('API_MAX_BATCH', '8'))
+MAX_WAIT_MS = float(os.getenv('API_MAX_WAIT_MS', '5'))
+MAX_BULK_ITEMS = int(os.getenv('API_MAX_BULK_ITEMS', '1000'))
+
+
+class RequestError(ValueError):
+    """Invalid request payload (400); any other error is the upstream's (502)"""
+
+
+def _result(title, cost, input_tokens, output_tokens, **extra) -> Dict:
+    return {
+        'title': title,
+        'cost': cost,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        **extra,
+    }
+
+
+def generate_batch(items: List[Dict]) -> List[Dict]:
+    """Packed completion for a micro-batch, falling back to one request per item
+
+    In the fallback a failed item is returned as its exception, so only that
+    caller gets the error.
+    """
+    if len(items) > 1:
+        try:
+            return [
+                _result(*result, batch_size=len(items))
+                for result in request_titles_packed(items)
+            ]
+        except ValueError:
+            pass  # unparseable packed response: retry individually below
+
+    results = []
+    for item in items:
+        try:
+            results.append(_result(*request_title(item['old_title'], item['description']), batch_size=1))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def generate_bulk(items: List[Dict]) -> List[Dict]:
+    """Bulk endpoint: items queued on the shared scheduler as one job, results in input order"""
+    results = [None] * len(items)
+
+    def generate(position):
+        item = items[position]
+        return request_title(item['old_title'], item['description'])
+
+    def on_done(position, result, error):
+        results[position] = {'error': str(error)} if error is not None else _result(*result)
+
+    get_scheduler().run_job(range(len(items)), generate, on_done, name='api bulk')
+    return results
+
+
+def parse_item(payload: Dict) -> Dict:
+    description = str(payload.get('description') or payload.get('bullet_points') or '').strip()
+    if not description:
+        raise RequestError("'description' is required")
+    return {'old_title': str(payload.get('old_title') or ''), 'description': description}
+
+
+class TitleAPI:
+    """Minimal ASGI application; no web framework needed"""
+
+    def __init__(self):
+        self.batcher = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.batcher = MicroBatcher(generate_batch, MAX_BATCH, MAX_WAIT_MS)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.batcher is not None:
+                    await self.batcher.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_json(self, receive) -> Dict:
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        return json.loads(body or b'{}')
+
+    async def _send_json(self, send, status: int, payload) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _http(self, scope, receive, send):
+        method, path = scope['method'], scope['path']
+        if self.batcher is None:
+            self.batcher = MicroBatcher(generate_batch, MAX_BATCH, MAX_WAIT_MS)
+
+        try:
+            if method == 'GET' and path == '/health':
+                await self._send_json(send, 200, {
+                    'status': 'ok',
+                    'microbatch': self.batcher.stats(),
+                    'jobs': get_scheduler().stats(),
+                })
+
+            elif method == 'POST' and path == '/v1/title':
+                item = parse_item(await self._read_json(receive))
+                await self._send_json(send, 200, await self.batcher.submit(item))
+
+            elif method == 'POST' and path == '/v1/titles':
+                payload = await self._read_json(receive)
+                items = [parse_item(item) for item in payload.get('items', [])]
+                if len(items) > MAX_BULK_ITEMS:
+                    raise RequestError(f"At most {MAX_BULK_ITEMS} items per request")
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(None, generate_bulk, items)
+                await self._send_json(send, 200, {'results': results})
+
+            else:
+                await self._send_json(send, 404, {'error': 'not found'})
+
+        except (RequestError, json.JSONDecodeError) as e:
+            await self._send_json(send, 400, {'error': str(e)})
+        except Exception as e:
+            await self._send_json(send, 502, {'error': f"Error generating title: {e}"})
+
+
+app = TitleAPI()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Amazon Title Generator API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn is required to serve the API: pip install uvicorn")
+        return
+
+    print(f"🚀 Serving title API at http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == "__main__":
+    main()
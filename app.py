@@ -2,15 +2,35 @@ import streamlit as st
 import pandas as pd
 import openai
 from typing import List, Dict
-from jinja2 import Template
 import os
 from dotenv import load_dotenv
 import io
-import time
+from title_engine import (DEFAULT_MODEL, MARKETPLACES, MARKETPLACES_PROMPT_VERSION, MODEL_PRICING, PROMPT_VERSION,
+                          request_title)
+from cascade import ModelCascade, cascade_from_env
+from hedging import Hedger
+from ledger import DEFAULT_MARKETPLACE, default_user, get_ledger, usage_context
+from backends import BACKENDS, DEFAULT_BACKEND
+from cassette import CASSETTE_MODE, CASSETTE_PATH, REPLAY
+from ingest import load_catalogue, read_source
+from store import ResultStore, new_job_id
+from client_pool import get_client_pool
+from scheduler import PRIORITY_WEIGHTS, get_scheduler
+from progress import ProgressReporter, ThroughputEstimator, format_progress
+from result_buffer import ResultBuffer
+from product_matching import match_products, matched_examples
+from keyword_index import build_keyword_index, relevant_keywords, title_pattern
+from prompt_budget import example_keywords, fit_examples
+from guidelines import missing_title_keywords_batch
+from incremental import (FINGERPRINT_COLUMN, examples_fingerprint, previous_results_index,
+                         reuse_result, row_fingerprint)
 
 # Load environment variables
 load_dotenv()
 
+# 'disk' shares st.cache_data entries between app workers (launcher.py sets it)
+CACHE_PERSIST = os.getenv('TITLE_CACHE_PERSIST') or None
+
 # Page configuration
 st.set_page_config(
     page_title="Amazon Title Generator",
@@ -19,30 +39,36 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Pricing for gpt-4o-mini (June 2024)
-INPUT_COST_PER_1M = 0.06   # USD/1M
-OUTPUT_COST_PER_1M = 2.40  # USD/1M
-
 def initialize_openai():
-    """Initialize OpenAI client with API key"""
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        st.error("❌ OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
+    """Initialize the OpenAI client pool from the environment and test it"""
+    if CASSETTE_MODE == REPLAY:
+        st.info(f"📼 Replaying recorded responses from {CASSETTE_PATH}; no API calls are made.")
+        return True
+
+    try:
+        pool = get_client_pool()
+    except ValueError as e:
+        # No key configured, or OPENAI_BACKENDS can't be parsed; the message says which
+        st.error(f"❌ {e}")
         return False
     
-    openai.api_key = api_key
+    # Keep the module-level key for any direct openai calls
+    openai.api_key = pool.backends[0].api_key
     
     # Test API connection with timeout
     try:
         with st.spinner("Testing OpenAI connection..."):
-            response = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
+            response = pool.chat_completion(
+                model=DEFAULT_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant."},
                     {"role": "user", "content": "Hello, can you respond?"}
                 ],
                 timeout=10  # 10 second timeout
             )
+        if len(pool.backends) > 1:
+            st.caption(f"Load balancing across {len(pool.backends)} backends: "
+                       + ", ".join(b.name for b in pool.backends))
         st.success("✅ OpenAI connection successful!")
         return True
     except Exception as e:
@@ -50,132 +76,251 @@ def initialize_openai():
         st.info("💡 Make sure your API key is correct and you have sufficient credits.")
         return False
 
-def create_prompt(old_title: str, description: str, examples: List[Dict] = None) -> str:
-    """Create a few-shot prompt with examples using Jinja2 template"""
-    
-    template_string = """Generate Amazon product titles from descriptions. Follow these examples:
+def generate_title(old_title: str, description: str, temperature: float = 1,
+                   models: List[str] = None, backend: str = None) -> tuple:
+    """Generate a single title for a given product description"""
+    try:
+        # Interactive lane: served ahead of any queued batch rows
+        scheduler = get_scheduler()
+        with st.spinner("Generating title..."):
+            if models:
+                cascade = ModelCascade(models, backend)
+                return scheduler.call(cascade.generate, old_title, description, None, temperature)[:4]
+            return scheduler.call(request_title, old_title, description, None, temperature, backend=backend)
+        
+    except Exception as e:
+        st.error(f"❌ Error generating title: {str(e)}")
+        return None, None, None, None
 
-    {# Built-in few-shot examples #}
-    {% set builtin_examples = [
-      {
-        'Bullet Points': 'Wireless Bluetooth headphones with active noise cancellation, 30-hour battery life, premium leather ear cushions, compatible with iPhone and Android devices, includes carrying case',
-        'Title': 'Wireless Bluetooth Headphones with Active Noise Cancelling, 30H Battery Life, Premium Leather Cushions - Compatible iPhone Android with Carrying Case'
-      },
-      {
-        'Bullet Points': 'Stainless steel water bottle, double wall vacuum insulated, keeps drinks cold 24 hours hot 12 hours, leak-proof design, 32 oz capacity, BPA free, available in multiple colors',
-        'Title': 'Stainless Steel Water Bottle 32oz - Double Wall Vacuum Insulated, Keeps Cold 24H Hot 12H, Leak-Proof BPA Free'
-      },
-      {
-        'Bullet Points': 'Gaming mechanical keyboard with RGB backlighting, blue switches, anti-ghosting technology, aluminum frame, detachable USB-C cable, compatible with PC Mac',
-        'Title': 'Gaming Mechanical Keyboard RGB Backlit Blue Switches - Anti-Ghosting Aluminum Frame, Detachable USB-C Cable PC Mac Compatible'
-      },
-      {
-        'Bullet Points': 'Yoga mat non-slip surface, eco-friendly TPE material, 6mm thick extra cushioning, lightweight portable design, includes carrying strap, 72 inch length',
-        'Title': 'Yoga Mat Non-Slip 6mm Thick Extra Cushion - Eco-Friendly TPE Material 72" Lightweight Portable with Carrying Strap'
-      },
-      {
-        'Bullet Points': 'Smart fitness tracker with heart rate monitor, sleep tracking, waterproof IP68 rating, 7-day battery life, step counter, smartphone notifications',
-        'Title': 'Smart Fitness Tracker Heart Rate Monitor Sleep Tracking - Waterproof IP68, 7-Day Battery, Step Counter Smartphone Notifications'
-      }
-    ] %}
+@st.cache_data(show_spinner=False, persist=CACHE_PERSIST)
+def load_competitor_catalogue(sources: tuple) -> pd.DataFrame:
+    """Parse all sheets of the uploaded competitor workbooks in parallel (cached per upload)"""
+    return load_catalogue(list(sources))
 
-    {% for example in builtin_examples %}
-    Example {{ loop.index }}:
-    Description: {{ example['Bullet Points'] }}
-    Title: {{ example['Title'] }}
+def save_batch_job(mode: str, inputs_df: pd.DataFrame, results_df: pd.DataFrame,
+                   total_cost: float, examples_df: pd.DataFrame = None, job_id: str = None) -> str:
+    """Persist a finished batch (inputs, titles, metadata) to the Parquet store"""
+    store = ResultStore()
+    job_id = job_id or new_job_id()
+    store.write_inputs(job_id, inputs_df, 'catalogue')
+    if examples_df is not None and not examples_df.empty:
+        store.write_inputs(job_id, examples_df, 'examples')
+    store.append_results(job_id, results_df)
+    store.write_job_metadata(
+        job_id,
+        mode=mode,
+        rows=len(inputs_df),
+        titles=len(results_df),
+        total_cost=float(total_cost),
+        input_tokens=int(results_df['input_tokens'].sum()) if not results_df.empty else 0,
+        output_tokens=int(results_df['output_tokens'].sum()) if not results_df.empty else 0,
+    )
+    return job_id
 
-    {% endfor %}
+def text_column(df: pd.DataFrame, candidates: tuple) -> pd.Series:
+    """First of the candidate columns present, as strings ('' for blanks)"""
+    column = next((c for c in candidates if c in df.columns), None)
+    if column is None:
+        return pd.Series([''] * len(df), dtype=object)
+    return df[column].map(lambda value: str(value) if pd.notna(value) else '')
 
-    {# Additional custom examples if provided #}
-    {% if examples %}
-    {% for example in examples[:5] %}
-    Example {{ loop.index + builtin_examples|length }}:
-    Description: {{ example['Bullet Points'] }}
-    Title: {{ example['Title'] }}
+def sheet_missing_keywords(df: pd.DataFrame, title_columns: tuple) -> List[List[str]]:
+    """Old-title keywords missing from each row's description, computed once for the sheet"""
+    return missing_title_keywords_batch(
+        text_column(df, title_columns), text_column(df, ('Bullet Points', 'bullet_points', 'Description'))
+    )
 
-    {% endfor %}
-    {% endif %}
+def run_batch_requests(tasks: List[Dict], examples: List[Dict], total_rows: int,
+                       results: ResultBuffer, models: List[str] = None, backend: str = None,
+                       weight: float = 1.0, marketplaces: List[str] = None) -> float:
+    """Generate titles for row tasks through the shared scheduler, filling results by row index
 
-    Guidelines:
-    - Keep titles under 200 characters, with critical keywords in the first 80 characters.
-    - Include keywords from the {{ old_title }} that are missing in the description (MUST include within the first 80 characters if missing from the description).
-    - Avoid brand names like Ledsone.
-    - Must include the shape and pack details if available.
-    - Avoid using synonyms (e.g., 'retro' and 'vintage' are synonyms).
-    - The first 80 characters should provide a clear description of the product; avoid compatibility information.
-    - Generate Amazon specific title considering above instructions.
+    With marketplaces, each row's request returns a title per marketplace,
+    stored in title_<code> / issues_<code> columns; new_title holds the first.
+    """
+    scheduler = get_scheduler()
+    controller = scheduler.controller
+    # Requests slower than the running p95 get a duplicate, so stragglers don't set the finish time
+    hedger = Hedger(scheduler=scheduler)
+    cascade = ModelCascade(models, backend, hedger)
+    total_cost = 0
+    # Rows without a task (reused or skipped) count as already finished
+    finished = total_rows - len(tasks)
+    
+    progress_bar = st.progress(finished / total_rows if total_rows else 0)
+    status_text = st.empty()
+    
+    def render(snapshot):
+        status_text.text(
+            f"{format_progress(snapshot)} · "
+            f"{scheduler.queue_depth()} rows queued across all jobs · "
+            f"shared concurrency limit {controller.current_limit}"
+        )
+        progress_bar.progress(min(snapshot['finished'] / total_rows, 1.0) if total_rows else 1.0)
+    
+    # Rows finish many times a second; the UI is refreshed at a fixed rate instead
+    progress = ProgressReporter(ThroughputEstimator(total_rows, finished), render)
+    
+    def generate(task):
+        if marketplaces:
+            return cascade.generate_marketplaces(task['old_title'], task['bullet_points'], marketplaces,
+                                                 task.get('examples', examples), prompt_vars=task.get('prompt_vars'))
+        return cascade.generate(task['old_title'], task['bullet_points'], task.get('examples', examples),
+                                prompt_vars=task.get('prompt_vars'))
+    
+    # Rows share the process-wide rate budget with every other session's jobs
+    job = scheduler.submit_job(tasks, generate, name=f"{backend or DEFAULT_BACKEND} batch", weight=weight)
+    
+    def on_done(task, result, error):
+        nonlocal total_cost
+        cost = 0.0
+        if error is not None:
+            st.error(f"Row {task['row'] + 1}: Failed to generate title ({error})")
+        elif marketplaces:
+            titles, cost, input_tokens, output_tokens, model, issues = result
+            locale_columns = {}
+            for code in marketplaces:
+                locale_columns[f"title_{code}"] = titles[code]
+                locale_columns[f"issues_{code}"] = ', '.join(issues[code])
+            results.set(task['row'], titles[marketplaces[0]], cost, input_tokens, output_tokens, model,
+                        '; '.join(f"{code}: {', '.join(issues[code])}" for code in marketplaces if issues[code]),
+                        **locale_columns)
+            total_cost += cost
+        else:
+            title, cost, input_tokens, output_tokens, model, issues = result
+            results.set(task['row'], title, cost, input_tokens, output_tokens, model, ', '.join(issues))
+            total_cost += cost
+        
+        progress.update(cost, error is not None, job.retried)
+    
+    try:
+        for _ in range(len(tasks)):
+            on_done(*job.outcomes.get())
+    finally:
+        scheduler.cancel(job)
+        hedger.close()
+        ledger = get_ledger()
+        if ledger is not None:
+            ledger.flush()
+    
+    # Duplicate requests are paid for too
+    hedging = hedger.report()
+    total_cost += hedging['hedge_cost']
+    summary = progress.estimator.snapshot()
+    progress_bar.empty()
+    status_text.empty()
+    
+    if tasks:
+        avg_latency = controller.average_latency()
+        # Output tokens are the expensive side of every call, so report them per generated row
+        generated = [task['row'] for task in tasks if results.filled[task['row']]]
+        output_tokens = results.output_tokens[generated]
+        st.caption(
+            f"⚙️ {summary['rows_per_sec']:.1f} rows/s; "
+            + (f"{output_tokens.mean():.1f} output tokens/row (max {output_tokens.max()}); "
+               if generated else "")
+            + (f"{summary['failed']} failed, {summary['retried']} retried; "
+               if summary['failed'] or summary['retried'] else "")
+            + f"shared adaptive concurrency at {controller.current_limit} in-flight requests"
+            + (f", average latency {avg_latency:.2f}s" if avg_latency else "")
+            + (f", {controller.throttled} throttled responses retried" if controller.throttled else "")
+        )
+        if marketplaces and generated:
+            passed = [
+                f"{code} {sum(not issues for issues in results.column(f'issues_{code}', generated))}/{len(generated)}"
+                for code in marketplaces
+            ]
+            st.caption(f"🌍 {len(marketplaces)} marketplaces per request; titles passing the guideline checks: "
+                       + ", ".join(passed))
+        if hedging['hedged']:
+            st.caption(
+                f"🏁 {hedging['hedged']} of {hedging['requests']} requests ran past the p95 latency and were "
+                f"hedged ({hedging['hedge_wins']} duplicates finished first), "
+                f"duplicate spend ${hedging['hedge_cost']:.4f} included in the total"
+                + (f"; {hedging['abandoned_in_flight']} abandoned requests were still running, "
+                   f"so their cost is in the usage ledger but not in this total"
+                   if hedging['abandoned_in_flight'] else "")
+            )
+        pool = get_client_pool() if (backend or DEFAULT_BACKEND) == 'openai' else None
+        if pool and len(pool.backends) > 1:
+            st.dataframe(pd.DataFrame(pool.stats()), use_container_width=True)
+        if len(cascade.models) > 1:
+            st.subheader("Model Cascade")
+            st.dataframe(pd.DataFrame(cascade.report()), use_container_width=True)
+    
+    return total_cost
 
-    Now generate a title for:
-    Description: {{ description }}
-    Title:"""
+def show_prompt_size_report(prompt_tokens: List[int], token_budget: int):
+    """Histogram of per-row prompt sizes against the token budget"""
+    sizes = pd.Series(prompt_tokens)
+    within = (sizes <= token_budget).mean()
+    
+    st.subheader("Prompt Size")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Within Budget", f"{within:.0%}")
+    with col2:
+        st.metric("Median Prompt Tokens", int(sizes.median()))
+    with col3:
+        st.metric("Max Prompt Tokens", int(sizes.max()))
+    
+    bins = pd.cut(sizes, bins=min(20, max(1, sizes.nunique())))
+    histogram = bins.value_counts(sort=False)
+    histogram.index = [f"{int(i.left)}-{int(i.right)}" for i in histogram.index]
+    st.bar_chart(histogram)
 
-    template = Template(template_string)
-    prompt = template.render(
-        old_title=old_title or '',
-        description=description or '',
-        examples=examples or []
-    )
-    return prompt
+@st.cache_data(show_spinner=False, persist=CACHE_PERSIST)
+def load_keyword_index(competitors_df: pd.DataFrame) -> Dict:
+    """Build the competitor keyword index once per competitors file"""
+    return build_keyword_index(competitors_df)
 
-def generate_title(old_title: str, description: str, temperature: float = 1) -> tuple:
-    """Generate a single title for a given product description"""
-    try:
-        prompt = create_prompt(old_title, description, None)
-        
-        with st.spinner("Generating title..."):
-            response = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert at creating compelling Amazon product titles that drive sales and improve search visibility."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=temperature,
-                max_tokens=100,
-                top_p=1,
-                frequency_penalty=0,
-                presence_penalty=0,
-                timeout=30  # 30 second timeout
-            )
+@st.cache_data(show_spinner="Matching products to competitors...", persist=CACHE_PERSIST)
+def load_matched_examples(competitors_df: pd.DataFrame, test_df: pd.DataFrame) -> Dict[int, List[Dict]]:
+    """Each test row's nearest competitor listings, as few-shot examples keyed by row position"""
+    return matched_examples(match_products(test_df, competitors_df, top_k=5), competitors_df)
 
-        title = response.choices[0].message.content.strip()
-        
-        # Calculate cost
-        input_tokens = response['usage']['total_tokens'] - response['usage']['completion_tokens']
-        output_tokens = response['usage']['completion_tokens']
-        
-        cost = (
-            (input_tokens / 1000000) * INPUT_COST_PER_1M +
-            (output_tokens / 1000000) * OUTPUT_COST_PER_1M
-        )
-        
-        return title, cost, input_tokens, output_tokens
-        
-    except Exception as e:
-        st.error(f"❌ Error generating title: {str(e)}")
-        return None, None, None, None
+def process_batch_data_with_examples(examples_df: pd.DataFrame, test_df: pd.DataFrame,
+                                     previous_results: pd.DataFrame = None,
+                                     models: List[str] = None, backend: str = None,
+                                     keyword_index: Dict = None, token_budget: int = None,
+                                     weight: float = 1.0, row_examples: Dict[int, List[Dict]] = None,
+                                     marketplaces: List[str] = None) -> pd.DataFrame:
+    """Process batch data using examples from competitors file and test data
 
-def process_batch_data_with_examples(examples_df: pd.DataFrame, test_df: pd.DataFrame) -> pd.DataFrame:
-    """Process batch data using examples from competitors file and test data"""
-    results = []
-    total_cost = 0
+    When previous_results is given, rows whose fingerprint is unchanged are
+    reused from it and only new or edited rows are sent to the API. With a
+    keyword_index, each prompt carries the row's relevant competitor keywords
+    instead of the raw competitor examples. With a token_budget, examples are
+    ranked, trimmed and dropped per row so each prompt fits the budget. With
+    row_examples (row position -> matched competitors), each row is prompted
+    with its own matched competitors instead of the shared examples. With
+    marketplaces, one request per row returns the title for every marketplace.
+    """
+    results = ResultBuffer(len(test_df))
+    old_titles, descriptions = [''] * len(test_df), [''] * len(test_df)
+    tasks = []
     
     # Convert examples DataFrame to list of dictionaries for few-shot learning
     examples_list = []
     if not examples_df.empty:
         examples_list = examples_df[['Title', 'Bullet Points']].to_dict(orient='records')
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    if keyword_index is not None:
+        examples_list = []
+        examples_key = f"keywords-{keyword_index['version']}"
+    else:
+        examples_key = examples_fingerprint(examples_list)
+    if token_budget:
+        examples_key = f"{examples_key}-budget{token_budget}"
+        example_words = example_keywords(examples_list)
+    # The marketplace prompt has its own template version
+    marketplaces_key = (f"-marketplaces-{'+'.join(marketplaces)}-{MARKETPLACES_PROMPT_VERSION}"
+                        if marketplaces else '')
+    examples_key += marketplaces_key
+    previous_index = previous_results_index(previous_results)
+    missing_keywords = sheet_missing_keywords(test_df, ('Title ', 'Title', 'title'))
     
-    for idx, row in test_df.iterrows():
-        status_text.text(f"Processing row {idx + 1} of {len(test_df)}...")
-        
+    for position, (idx, row) in enumerate(test_df.iterrows()):
         # Handle different column names for test data
         old_title = ''
         description = ''
@@ -197,87 +342,67 @@ def process_batch_data_with_examples(examples_df: pd.DataFrame, test_df: pd.Data
         if not description or description.strip() == '':
             st.warning(f"Row {idx + 1}: No description found")
             continue
-            
-        # Generate title with examples
-        title, cost, input_tokens, output_tokens = generate_title_with_examples(
-            old_title, description, examples_list
-        )
+        old_titles[position], descriptions[position] = old_title, description
+        
+        row_examples_list = None
+        row_examples_key = examples_key
+        if row_examples and keyword_index is None and row_examples.get(position):
+            row_examples_list = row_examples[position]
+            row_examples_key = f"matched-{examples_fingerprint(row_examples_list)}"
+            if token_budget:
+                row_examples_key = f"{row_examples_key}-budget{token_budget}"
+            row_examples_key += marketplaces_key
+        
+        task = {
+            'row': position,
+            'old_title': old_title,
+            'bullet_points': description,
+            'prompt_vars': {'missing_keywords': missing_keywords[position]}
+        }
+        if row_examples_list is not None:
+            task['examples'] = row_examples_list
+        if keyword_index is not None:
+            category = row.get('category')
+            task['prompt_vars'].update(
+                keywords=relevant_keywords(keyword_index, old_title, description, category),
+                title_pattern=title_pattern(keyword_index, category)
+            )
+        if token_budget:
+            task['examples'], prompt_tokens = fit_examples(
+                old_title, description, task.get('examples', examples_list), token_budget,
+                task.get('prompt_vars'), None if row_examples_list is not None else example_words
+            )
+            # The examples chosen from the whole catalogue are what reach the prompt
+            row_examples_key = f"{row_examples_key}-fitted-{examples_fingerprint(task['examples'])}"
         
-        if title:
-            results.append({
-                'old_title': old_title,
-                'bullet_points': description,
-                'new_title': title,
-                'cost': cost,
-                'input_tokens': input_tokens,
-                'output_tokens': output_tokens
-            })
-            total_cost += cost
-        else:
-            st.error(f"Row {idx + 1}: Failed to generate title")
+        fingerprint = row_fingerprint(old_title, description, row_examples_key, PROMPT_VERSION)
+        if fingerprint in previous_index:
+            results.set(position, **reuse_result(previous_index[fingerprint]))
+            continue
         
-        progress_bar.progress((idx + 1) / len(test_df))
-        time.sleep(0.1)  # Small delay to prevent rate limiting
+        # Row metadata goes straight into the result buffer; tasks carry only prompt inputs
+        results.set_extra(position, **{FINGERPRINT_COLUMN: fingerprint, 'reused': False})
+        if token_budget:
+            results.set_extra(position, prompt_tokens=prompt_tokens)
+        tasks.append(task)
     
-    progress_bar.empty()
-    status_text.empty()
+    total_cost = run_batch_requests(tasks, examples_list, len(test_df), results, models, backend, weight,
+                                    marketplaces)
     
-    return pd.DataFrame(results), total_cost
-
-def generate_title_with_examples(old_title: str, description: str, examples: List[Dict], temperature: float = 1) -> tuple:
-    """Generate a single title using custom examples from competitors file"""
-    try:
-        prompt = create_prompt(old_title, description, examples)
-        
-        with st.spinner("Generating title with examples..."):
-            response = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert at creating compelling Amazon product titles that drive sales and improve search visibility."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=temperature,
-                max_tokens=100,
-                top_p=1,
-                frequency_penalty=0,
-                presence_penalty=0,
-                timeout=30
-            )
-
-        title = response.choices[0].message.content.strip()
-        
-        # Calculate cost
-        input_tokens = response['usage']['total_tokens'] - response['usage']['completion_tokens']
-        output_tokens = response['usage']['completion_tokens']
-        
-        cost = (
-            (input_tokens / 1000000) * INPUT_COST_PER_1M +
-            (output_tokens / 1000000) * OUTPUT_COST_PER_1M
-        )
-        
-        return title, cost, input_tokens, output_tokens
-        
-    except Exception as e:
-        st.error(f"❌ Error generating title: {str(e)}")
-        return None, None, None, None
+    if token_budget and tasks:
+        show_prompt_size_report(results.column('prompt_tokens', [task['row'] for task in tasks]), token_budget)
+    
+    return results.to_frame(old_titles, descriptions), total_cost
 
-def process_batch_data(df: pd.DataFrame) -> pd.DataFrame:
+def process_batch_data(df: pd.DataFrame, models: List[str] = None, backend: str = None,
+                       weight: float = 1.0, marketplaces: List[str] = None) -> pd.DataFrame:
     """Process batch data and generate titles (original method)"""
-    results = []
-    total_cost = 0
+    results = ResultBuffer(len(df))
+    old_titles, descriptions = [''] * len(df), [''] * len(df)
+    tasks = []
+    missing_keywords = sheet_missing_keywords(df, ('Title', 'title'))
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for idx, row in df.iterrows():
-        status_text.text(f"Processing row {idx + 1} of {len(df)}...")
-        
+    for position, (idx, row) in enumerate(df.iterrows()):
         # Handle different column names
         old_title = ''
         description = ''
@@ -297,29 +422,14 @@ def process_batch_data(df: pd.DataFrame) -> pd.DataFrame:
         if not description or description.strip() == '':
             st.warning(f"Row {idx + 1}: No description found")
             continue
-            
-        title, cost, input_tokens, output_tokens = generate_title(old_title, description)
-        
-        if title:
-            results.append({
-                'old_title': old_title,
-                'bullet_points': description,
-                'new_title': title,
-                'cost': cost,
-                'input_tokens': input_tokens,
-                'output_tokens': output_tokens
-            })
-            total_cost += cost
-        else:
-            st.error(f"Row {idx + 1}: Failed to generate title")
+        old_titles[position], descriptions[position] = old_title, description
         
-        progress_bar.progress((idx + 1) / len(df))
-        time.sleep(0.1)  # Small delay to prevent rate limiting
+        tasks.append({'row': position, 'old_title': old_title, 'bullet_points': description,
+                      'prompt_vars': {'missing_keywords': missing_keywords[position]}})
     
-    progress_bar.empty()
-    status_text.empty()
+    total_cost = run_batch_requests(tasks, None, len(df), results, models, backend, weight, marketplaces)
     
-    return pd.DataFrame(results), total_cost
+    return results.to_frame(old_titles, descriptions), total_cost
 
 def main():
     st.title("🛒 Amazon Title Generator")
@@ -329,6 +439,45 @@ def main():
     st.sidebar.header("Settings")
     temperature = st.sidebar.slider("Temperature", 0.0, 1.0, 1.0, 0.1, 
                                    help="Controls randomness in title generation")
+    cascade_models = st.sidebar.multiselect(
+        "Model cascade (cheapest first)",
+        options=sorted(set(MODEL_PRICING) | set(cascade_from_env())),
+        default=cascade_from_env(),
+        help="Rows go to the first model; titles failing the guideline checks are retried on the next one"
+    ) or [DEFAULT_MODEL]
+    backend = st.sidebar.selectbox(
+        "Completion backend",
+        options=list(BACKENDS),
+        index=list(BACKENDS).index(DEFAULT_BACKEND) if DEFAULT_BACKEND in BACKENDS else 0,
+        help="'local' = OpenAI-compatible server at LOCAL_LLM_URL, 'llama' = in-process CPU model at LLAMA_MODEL_PATH"
+    )
+    
+    batch_priority = st.sidebar.select_slider(
+        "Batch priority",
+        options=list(PRIORITY_WEIGHTS),
+        value='Normal',
+        help="Share of the API rate this session's batch jobs get while other jobs are running"
+    )
+    batch_weight = PRIORITY_WEIGHTS[batch_priority]
+    
+    selected_marketplaces = st.sidebar.multiselect(
+        "Marketplaces",
+        options=list(MARKETPLACES),
+        default=[DEFAULT_MARKETPLACE] if DEFAULT_MARKETPLACE in MARKETPLACES else [],
+        help="With several marketplaces, each batch row gets one request returning a title per "
+             "marketplace, in its language, with per-marketplace guideline checks and columns"
+    )
+    # The single-marketplace prompt is the default; anything else uses the multi-marketplace prompt
+    marketplaces = (selected_marketplaces
+                    if selected_marketplaces and selected_marketplaces != [DEFAULT_MARKETPLACE] else None)
+    
+    usage_user = st.sidebar.text_input(
+        "User", value=default_user(),
+        help="Completions are recorded under this name in the usage ledger (see the Usage Ledger page)"
+    )
+    
+    with st.sidebar.expander("Job queue"):
+        st.dataframe(pd.DataFrame(get_scheduler().stats()), use_container_width=True)
     
     # Check OpenAI connection
     if st.sidebar.button("Test OpenAI Connection"):
@@ -357,12 +506,13 @@ def main():
                 st.error("Please enter a product description")
             else:
                 # Check OpenAI connection first
-                if not initialize_openai():
+                if backend == 'openai' and not initialize_openai():
                     st.stop()
                 
-                title, cost, input_tokens, output_tokens = generate_title(
-                    old_title, description, temperature
-                )
+                with usage_context(user=usage_user):
+                    title, cost, input_tokens, output_tokens = generate_title(
+                        old_title, description, temperature, cascade_models, backend
+                    )
                 
                 if title:
                     st.success("✅ Title generated successfully!")
@@ -409,13 +559,19 @@ def main():
                 
                 if st.button("Process All Titles", type="primary"):
                     # Check OpenAI connection first
-                    if not initialize_openai():
+                    if backend == 'openai' and not initialize_openai():
                         st.stop()
                     
-                    results_df, total_cost = process_batch_data(df)
+                    # The job id is chosen up front so the ledger can attribute each completion to it
+                    job_id = new_job_id()
+                    with usage_context(job=job_id, user=usage_user):
+                        results_df, total_cost = process_batch_data(
+                            df, cascade_models, backend, batch_weight, marketplaces
+                        )
                     
                     if not results_df.empty:
-                        st.success(f"✅ Processed {len(results_df)} titles successfully!")
+                        save_batch_job('batch', df, results_df, total_cost, job_id=job_id)
+                        st.success(f"✅ Processed {len(results_df)} titles successfully! (job {job_id})")
                         
                         # Display results
                         st.subheader("Generated Titles")
@@ -430,11 +586,8 @@ def main():
                         with col3:
                             st.metric("Titles Generated", len(results_df))
                         
-                        # Download button
-                        output = io.BytesIO()
-                        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                            results_df.to_excel(writer, index=False, sheet_name='Generated Titles')
-                        output.seek(0)
+                        # Download button (Excel is rendered from the Parquet store)
+                        output = io.BytesIO(ResultStore().export_excel(job_id))
                         
                         st.download_button(
                             label="Download Results",
@@ -457,6 +610,11 @@ def main():
         2. **Test File**: Contains data to process with 'Title ' (with space) and 'Bullet Points' columns (like Amazon_Data.xlsx)
         """)
         
+        multi_sheet = st.checkbox(
+            "Read all sheets from one or more competitor files",
+            help="Each sheet (e.g. BULB) is parsed in parallel and tagged with a 'category' column"
+        )
+        
         col1, col2 = st.columns(2)
         
         with col1:
@@ -464,13 +622,23 @@ def main():
             competitors_file = st.file_uploader(
                 "Upload competitors/examples Excel file",
                 type=['xlsx', 'xls'],
-                key="competitors"
+                key="competitors_multi" if multi_sheet else "competitors",
+                accept_multiple_files=multi_sheet
             )
+            if multi_sheet and not competitors_file:
+                competitors_file = None
             
             if competitors_file is not None:
                 try:
-                    competitors_df = pd.read_excel(competitors_file, sheet_name=0)
-                    st.success(f"✅ Competitors file uploaded! Found {len(competitors_df)} examples")
+                    if multi_sheet:
+                        competitors_df = load_competitor_catalogue(
+                            tuple(read_source(f) for f in competitors_file)
+                        )
+                        st.success(f"✅ Competitors files uploaded! Found {len(competitors_df)} examples "
+                                   f"across {competitors_df['category'].nunique()} categories")
+                    else:
+                        competitors_df = pd.read_excel(competitors_file, sheet_name=0)
+                        st.success(f"✅ Competitors file uploaded! Found {len(competitors_df)} examples")
                     
                     # Display preview
                     st.subheader("Competitors Preview")
@@ -499,24 +667,80 @@ def main():
                 except Exception as e:
                     st.error(f"Error reading test file: {str(e)}")
         
+        use_keyword_index = st.checkbox(
+            "Use competitor keyword index instead of full examples",
+            help="Mine the competitors file into per-category keywords once and send each row only "
+                 "its relevant keywords - far fewer input tokens than pasting whole examples"
+        )
+        token_budget = st.number_input(
+            "Prompt token budget (0 = unlimited)",
+            min_value=0, max_value=8000, value=0, step=100,
+            help="Rank competitor examples by relevance, trim their bullet points and drop the "
+                 "least relevant ones so every prompt fits this many tokens"
+        )
+        # The keyword index replaces examples altogether, so matched examples would go unused
+        use_matching = st.checkbox(
+            "Use each product's matched competitors as examples",
+            disabled=use_keyword_index,
+            help="Match every test product to its nearest competitor listings (shape, pack size, "
+                 "wattage, lamp cap and title/bullet similarity) and prompt with those"
+                 + (". Not available while the competitor keyword index is used." if use_keyword_index else "")
+        ) and not use_keyword_index
+        incremental = st.checkbox(
+            "Only regenerate new or changed rows",
+            help="Reuse titles from the last advanced batch run for rows whose title, "
+                 "bullet points, examples and prompt are unchanged"
+        )
+        
         # Process button
         if competitors_file is not None and test_file is not None:
             if st.button("Process with Examples", type="primary", key="process_advanced"):
                 # Check OpenAI connection first
-                if not initialize_openai():
+                if backend == 'openai' and not initialize_openai():
                     st.stop()
                 
                 try:
                     # Read files again to ensure they're available
-                    competitors_df = pd.read_excel(competitors_file, sheet_name=0)
+                    if multi_sheet:
+                        competitors_df = load_competitor_catalogue(
+                            tuple(read_source(f) for f in competitors_file)
+                        )
+                    else:
+                        competitors_df = pd.read_excel(competitors_file, sheet_name=0)
                     test_df = pd.read_excel(test_file, sheet_name=0)
                     
                     st.info("🔄 Processing with examples from competitors file...")
                     
-                    results_df, total_cost = process_batch_data_with_examples(competitors_df, test_df)
+                    previous_results = None
+                    if incremental:
+                        store = ResultStore()
+                        previous_job_id = store.latest_job_id(mode='examples')
+                        if previous_job_id:
+                            previous_results = store.read_results(previous_job_id)
+                            st.info(f"♻️ Comparing against previous job {previous_job_id} "
+                                    f"({len(previous_results)} titles)")
+                        else:
+                            st.info("No previous run found; generating every row")
+                    
+                    keyword_index = load_keyword_index(competitors_df) if use_keyword_index else None
+                    row_examples = None
+                    if use_matching:
+                        row_examples = load_matched_examples(competitors_df, test_df)
+                        st.info(f"🔗 Matched {len(row_examples)} of {len(test_df)} products to competitors")
+                    
+                    job_id = new_job_id()
+                    with usage_context(job=job_id, user=usage_user):
+                        results_df, total_cost = process_batch_data_with_examples(
+                            competitors_df, test_df, previous_results, cascade_models, backend, keyword_index,
+                            int(token_budget) or None, batch_weight, row_examples, marketplaces
+                        )
                     
                     if not results_df.empty:
-                        st.success(f"✅ Processed {len(results_df)} titles successfully!")
+                        save_batch_job('examples', test_df, results_df, total_cost, competitors_df, job_id)
+                        reused = int(results_df['reused'].sum())
+                        st.success(f"✅ Processed {len(results_df)} titles successfully! (job {job_id})")
+                        if reused:
+                            st.info(f"♻️ Reused {reused} unchanged titles, generated {len(results_df) - reused}")
                         
                         # Display results
                         st.subheader("Generated Titles")
@@ -531,11 +755,8 @@ def main():
                         with col3:
                             st.metric("Titles Generated", len(results_df))
                         
-                        # Download button
-                        output = io.BytesIO()
-                        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                            results_df.to_excel(writer, index=False, sheet_name='Generated Titles')
-                        output.seek(0)
+                        # Download button (Excel is rendered from the Parquet store)
+                        output = io.BytesIO(ResultStore().export_excel(job_id))
                         
                         st.download_button(
                             label="Download Results (results.xlsx)",
@@ -0,0 +1,145 @@
+"""
+Pluggable completion backends for title generation.
+
+    openai   OpenAI / Azure chat API through the client pool (billed)
+    local    any OpenAI-compatible HTTP server, e.g. llama.cpp server, vLLM, Ollama
+    llama    in-process CPU model via llama-cpp-python (optional dependency)
+
+Select one per job with the sidebar, or set TITLE_BACKEND. Local backends
+are configured with LOCAL_LLM_URL / LOCAL_LLM_MODEL and LLAMA_MODEL_PATH /
+LLAMA_THREADS. Any backend's traffic can be recorded and replayed offline
+(see cassette.py).
+"""
+
+import os
+import threading
+from typing import Dict, List
+
+import requests
+
+from client_pool import get_client_pool
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for servers that omit usage"""
+    return max(1, len(text or '') // 4)
+
+
+class CompletionBackend:
+    """Chat completion interface: complete() returns (text, input_tokens, output_tokens)"""
+
+    name = 'base'
+    billable = False
+    # Completions count towards the usage ledger (not when replayed from a cassette)
+    records_usage = True
+
+    def complete(self, messages: List[Dict], model: str, temperature: float = 1,
+                 max_tokens: int = 100, timeout: float = 30, stop: List[str] = None) -> tuple:
+        raise NotImplementedError
+
+
+class OpenAIBackend(CompletionBackend):
+    name = 'openai'
+    billable = True
+
+    def complete(self, messages, model, temperature=1, max_tokens=100, timeout=30, stop=None):
+        response = get_client_pool().chat_completion(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1,
+            frequency_penalty=0,
+            presence_penalty=0,
+            stop=stop,
+            timeout=timeout
+        )
+        text = response.choices[0].message.content.strip()
+        input_tokens = response['usage']['total_tokens'] - response['usage']['completion_tokens']
+        output_tokens = response['usage']['completion_tokens']
+        return text, input_tokens, output_tokens
+
+
+class LocalHTTPBackend(CompletionBackend):
+    """OpenAI-compatible /v1/chat/completions server on the local network"""
+
+    name = 'local'
+
+    def __init__(self, base_url: str = None, model: str = None):
+        self.base_url = (base_url or os.getenv('LOCAL_LLM_URL', 'http://localhost:8080/v1')).rstrip('/')
+        self.model = model or os.getenv('LOCAL_LLM_MODEL')
+        self._session = requests.Session()
+
+    def complete(self, messages, model, temperature=1, max_tokens=100, timeout=30, stop=None):
+        payload = {
+            'model': self.model or model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+        }
+        if stop:
+            payload['stop'] = stop
+        response = self._session.post(f"{self.base_url}/chat/completions", json=payload, timeout=timeout)
+        response.raise_for_status()
+        body = response.json()
+        text = body['choices'][0]['message']['content'].strip()
+
+        usage = body.get('usage') or {}
+        input_tokens = usage.get('prompt_tokens') or sum(estimate_tokens(m['content']) for m in messages)
+        output_tokens = usage.get('completion_tokens') or estimate_tokens(text)
+        return text, input_tokens, output_tokens
+
+
+class LlamaCppBackend(CompletionBackend):
+    """Quantized GGUF model running in-process on the CPU"""
+
+    name = 'llama'
+
+    def __init__(self, model_path: str = None, n_threads: int = None, n_ctx: int = 4096):
+        try:
+            from llama_cpp import Llama
+        except ImportError as e:
+            raise ImportError("The 'llama' backend needs llama-cpp-python: pip install llama-cpp-python") from e
+
+        model_path = model_path or os.getenv('LLAMA_MODEL_PATH')
+        if not model_path:
+            raise ValueError("Set LLAMA_MODEL_PATH to a GGUF model file to use the 'llama' backend")
+
+        threads = n_threads or int(os.getenv('LLAMA_THREADS', '0')) or os.cpu_count()
+        self._llm = Llama(model_path=model_path, n_threads=threads, n_ctx=n_ctx, verbose=False)
+        # A Llama instance is not thread-safe; batch workers take turns
+        self._lock = threading.Lock()
+
+    def complete(self, messages, model, temperature=1, max_tokens=100, timeout=30, stop=None):
+        with self._lock:
+            body = self._llm.create_chat_completion(
+                messages=messages, temperature=temperature, max_tokens=max_tokens, stop=stop
+            )
+        text = body['choices'][0]['message']['content'].strip()
+        usage = body.get('usage') or {}
+        return text, usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+
+
+BACKENDS = {
+    OpenAIBackend.name: OpenAIBackend,
+    LocalHTTPBackend.name: LocalHTTPBackend,
+    LlamaCppBackend.name: LlamaCppBackend,
+}
+
+DEFAULT_BACKEND = os.getenv('TITLE_BACKEND', OpenAIBackend.name)
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name: str = None) -> CompletionBackend:
+    """Shared backend instance by name (models are loaded once per process)"""
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    with _instances_lock:
+        if name not in _instances:
+            # Imported here: cassette builds on CompletionBackend from this module
+            from cassette import wrap_backend
+            _instances[name] = wrap_backend(name, BACKENDS[name])
+        return _instances[name]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark completion backends side by side on the same catalogue rows.
+
+Example:
+    python benchmark_backends.py --backends openai local --rows 50
+"""
+
+import argparse
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from backends import get_backend
+from concurrency import AIMDController, run_adaptive
+from guidelines import check_title
+from title_engine import DEFAULT_MODEL, request_title
+
+
+def load_rows(path: str, sheet, rows: int) -> list:
+    """(old_title, bullet_points) pairs from a catalogue sheet"""
+    df = pd.read_excel(path, sheet_name=sheet)
+    title_col = 'Title ' if 'Title ' in df.columns else 'Title'
+    df = df[df['Bullet Points'].notna()].head(rows)
+    return [
+        (str(t) if pd.notna(t) else '', str(b))
+        for t, b in zip(df.get(title_col, [''] * len(df)), df['Bullet Points'])
+    ]
+
+
+def benchmark_backend(backend: str, rows: list, examples: list, model: str) -> dict:
+    """Run every row through one backend and summarise speed, cost and quality"""
+    get_backend(backend)  # fail fast if the backend cannot be loaded
+    latencies, issues, costs, input_tokens, output_tokens = [], [], [], [], []
+    failures = 0
+
+    def generate(row):
+        start = time.monotonic()
+        result = request_title(row[0], row[1], examples, model=model, backend=backend)
+        return row, result, time.monotonic() - start
+
+    def on_done(task, result, error):
+        nonlocal failures
+        if error is not None:
+            failures += 1
+            return
+        (old_title, description), (title, cost, tokens_in, tokens_out), latency = result
+        latencies.append(latency)
+        costs.append(cost)
+        input_tokens.append(tokens_in)
+        output_tokens.append(tokens_out)
+        issues.append(bool(check_title(title, old_title, description)))
+
+    start = time.monotonic()
+    run_adaptive(rows, generate, AIMDController(), on_done)
+    elapsed = time.monotonic() - start
+
+    latency = pd.Series(latencies, dtype=float)
+    done = len(latencies)
+    return {
+        'backend': backend,
+        'rows': len(rows),
+        'failed': failures,
+        'rows_per_sec': done / elapsed if elapsed else 0.0,
+        'latency_p50_s': latency.quantile(0.5) if done else None,
+        'latency_p95_s': latency.quantile(0.95) if done else None,
+        'avg_input_tokens': sum(input_tokens) / done if done else None,
+        'avg_output_tokens': sum(output_tokens) / done if done else None,
+        'guideline_pass_rate': 1 - sum(issues) / done if done else None,
+        'total_cost': sum(costs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['openai'], help="backends to compare (openai, local, llama)")
+    parser.add_argument('--data', default='data/Amazon_Data.xlsx', help="catalogue workbook")
+    parser.add_argument('--sheet', default='Title', help="sheet holding 'Title ' and 'Bullet Points'")
+    parser.add_argument('--examples', default='data/Amazon_Competitors.xlsx', help="competitor examples workbook ('' for none)")
+    parser.add_argument('--rows', type=int, default=20, help="rows to sample")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--output', help="optional CSV path for the report")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    rows = load_rows(args.data, args.sheet, args.rows)
+    examples = []
+    if args.examples:
+        examples = pd.read_excel(args.examples, sheet_name=0)[['Title', 'Bullet Points']].to_dict(orient='records')
+
+    print(f"🔍 Benchmarking {', '.join(args.backends)} on {len(rows)} rows")
+    report = []
+    for backend in args.backends:
+        print(f"🔄 {backend}...")
+        try:
+            report.append(benchmark_backend(backend, rows, examples, args.model))
+        except Exception as e:
+            print(f"❌ {backend} unavailable: {e}")
+
+    report_df = pd.DataFrame(report)
+    print("\n" + "=" * 60)
+    print(report_df.to_string(index=False))
+
+    if args.output:
+        report_df.to_csv(args.output, index=False)
+        print(f"\n✅ Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
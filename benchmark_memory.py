@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Peak memory of batch result collection: per-row dicts vs the columnar ResultBuffer.
+
+Each case runs in a fresh subprocess on a synthetic catalogue (no API calls):
+every row gets a task, a generated title and usage numbers, and the results
+are turned into the final export frame, as in process_batch_data_with_examples
+before ('dicts') and after ('buffer') the switch to ResultBuffer.
+
+Example:
+    python benchmark_memory.py --rows 10000 100000
+"""
+
+import argparse
+import hashlib
+import json
+import resource
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from result_buffer import ResultBuffer
+
+TITLE_CHARS = 150
+BULLET_CHARS = 1200
+MODES = ('dicts', 'buffer')
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_catalogue(rows: int) -> pd.DataFrame:
+    """Distinct title / bullet strings per row, built without large temporaries"""
+    rng = np.random.default_rng(0)
+    words = ['pendant', 'light', 'shade', 'vintage', 'brass', 'e27', 'ceiling', 'cage', 'metal',
+             'industrial', 'lamp', 'holder', 'black', 'pack', 'of', '2', 'bulb', 'fitting']
+
+    def pool(chars):
+        return [' '.join(rng.choice(words, chars // 5))[:chars] for _ in range(500)]
+
+    titles, bullets = pool(TITLE_CHARS), pool(BULLET_CHARS)
+    return pd.DataFrame({
+        'Title ': [f"{i} {titles[i % 500]}"[:TITLE_CHARS] for i in range(rows)],
+        'Bullet Points': [f"{i} {bullets[i % 500]}"[:BULLET_CHARS] for i in range(rows)],
+    })
+
+
+def collect(df: pd.DataFrame, mode: str) -> pd.DataFrame:
+    """Fill results for every row the way the batch loop does, then build the export frame"""
+    rows = len(df)
+    tasks = []
+    old_titles, descriptions = [''] * rows, [''] * rows
+    results = {} if mode == 'dicts' else ResultBuffer(rows)
+    for position, (old_title, description) in enumerate(zip(df['Title '], df['Bullet Points'])):
+        old_titles[position], descriptions[position] = old_title, description
+        fingerprint = hashlib.sha256(description.encode('utf-8')).hexdigest()
+        if mode == 'dicts':
+            tasks.append({'row': position, 'old_title': old_title, 'bullet_points': description,
+                          'extra': {'fingerprint': fingerprint, 'reused': False}})
+        else:
+            results.set_extra(position, fingerprint=fingerprint, reused=False)
+            tasks.append({'row': position, 'old_title': old_title, 'bullet_points': description})
+
+    for task in tasks:
+        # A fresh string per row, like an API response
+        title = (task['old_title'][::-1] + ' new')[:TITLE_CHARS]
+        if mode == 'dicts':
+            results[task['row']] = {
+                'old_title': task['old_title'],
+                'bullet_points': task['bullet_points'],
+                'new_title': title,
+                'cost': 0.0002,
+                'input_tokens': 1100,
+                'output_tokens': 40,
+                'model': 'gpt-4o-mini',
+                'guideline_issues': '',
+                **task['extra']
+            }
+        else:
+            results.set(task['row'], title, 0.0002, 1100, 40, 'gpt-4o-mini', '')
+
+    if mode == 'dicts':
+        return pd.DataFrame([results[k] for k in sorted(results)])
+    return results.to_frame(old_titles, descriptions)
+
+
+def run_case(rows: int, mode: str) -> dict:
+    df = synthetic_catalogue(rows)
+    baseline = peak_rss_mb()
+    frame = collect(df, mode)
+    peak = peak_rss_mb()
+    return {'rows': rows, 'mode': mode, 'baseline_mb': round(baseline, 1),
+            'peak_rss_mb': round(peak, 1), 'results_overhead_mb': round(peak - baseline, 1),
+            'output_rows': len(frame)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', nargs='+', type=int, default=[10000, 100000])
+    parser.add_argument('--case', nargs=2, metavar=('ROWS', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(int(args.case[0]), args.case[1])))
+        return
+
+    report = []
+    for rows in args.rows:
+        for mode in MODES:
+            print(f"🔄 {rows} rows, {mode}...")
+            # Fresh process per case so peak RSS isn't shared between cases
+            output = subprocess.run([sys.executable, __file__, '--case', str(rows), mode],
+                                    capture_output=True, text=True, check=True).stdout
+            report.append(json.loads(output.strip().splitlines()[-1]))
+
+    print("\n" + "=" * 60)
+    print(pd.DataFrame(report).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
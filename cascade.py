@@ -0,0 +1,149 @@
+"""
+Model cascade: draft every row with the fastest model and escalate to a
+stronger one only when the draft fails the local guideline checks.
+
+Redundant synonyms in a draft ("Vintage Retro Style") are collapsed locally
+first, so they only cost an escalation when collapsing would drop a required
+old-title keyword.
+
+Configure the tiers (cheapest first) with TITLE_MODEL_CASCADE, e.g.
+"gpt-4.1-nano,gpt-4o-mini,gpt-4o", or from the sidebar.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List
+
+from guidelines import check_title
+from hedging import Hedger
+from synonyms import COLLAPSED, default_matcher
+from title_engine import DEFAULT_MODEL, MARKETPLACES, request_marketplace_titles, request_title
+
+
+def cascade_from_env() -> List[str]:
+    models = [m.strip() for m in os.getenv('TITLE_MODEL_CASCADE', '').split(',') if m.strip()]
+    return models or [DEFAULT_MODEL]
+
+
+class ModelCascade:
+    """Tiered generation with per-tier hit-rate, cost and latency accounting"""
+
+    def __init__(self, models: List[str] = None, backend: str = None, hedger: Hedger = None):
+        self.models = list(models or cascade_from_env())
+        self.backend = backend
+        self.hedger = hedger
+        self._lock = threading.Lock()
+        self.tier_stats = {
+            model: {'attempts': 0, 'accepted': 0, 'collapsed': 0, 'cost': 0.0, 'latency': 0.0}
+            for model in self.models
+        }
+
+    def _record(self, model: str, accepted: bool, collapsed: bool, cost: float, latency: float) -> None:
+        with self._lock:
+            stats = self.tier_stats[model]
+            stats['attempts'] += 1
+            stats['accepted'] += int(accepted)
+            stats['collapsed'] += int(collapsed)
+            stats['cost'] += cost
+            stats['latency'] += latency
+
+    def generate(self, old_title: str, description: str, examples: List[Dict] = None,
+                 temperature: float = 1, prompt_vars: Dict = None) -> tuple:
+        """Returns (title, cost, input_tokens, output_tokens, model, issues)
+
+        Cost and tokens are summed over every tier that was tried; the last
+        tier's title is kept even if it still has guideline issues.
+        """
+        total_cost = 0.0
+        total_input = total_output = 0
+        title, issues, model = None, [], self.models[0]
+        required = set((prompt_vars or {}).get('missing_keywords') or ())
+
+        for tier, model in enumerate(self.models):
+            start = time.monotonic()
+            args = (old_title, description, examples, temperature)
+            kwargs = {'model': model, 'backend': self.backend, 'prompt_vars': prompt_vars}
+            if self.hedger:
+                title, cost, input_tokens, output_tokens = self.hedger.call(model, request_title, *args, **kwargs)
+            else:
+                title, cost, input_tokens, output_tokens = request_title(*args, **kwargs)
+            (title,), (action,) = default_matcher().collapse([title], [required])
+            issues = check_title(title, old_title, description)
+            is_last = tier == len(self.models) - 1
+
+            total_cost += cost
+            total_input += input_tokens
+            total_output += output_tokens
+            self._record(model, not issues, action == COLLAPSED, cost, time.monotonic() - start)
+
+            if not issues or is_last:
+                break
+
+        return title, total_cost, total_input, total_output, model, issues
+
+    def generate_marketplaces(self, old_title: str, description: str, marketplaces: List[str],
+                              examples: List[Dict] = None, temperature: float = 1,
+                              prompt_vars: Dict = None) -> tuple:
+        """Returns ({code: title}, cost, input_tokens, output_tokens, model, {code: issues})
+
+        Every marketplace comes from one request per tier, so a row escalates
+        when any of its titles fails its marketplace's checks.
+        """
+        total_cost = 0.0
+        total_input = total_output = 0
+        titles, issues, model = {}, {}, self.models[0]
+        required = set((prompt_vars or {}).get('missing_keywords') or ())
+
+        for tier, model in enumerate(self.models):
+            start = time.monotonic()
+            args = (old_title, description, marketplaces, examples, temperature)
+            kwargs = {'model': model, 'backend': self.backend, 'prompt_vars': prompt_vars}
+            if self.hedger:
+                # Multi-marketplace responses are longer, so they get their own latency percentile
+                titles, cost, input_tokens, output_tokens = self.hedger.call(
+                    f"{model} {'+'.join(marketplaces)}", request_marketplace_titles, *args, **kwargs
+                )
+            else:
+                titles, cost, input_tokens, output_tokens = request_marketplace_titles(*args, **kwargs)
+
+            # The synonym lexicon is English, so only English titles are collapsed
+            english = [code for code in marketplaces if MARKETPLACES[code]['english']]
+            collapsed, actions = default_matcher().collapse([titles[code] for code in english],
+                                                            [required] * len(english))
+            titles.update(zip(english, collapsed))
+            issues = {
+                code: check_title(titles[code], old_title, description, english=MARKETPLACES[code]['english'])
+                for code in marketplaces
+            }
+            failed = any(issues.values())
+            is_last = tier == len(self.models) - 1
+
+            total_cost += cost
+            total_input += input_tokens
+            total_output += output_tokens
+            self._record(model, not failed, COLLAPSED in actions, cost, time.monotonic() - start)
+
+            if not failed or is_last:
+                break
+
+        return titles, total_cost, total_input, total_output, model, issues
+
+    def report(self) -> List[Dict]:
+        """Per-tier rows for the batch summary"""
+        rows = []
+        with self._lock:
+            for model in self.models:
+                stats = self.tier_stats[model]
+                attempts = stats['attempts']
+                rows.append({
+                    'model': model,
+                    'rows_attempted': attempts,
+                    'passed_guidelines': stats['accepted'],
+                    'synonyms_collapsed': stats['collapsed'],
+                    'hit_rate': stats['accepted'] / attempts if attempts else 0.0,
+                    'cost': stats['cost'],
+                    'avg_cost_per_row': stats['cost'] / attempts if attempts else 0.0,
+                    'avg_latency_s': stats['latency'] / attempts if attempts else 0.0,
+                })
+        return rows
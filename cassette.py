@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Record / replay of completion traffic ("cassettes").
+
+With TITLE_CASSETTE_MODE=record, every completion request sent through a
+backend (so every generate_title* call, single, batch or packed) is appended
+with its response, usage and latency to a gzip-compressed JSON-lines file.
+With TITLE_CASSETTE_MODE=replay, responses are served from that file (and the
+per-worker *.worker<N>.jsonl.gz files a launcher recording leaves next to it)
+instead of the network, after the recorded latency times
+TITLE_CASSETTE_LATENCY_SCALE (1 = as recorded, 0 = instant). Failed requests
+are recorded and replayed as failures too, with their error type and HTTP
+status, so a bad run (rate limits included) can be reproduced and benchmarked
+offline.
+
+    TITLE_CASSETTE_MODE=record TITLE_CASSETTE=output/cassettes/run.jsonl.gz streamlit run app.py
+    TITLE_CASSETTE_MODE=replay TITLE_CASSETTE_LATENCY_SCALE=0.1 ... streamlit run app.py
+    python cassette.py output/cassettes/run.jsonl.gz     # summary of a cassette
+"""
+
+import argparse
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, List
+
+import openai
+import pandas as pd
+import requests
+
+from backends import CompletionBackend
+from concurrency import error_status
+
+CASSETTE_PATH = os.getenv('TITLE_CASSETTE', os.path.join('output', 'cassettes', 'cassette.jsonl.gz'))
+CASSETTE_MODE = os.getenv('TITLE_CASSETTE_MODE', '')
+LATENCY_SCALE = float(os.getenv('TITLE_CASSETTE_LATENCY_SCALE', '1'))
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+
+class CassetteMiss(KeyError):
+    """Replay was asked for a request the cassette doesn't contain"""
+
+
+class ReplayedError(RuntimeError):
+    """A recorded failure of a type that can't be rebuilt, with its HTTP status"""
+
+    def __init__(self, message: str, http_status: int = None):
+        super().__init__(message)
+        self.http_status = http_status
+
+
+def replayed_error(entry: Dict) -> Exception:
+    """Rebuild a recorded failure, so replay throttles (and backs off) like the recorded run"""
+    message, status = entry['error'], entry.get('http_status')
+    error_class = getattr(openai.error, entry.get('error_type') or '', None)
+    if isinstance(error_class, type) and issubclass(error_class, openai.error.OpenAIError):
+        return error_class(message, http_status=status)
+    if entry.get('error_type') == TimeoutError.__name__:
+        return TimeoutError(message)
+    # The local backend's timeouts (ReadTimeout, ConnectTimeout, ...)
+    timeout_class = getattr(requests.exceptions, entry.get('error_type') or '', None)
+    if isinstance(timeout_class, type) and issubclass(timeout_class, requests.Timeout):
+        return timeout_class(message)
+    return ReplayedError(message, status)
+
+
+def request_key(backend: str, messages: List[Dict], model: str, **params) -> str:
+    # Timeouts don't change the response, so they don't change the key
+    params.pop('timeout', None)
+    payload = json.dumps([backend, messages, model, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def worker_cassette_path(path: str, worker: int) -> str:
+    """Cassette a launcher worker records to; one gzip stream per process, so appends never interleave"""
+    return path.replace('.jsonl', f".worker{worker}.jsonl", 1)
+
+
+def replay_paths(path: str) -> List[str]:
+    """The cassette and the per-worker cassettes recorded next to it"""
+    paths = sorted(glob.glob(worker_cassette_path(glob.escape(path), '*')))
+    return ([path] if os.path.exists(path) or not paths else []) + paths
+
+
+def read_cassette(path: str) -> List[Dict]:
+    entries = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                entries.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError):
+            # A recorder that didn't exit cleanly leaves an unterminated stream; keep what was flushed
+            pass
+    return entries
+
+
+class Cassette:
+    """One cassette file, shared by every backend in the process"""
+
+    def __init__(self, path: str, mode: str, latency_scale: float = LATENCY_SCALE):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"TITLE_CASSETTE_MODE must be '{RECORD}' or '{REPLAY}', not '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._file = None
+        self._entries = defaultdict(deque)
+        if mode == REPLAY:
+            # Workers' recordings are merged: a replayed session may land on a different worker
+            entries = [entry for replay_path in replay_paths(path) for entry in read_cassette(replay_path)]
+            for entry in sorted(entries, key=lambda entry: entry.get('recorded_at', 0)):
+                self._entries[entry['key']].append(entry)
+
+    def record(self, entry: Dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                # Appending adds a gzip member; readers see one continuous stream
+                self._file = gzip.open(self.path, 'at', encoding='utf-8')
+                atexit.register(self.close)
+            self._file.write(line)
+            # Sync flush keeps the file readable if the process dies, without resetting compression
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def next_entry(self, key: str) -> Dict:
+        """Recorded responses for a request, in recording order (repeating once used up)"""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"Request not in cassette {self.path}; record it first")
+            entry = entries[0]
+            entries.rotate(-1)
+        return entry
+
+
+class CassetteBackend(CompletionBackend):
+    """Wraps a backend: records its traffic, or replays it without creating the backend at all"""
+
+    def __init__(self, name: str, billable: bool, cassette: Cassette, make_backend: Callable[[], CompletionBackend]):
+        self.name = name
+        self.billable = billable
+        self.cassette = cassette
+        self.records_usage = cassette.mode == RECORD
+        self.backend = make_backend() if cassette.mode == RECORD else None
+
+    def complete(self, messages, model, temperature=1, max_tokens=100, timeout=30, **params):
+        key = request_key(self.name, messages, model, temperature=temperature, max_tokens=max_tokens, **params)
+
+        if self.cassette.mode == REPLAY:
+            entry = self.cassette.next_entry(key)
+            time.sleep(entry['latency'] * self.cassette.latency_scale)
+            if entry['error'] is not None:
+                raise replayed_error(entry)
+            return tuple(entry['response'])
+
+        start = time.monotonic()
+        response, error, error_type, http_status = None, None, None, None
+        try:
+            response = self.backend.complete(messages, model, temperature=temperature, max_tokens=max_tokens,
+                                             timeout=timeout, **params)
+            return response
+        except Exception as e:
+            error, error_type, http_status = f"{type(e).__name__}: {e}", type(e).__name__, error_status(e)
+            raise
+        finally:
+            self.cassette.record({
+                'key': key,
+                'backend': self.name,
+                'model': model,
+                'request': {'messages': messages, 'temperature': temperature, 'max_tokens': max_tokens, **params},
+                'response': list(response) if response is not None else None,
+                'error': error,
+                'error_type': error_type,
+                'http_status': http_status,
+                'latency': time.monotonic() - start,
+                'recorded_at': time.time(),
+            })
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def wrap_backend(name: str, backend_class: type) -> CompletionBackend:
+    """The backend itself, or its cassette wrapper when TITLE_CASSETTE_MODE is set"""
+    global _cassette
+    if not CASSETTE_MODE:
+        return backend_class()
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE)
+    return CassetteBackend(name, backend_class.billable, _cassette, backend_class)
+
+
+def summarize(entries: List[Dict]) -> pd.DataFrame:
+    """Requests, failures, latency and tokens per backend and model"""
+    df = pd.DataFrame({
+        'backend': [e['backend'] for e in entries],
+        'model': [e['model'] for e in entries],
+        'failed': [e['error'] is not None for e in entries],
+        'latency': [e['latency'] for e in entries],
+        'input_tokens': [e['response'][1] if e['response'] else 0 for e in entries],
+        'output_tokens': [e['response'][2] if e['response'] else 0 for e in entries],
+    })
+    return df.groupby(['backend', 'model']).agg(
+        requests=('latency', 'size'),
+        failed=('failed', 'sum'),
+        latency_p50=('latency', 'median'),
+        latency_p95=('latency', lambda s: s.quantile(0.95)),
+        input_tokens=('input_tokens', 'sum'),
+        output_tokens=('output_tokens', 'sum'),
+    ).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', nargs='?', default=CASSETTE_PATH)
+    args = parser.parse_args()
+
+    entries = read_cassette(args.path)
+    distinct = len({e['key'] for e in entries})
+    print(f"📼 {len(entries)} recorded requests ({distinct} distinct) in {args.path} "
+          f"({os.path.getsize(args.path) / 1024:.0f} KB)")
+    if entries:
+        print(summarize(entries).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
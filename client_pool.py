@@ -0,0 +1,205 @@
+"""
+Weighted pool of OpenAI / Azure OpenAI backends.
+
+Requests are routed to the least-loaded healthy backend (in-flight requests
+divided by weight). Backends that answer with rate limits or connection
+errors are cooled down and the request fails over to the next one, so a
+batch can use the combined quota of several keys or deployments.
+
+Configuration (first match wins):
+
+    OPENAI_BACKENDS   JSON list, e.g.
+                      [{"name": "openai", "api_key": "sk-...", "weight": 2},
+                       {"name": "azure-uk", "api_key": "...", "api_type": "azure",
+                        "api_base": "https://x.openai.azure.com", "api_version": "2024-02-01",
+                        "deployment": "gpt-4o-mini", "weight": 1}]
+    OPENAI_API_KEYS   comma-separated keys, equal weights
+    OPENAI_API_KEY    single key
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import openai
+
+from concurrency import is_throttle_error
+
+# Errors that mean "this backend is unusable right now", not "this request is bad"
+FAILOVER_ERRORS = (
+    openai.error.AuthenticationError,
+    openai.error.PermissionError,
+    openai.error.APIError,
+)
+
+DEFAULT_COOLDOWN = 10.0   # seconds a throttled backend is skipped
+FAILURE_COOLDOWN = 60.0   # seconds a failing (auth/5xx) backend is skipped
+
+
+# Keys of an OPENAI_BACKENDS entry
+BACKEND_KEYS = ('name', 'api_key', 'weight', 'api_type', 'api_base', 'api_version', 'deployment')
+
+
+class Backend:
+    """One API key or deployment and its live load / rate-limit state"""
+
+    def __init__(self, name: str, api_key: str, weight: float = 1.0, api_base: str = None,
+                 api_type: str = None, api_version: str = None, deployment: str = None):
+        self.name = name
+        self.api_key = api_key
+        self.weight = max(float(weight), 0.01)
+        self.api_base = api_base
+        self.api_type = api_type
+        self.api_version = api_version
+        self.deployment = deployment
+
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.cooldown_until = 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def load(self) -> float:
+        return (self.in_flight + 1) / self.weight
+
+    def request_kwargs(self) -> Dict:
+        """Per-call credentials for openai.ChatCompletion.create"""
+        kwargs = {'api_key': self.api_key}
+        if self.api_base:
+            kwargs['api_base'] = self.api_base
+        if self.api_type:
+            kwargs['api_type'] = self.api_type
+        if self.api_version:
+            kwargs['api_version'] = self.api_version
+        if self.deployment:
+            kwargs['deployment_id'] = self.deployment
+        return kwargs
+
+
+def _retry_after(error: Exception) -> float:
+    """Seconds to back off, honouring a Retry-After header when present"""
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After') or DEFAULT_COOLDOWN)
+    except (TypeError, ValueError):
+        return DEFAULT_COOLDOWN
+
+
+class ClientPool:
+    """Least-loaded routing with failover across several backends"""
+
+    def __init__(self, backends: List[Backend]):
+        if not backends:
+            raise ValueError("ClientPool needs at least one backend")
+        self.backends = backends
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'ClientPool':
+        raw = os.getenv('OPENAI_BACKENDS')
+        if raw:
+            try:
+                specs = json.loads(raw)
+                return cls([
+                    Backend(spec.pop('name', f"backend-{i + 1}"), **spec)
+                    for i, spec in enumerate(specs)
+                ])
+            except (ValueError, TypeError, AttributeError) as e:
+                # Bad JSON, a non-object entry or an unknown / missing key
+                raise ValueError(f"OPENAI_BACKENDS must be a JSON list of backend objects "
+                                 f"({', '.join(BACKEND_KEYS)}): {e}") from e
+
+        keys = [k.strip() for k in os.getenv('OPENAI_API_KEYS', '').split(',') if k.strip()]
+        if not keys and os.getenv('OPENAI_API_KEY'):
+            keys = [os.getenv('OPENAI_API_KEY')]
+        if not keys:
+            raise ValueError("OpenAI API key not found. Please set the OPENAI_API_KEY environment variable "
+                             "(or OPENAI_API_KEYS / OPENAI_BACKENDS for several keys).")
+        return cls([Backend(f"key-{i + 1}", key) for i, key in enumerate(keys)])
+
+    def acquire(self, exclude: Optional[set] = None) -> Backend:
+        """Reserve the least-loaded healthy backend (or the one recovering soonest)"""
+        exclude = exclude or set()
+        with self._lock:
+            now = time.monotonic()
+            candidates = [b for b in self.backends if b.name not in exclude] or self.backends
+            healthy = [b for b in candidates if b.is_healthy(now)]
+            if healthy:
+                backend = min(healthy, key=Backend.load)
+            else:
+                backend = min(candidates, key=lambda b: b.cooldown_until)
+            backend.in_flight += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, error: Exception = None) -> None:
+        with self._lock:
+            backend.in_flight -= 1
+            if error is None:
+                return
+            backend.errors += 1
+            if is_throttle_error(error):
+                backend.throttled += 1
+                backend.cooldown_until = time.monotonic() + _retry_after(error)
+            elif isinstance(error, FAILOVER_ERRORS):
+                backend.cooldown_until = time.monotonic() + FAILURE_COOLDOWN
+
+    def chat_completion(self, **params):
+        """openai.ChatCompletion.create routed through the pool, failing over between backends"""
+        tried = set()
+        last_error = None
+        for _ in range(len(self.backends)):
+            backend = self.acquire(exclude=tried)
+            tried.add(backend.name)
+            try:
+                response = openai.ChatCompletion.create(**backend.request_kwargs(), **params)
+            except Exception as e:
+                self.release(backend, e)
+                if not (is_throttle_error(e) or isinstance(e, FAILOVER_ERRORS)):
+                    raise
+                last_error = e
+                continue
+            self.release(backend)
+            return response
+        raise last_error
+
+    def stats(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    'backend': b.name,
+                    'weight': b.weight,
+                    'in_flight': b.in_flight,
+                    'requests': b.requests,
+                    'errors': b.errors,
+                    'throttled': b.throttled,
+                    'healthy': b.is_healthy(now),
+                }
+                for b in self.backends
+            ]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_client_pool() -> ClientPool:
+    """Process-wide pool built from the environment on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClientPool.from_env()
+        return _pool
+
+
+def reset_client_pool() -> None:
+    """Forget the cached pool so the next call re-reads the environment"""
+    global _pool
+    with _pool_lock:
+        _pool = None
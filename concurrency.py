@@ -0,0 +1,144 @@
+"""
+AIMD adaptive concurrency for batch title generation.
+
+The controller raises the number of in-flight requests additively while
+completions are fast and successful, and cuts it multiplicatively when the
+API answers with rate limits or timeouts, so throughput settles just under
+the account's ceiling without manual tuning.
+"""
+
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Optional
+
+import openai
+import requests
+
+# Errors that signal congestion rather than a bad request
+THROTTLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    requests.Timeout,
+    TimeoutError,
+)
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """True for 429s, timeouts and overload responses"""
+    if isinstance(error, THROTTLE_ERRORS):
+        return True
+    return error_status(error) in (429, 502, 503, 504)
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of an OpenAI error or a requests HTTPError (local backend), if any"""
+    status = getattr(error, 'http_status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease limit on in-flight requests"""
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 backoff: float = 0.5, latency_tolerance: float = 2.0, window: int = 50):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+
+        self.latencies = deque(maxlen=window)
+        self.baseline_latency = None
+        self.successes = 0
+        self.throttled = 0
+        self.failures = 0
+        self._last_backoff = 0.0
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def record_success(self, latency: float) -> None:
+        """Grow by ~1 slot per window of successes while latency stays near baseline"""
+        self.successes += 1
+        self.latencies.append(latency)
+
+        # Baseline tracks the best latency we have seen, decaying slowly upwards
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            self.baseline_latency = 0.99 * self.baseline_latency + 0.01 * latency
+
+        if latency <= self.baseline_latency * self.latency_tolerance:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def record_error(self, error: Exception) -> None:
+        """Halve the limit on congestion, at most once per observed round-trip"""
+        if not is_throttle_error(error):
+            self.failures += 1
+            return
+
+        self.throttled += 1
+        now = time.monotonic()
+        cooldown = self.baseline_latency or 1.0
+        if now - self._last_backoff >= cooldown:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_backoff = now
+
+    def average_latency(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        return sum(self.latencies) / len(self.latencies)
+
+
+def _timed_call(fn: Callable, task: Any, delay: float = 0) -> tuple:
+    if delay:
+        time.sleep(delay)
+    start = time.monotonic()
+    try:
+        return fn(task), None, time.monotonic() - start
+    except Exception as e:
+        return None, e, time.monotonic() - start
+
+
+def run_adaptive(tasks: Iterable, fn: Callable, controller: AIMDController,
+                 on_done: Callable[[Any, Any, Optional[Exception]], None], max_retries: int = 3) -> None:
+    """Run fn(task) for every task under the controller's limit
+
+    on_done(task, result, error) is always called on the calling thread, so it
+    may safely update Streamlit elements. Throttled tasks are re-queued up to
+    max_retries times before being reported as failed.
+    """
+    queue = deque((task, 0) for task in tasks)
+    context = contextvars.copy_context()
+
+    with ThreadPoolExecutor(max_workers=controller.max_limit) as executor:
+        pending = {}
+        while queue or pending:
+            while queue and len(pending) < controller.current_limit:
+                task, attempt = queue.popleft()
+                # Retries wait in the worker so the dispatch loop never blocks
+                delay = min(2 ** attempt, 10) if attempt else 0
+                pending[executor.submit(context.copy().run, _timed_call, fn, task, delay)] = (task, attempt)
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, attempt = pending.pop(future)
+                result, error, latency = future.result()
+
+                if error is None:
+                    controller.record_success(latency)
+                    on_done(task, result, None)
+                    continue
+
+                controller.record_error(error)
+                if is_throttle_error(error) and attempt < max_retries:
+                    queue.append((task, attempt + 1))
+                else:
+                    on_done(task, None, error)
@@ -103,6 +103,17 @@ def run_app():
     except Exception as e:
         print(f"❌ Error starting app: {e}")
 
+def run_app_workers():
+    """Run several app workers behind a local proxy (production)"""
+    workers = input(f"\nNumber of app workers [{os.cpu_count() or 1}]: ").strip()
+    try:
+        from launcher import run
+        run(int(workers) if workers else None)
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped by user")
+    except Exception as e:
+        print(f"❌ Error starting app workers: {e}")
+
 def deploy_streamlit_cloud():
     """Instructions for Streamlit Cloud deployment"""
     print("\n☁️  Streamlit Cloud Deployment")
@@ -139,16 +150,19 @@ def main():
         print("\n" + "=" * 50)
         print("Choose an option:")
         print("1. Run app locally")
-        print("2. Deploy to Streamlit Cloud")
-        print("3. Exit")
+        print("2. Run app with several workers (production)")
+        print("3. Deploy to Streamlit Cloud")
+        print("4. Exit")
         
-        choice = input("\nEnter your choice (1-3): ").strip()
+        choice = input("\nEnter your choice (1-4): ").strip()
         
         if choice == '1':
             run_app()
         elif choice == '2':
-            deploy_streamlit_cloud()
+            run_app_workers()
         elif choice == '3':
+            deploy_streamlit_cloud()
+        elif choice == '4':
             print("👋 Goodbye!")
             break
         else:
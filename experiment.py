@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Compare prompt templates x temperatures x models on a sample of the catalogue.
+
+Every variant sees the same sampled rows. Each template's prompts are rendered
+once per row and shared by all temperatures and models, and responses are
+cached on disk by (prompt, model, temperature, replicate), so re-running an
+experiment with one extra variant only calls the API for the new variant.
+All variants run concurrently on the shared job scheduler.
+
+Example:
+    python experiment.py --templates default prompts/concise.j2 \\
+        --temperatures 0.3 1.0 --models gpt-4o-mini gpt-4.1-mini --rows 50
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import threading
+from collections import Counter
+from typing import Dict, List
+
+import pandas as pd
+from dotenv import load_dotenv
+from jinja2 import Template
+
+from benchmark_backends import load_rows
+from guidelines import MAX_TITLE_LENGTH, check_title, missing_title_keywords_batch
+from scheduler import get_scheduler
+from title_engine import DEFAULT_MODEL, TITLE_PROMPT_TEMPLATE, missing_pack_phrases, request_completion
+
+DEFAULT_TEMPLATE = 'default'
+
+CACHE_PATH = os.getenv('EXPERIMENT_CACHE', os.path.join('output', 'experiments', 'responses.jsonl'))
+
+
+def load_template(spec: str) -> tuple:
+    """(name, version, Template) for 'default' (the app's template) or a Jinja2 template file"""
+    if spec == DEFAULT_TEMPLATE:
+        source = TITLE_PROMPT_TEMPLATE
+    else:
+        with open(spec, encoding='utf-8') as f:
+            source = f.read()
+    version = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+    return os.path.splitext(os.path.basename(spec))[0], version, Template(source)
+
+
+class ResponseCache:
+    """Append-only JSON-lines cache of completions, shared across experiment runs"""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._entries[entry['key']] = entry['result']
+
+    @staticmethod
+    def key(prompt: str, model: str, temperature: float, replicate: int, backend: str) -> str:
+        payload = '\x1f'.join([prompt, model, f"{temperature:g}", str(replicate), backend or ''])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        return self._entries.get(key)
+
+    def put(self, key: str, result: list) -> None:
+        with self._lock:
+            self._entries[key] = result
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'key': key, 'result': result}) + '\n')
+
+
+def run_experiment(rows: List[tuple], templates: List[str], temperatures: List[float], models: List[str],
+                   examples: List[Dict] = None, backend: str = None, cache: ResponseCache = None) -> pd.DataFrame:
+    """One result row per (variant, catalogue row), with the title, usage and guideline issues"""
+    cache = cache or ResponseCache(None)
+    loaded = [load_template(spec) for spec in templates]
+
+    # Render each template once per row; temperatures and models reuse the text
+    missing = missing_title_keywords_batch([row[0] for row in rows], [row[1] for row in rows])
+    prompts = {
+        (name, position): template.render(old_title=old_title, description=description,
+                                          examples=examples or [], keywords=[], title_pattern='',
+                                          missing_keywords=missing[position]
+                                          + missing_pack_phrases(old_title, description))
+        for name, _, template in loaded
+        for position, (old_title, description) in enumerate(rows)
+    }
+
+    # Rows repeated in the sample get a replicate number so each is a separate draw
+    seen = Counter()
+    replicates = []
+    for row in rows:
+        replicates.append(seen[row])
+        seen[row] += 1
+
+    tasks = []
+    for (name, version, _), temperature, model in itertools.product(loaded, temperatures, models):
+        for position in range(len(rows)):
+            prompt = prompts[(name, position)]
+            tasks.append({
+                'template': name,
+                'template_version': version,
+                'temperature': temperature,
+                'model': model,
+                'position': position,
+                'key': ResponseCache.key(prompt, model, temperature, replicates[position], backend),
+                'prompt': prompt,
+            })
+
+    # Identical requests (same cache key) are sent once
+    pending = {}
+    for task in tasks:
+        if cache.get(task['key']) is None:
+            pending.setdefault(task['key'], task)
+    cached = len(tasks) - len(pending)
+
+    def generate(task):
+        return list(request_completion(task['prompt'], task['temperature'], task['model'], backend=backend))
+
+    errors = {}
+
+    def on_done(task, result, error):
+        if error is not None:
+            errors[task['key']] = str(error)
+        else:
+            cache.put(task['key'], result)
+
+    print(f"🔄 {len(tasks)} generations ({len(pending)} API calls, {cached} from cache)")
+    if pending:
+        get_scheduler().run_job(pending.values(), generate, on_done, name='experiment')
+
+    records = []
+    for task in tasks:
+        old_title, description = rows[task['position']]
+        result = cache.get(task['key'])
+        title, cost, input_tokens, output_tokens = result if result is not None else (None, 0.0, 0, 0)
+        records.append({
+            'template': task['template'],
+            'template_version': task['template_version'],
+            'temperature': task['temperature'],
+            'model': task['model'],
+            'row': task['position'],
+            'old_title': old_title,
+            'new_title': title,
+            'title_length': len(title) if title else None,
+            'guideline_issues': ', '.join(check_title(title, old_title, description)) if title else None,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cost': cost,
+            'error': errors.get(task['key']),
+        })
+    return pd.DataFrame(records)
+
+
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    """Side-by-side metrics, one row per variant"""
+    variant = ['template', 'template_version', 'temperature', 'model']
+    generated = results[results['new_title'].notna()]
+    issue_counts = (
+        generated.assign(issue=generated['guideline_issues'].str.split(', '))
+        .explode('issue').query("issue != ''")
+        .groupby(variant)['issue'].agg(lambda s: s.value_counts().index[0])
+    )
+    lengths = generated.groupby(variant)['title_length']
+
+    summary = results.groupby(variant).agg(rows=('row', 'size'), failed=('error', 'count'))
+    summary['guideline_pass_rate'] = generated.groupby(variant)['guideline_issues'].agg(lambda s: (s == '').mean())
+    summary['most_common_issue'] = issue_counts
+    summary['length_p10'] = lengths.quantile(0.1)
+    summary['length_p50'] = lengths.median()
+    summary['length_p90'] = lengths.quantile(0.9)
+    summary['over_max_length'] = lengths.agg(lambda s: (s > MAX_TITLE_LENGTH).mean())
+    summary['avg_input_tokens'] = generated.groupby(variant)['input_tokens'].mean()
+    summary['avg_output_tokens'] = generated.groupby(variant)['output_tokens'].mean()
+    summary['total_cost'] = results.groupby(variant)['cost'].sum()
+    summary['cost_per_1k_titles'] = generated.groupby(variant)['cost'].mean() * 1000
+    return summary.reset_index()
+
+
+def titles_side_by_side(results: pd.DataFrame) -> pd.DataFrame:
+    """One row per catalogue row, one title column per variant"""
+    label = (results['template'] + ' · t=' + results['temperature'].map('{:g}'.format)
+             + ' · ' + results['model'])
+    wide = results.assign(variant=label).pivot_table(
+        index=['row', 'old_title'], columns='variant', values='new_title', aggfunc='first'
+    )
+    return wide.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--templates', nargs='+', default=[DEFAULT_TEMPLATE],
+                        help="'default' and/or Jinja2 template files with the same variables "
+                             "(old_title, description, examples, missing_keywords)")
+    parser.add_argument('--temperatures', nargs='+', type=float, default=[1.0])
+    parser.add_argument('--models', nargs='+', default=[DEFAULT_MODEL])
+    parser.add_argument('--backend', help="completion backend (defaults to TITLE_BACKEND)")
+    parser.add_argument('--data', default='data/Amazon_Data.xlsx', help="catalogue workbook")
+    parser.add_argument('--sheet', default='Title', help="sheet holding 'Title ' and 'Bullet Points'")
+    parser.add_argument('--examples', default='data/Amazon_Competitors.xlsx', help="competitor examples workbook ('' for none)")
+    parser.add_argument('--rows', type=int, default=20, help="rows to sample")
+    parser.add_argument('--seed', type=int, default=0, help="sampling seed")
+    parser.add_argument('--no-cache', action='store_true', help="ignore and don't write the response cache")
+    parser.add_argument('--output', default=os.path.join('output', 'experiments', 'report.xlsx'))
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    rows = load_rows(args.data, args.sheet, None)
+    rows = pd.Series(rows).sample(min(args.rows, len(rows)), random_state=args.seed).tolist()
+    examples = []
+    if args.examples:
+        examples = pd.read_excel(args.examples, sheet_name=0)[['Title', 'Bullet Points']].to_dict(orient='records')
+
+    variants = len(args.templates) * len(args.temperatures) * len(args.models)
+    print(f"🧪 {variants} variants on {len(rows)} sampled rows")
+
+    results = run_experiment(rows, args.templates, args.temperatures, args.models, examples, args.backend,
+                             ResponseCache(None if args.no_cache else CACHE_PATH))
+    summary = summarize(results)
+
+    print("\n" + "=" * 60)
+    print(summary.to_string(index=False))
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with pd.ExcelWriter(args.output, engine='openpyxl') as writer:
+        summary.to_excel(writer, sheet_name='Variant_Summary', index=False)
+        titles_side_by_side(results).to_excel(writer, sheet_name='Titles_Side_By_Side', index=False)
+        results.to_excel(writer, sheet_name='All_Results', index=False)
+    print(f"\n✅ Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Local checks for the title guidelines in the prompt template.
+
+These mirror the "Guidelines:" block of TITLE_PROMPT_TEMPLATE so a title can
+be validated without another API call.
+"""
+
+import re
+from typing import List, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+from synonyms import default_matcher
+
+MAX_TITLE_LENGTH = 200
+KEY_SECTION_LENGTH = 80
+
+BRAND_NAMES = {'ledsone'}
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it',
+    'of', 'on', 'or', 'the', 'to', 'with', 'without', 'uk', 'x', 'pcs', 'pack', 'set',
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+# "compatible" / "kompatibel" / "compatibile" in the key section
+COMPATIBILITY_PATTERN = re.compile(r"[ck]ompatib", re.IGNORECASE)
+PACK_PATTERN = re.compile(
+    r"\b(?:pack|set|box) of (\d+)\b|\b(\d+)\s*-?\s*(?:pack|pcs|pieces|piece|pk)\b",
+    re.IGNORECASE
+)
+
+# Issue codes
+EMPTY = 'empty'
+TOO_LONG = 'too_long'
+BRAND = 'brand_name'
+SYNONYMS = 'synonyms'
+MISSING_KEYWORDS = 'missing_old_title_keywords'
+COMPATIBILITY = 'compatibility_in_first_80'
+MISSING_PACK = 'missing_pack_size'
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens"""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def keywords(text: str) -> Set[str]:
+    """Content words: tokens minus stopwords, brands and one-letter noise"""
+    return {t for t in tokenize(text) if len(t) > 1 and t not in STOPWORDS and t not in BRAND_NAMES}
+
+
+def missing_title_keywords(old_title: str, description: str) -> List[str]:
+    """Keywords of the old title that the description does not mention, in title order"""
+    return _missing_keywords(old_title, set(tokenize(description)))
+
+
+def _missing_keywords(old_title: str, described: Set[str]) -> List[str]:
+    # Title tokens are filtered below, so described needs no stopword filtering
+    seen = set()
+    missing = []
+    for token in tokenize(old_title):
+        if token in seen or token in described or token in STOPWORDS or token in BRAND_NAMES or len(token) < 2:
+            continue
+        seen.add(token)
+        missing.append(token)
+    return missing
+
+
+def missing_title_keywords_batch(old_titles: Sequence[str], descriptions: Sequence[str]) -> List[List[str]]:
+    """missing_title_keywords for a whole sheet, computed once per distinct text
+
+    Colour and size variants usually share bullet points (and often titles),
+    so a repeated description is tokenized once and each distinct
+    (title, description) pair is diffed once.
+    """
+    titles = pd.Series(old_titles, dtype=object).reset_index(drop=True).fillna('').astype(str).tolist()
+    description_ids, distinct = pd.factorize(
+        pd.Series(descriptions, dtype=object).reset_index(drop=True).fillna('').astype(str)
+    )
+    # Only repeated descriptions are worth keeping tokenized
+    repeated = np.bincount(description_ids, minlength=len(distinct)) > 1 if len(distinct) else []
+
+    described_cache = {}
+    missing_cache = {}
+    result = []
+    for title, description_id in zip(titles, description_ids.tolist()):
+        key = (title, description_id)
+        if key not in missing_cache:
+            described = described_cache.get(description_id)
+            if described is None:
+                described = set(tokenize(distinct[description_id]))
+                if repeated[description_id]:
+                    described_cache[description_id] = described
+            missing_cache[key] = _missing_keywords(title, described)
+        result.append(missing_cache[key])
+    return result
+
+
+def pack_sizes(text: str) -> Set[str]:
+    return {a or b for a, b in PACK_PATTERN.findall(text or '')}
+
+
+def check_title(title: str, old_title: str = '', description: str = '',
+                min_keyword_coverage: float = 0.5, english: bool = True) -> List[str]:
+    """Return the guideline issue codes a generated title violates (empty list = passes)
+
+    For titles in another language (english=False) the synonym lexicon and the
+    old-title keyword coverage don't apply, since both are English word lists.
+    """
+    if not title or not title.strip():
+        return [EMPTY]
+
+    issues = []
+    tokens = set(tokenize(title))
+    key_section = title[:KEY_SECTION_LENGTH]
+
+    if len(title) > MAX_TITLE_LENGTH:
+        issues.append(TOO_LONG)
+
+    if tokens & BRAND_NAMES:
+        issues.append(BRAND)
+
+    if english and default_matcher().redundant_groups(title):
+        issues.append(SYNONYMS)
+
+    missing = missing_title_keywords(old_title, description) if english else []
+    if missing:
+        covered = set(tokenize(key_section))
+        coverage = sum(1 for k in missing if k in covered) / len(missing)
+        if coverage < min_keyword_coverage:
+            issues.append(MISSING_KEYWORDS)
+
+    if COMPATIBILITY_PATTERN.search(key_section):
+        issues.append(COMPATIBILITY)
+
+    sizes = pack_sizes(description)
+    if sizes and not sizes & set(re.findall(r'\d+', title)):
+        issues.append(MISSING_PACK)
+
+    return issues
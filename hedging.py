@@ -0,0 +1,162 @@
+"""
+Hedged requests to cut the tail latency of batch runs.
+
+A request still running after the running p95 latency of its model gets a
+duplicate, and whichever succeeds first is used. A blocking HTTP call can't
+be interrupted from Python, so the other request is abandoned: its result is
+discarded when it returns and its cost is added to the hedge spend. Hedges are
+capped at HEDGE_MAX_FRACTION of requests, and each one needs a free slot of
+the scheduler's shared in-flight limit, so they can't pile extra load onto an
+API that is slow for everyone.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from scheduler import JobScheduler
+
+# Hedge once a request has run longer than this quantile of recent latencies
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '0.95'))
+
+# At most this share of requests gets a duplicate (above 1 - HEDGE_PERCENTILE,
+# so stragglers still find budget once ordinary slow requests have used theirs)
+HEDGE_MAX_FRACTION = float(os.getenv('HEDGE_MAX_FRACTION', '0.1'))
+
+# Latencies needed before the percentile is trusted
+HEDGE_MIN_SAMPLES = 20
+
+# How long close() waits for abandoned requests, so their cost reaches the report
+HEDGE_DRAIN_SECONDS = float(os.getenv('HEDGE_DRAIN_SECONDS', '5'))
+
+
+class Hedger:
+    """Runs calls with a p95-delayed duplicate; one instance per batch run"""
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, max_fraction: float = HEDGE_MAX_FRACTION,
+                 min_samples: int = HEDGE_MIN_SAMPLES, window: int = 200, max_workers: int = 128,
+                 cost_of: Callable[[Any], float] = lambda result: result[1],
+                 scheduler: JobScheduler = None):
+        self.percentile = percentile
+        self.max_fraction = max_fraction
+        self.min_samples = min_samples
+        self.cost_of = cost_of
+        # Duplicates take a slot of this scheduler's in-flight limit, or aren't sent
+        self.scheduler = scheduler
+
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        # Primaries run here too, so the pool must not be smaller than the callers' concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedged-request')
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedge_cost = 0.0
+        self.hedges_without_slot = 0
+        self.abandoned_in_flight = 0
+
+    def threshold(self, key: str) -> Optional[float]:
+        """Running latency percentile for key; None until there are enough samples"""
+        with self._lock:
+            samples = sorted(self._latencies[key])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(self.percentile * len(samples)), len(samples) - 1)]
+
+    def _submit(self, key: str, fn: Callable, args: tuple, kwargs: Dict) -> Future:
+        start = time.monotonic()
+        # In the caller's context, so the usage ledger attributes the request to its job
+        future = self._executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+        def observe(f):
+            # Every successful call counts, stragglers included, so the percentile stays honest
+            if f.exception() is None:
+                with self._lock:
+                    self._latencies[key].append(time.monotonic() - start)
+
+        future.add_done_callback(observe)
+        return future
+
+    def _reserve_hedge(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.max_fraction * self.requests:
+                return False
+            if self.scheduler is not None and not self.scheduler.try_acquire_slot():
+                self.hedges_without_slot += 1
+                return False
+            self.hedged += 1
+            return True
+
+    def _submit_hedge(self, key: str, fn: Callable, args: tuple, kwargs: Dict) -> Future:
+        start = time.monotonic()
+        hedge = self._submit(key, fn, args, kwargs)
+        if self.scheduler is not None:
+            # The slot is held until the duplicate returns, even once abandoned
+            hedge.add_done_callback(lambda f: self.scheduler.release_slot(time.monotonic() - start, f.exception()))
+        return hedge
+
+    def _abandon(self, future: Future) -> None:
+        with self._lock:
+            self.abandoned_in_flight += 1
+
+        def settle(f):
+            with self._lock:
+                self.abandoned_in_flight -= 1
+                if f.exception() is None:
+                    self.hedge_cost += self.cost_of(f.result())
+                self._settled.notify_all()
+
+        future.add_done_callback(settle)
+
+    def call(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """fn(*args, **kwargs), hedged against the latency of earlier calls with the same key"""
+        with self._lock:
+            self.requests += 1
+        primary = self._submit(key, fn, args, kwargs)
+
+        delay = self.threshold(key)
+        if delay is None or wait([primary], timeout=delay).done or not self._reserve_hedge():
+            return primary.result()
+
+        hedge = self._submit_hedge(key, fn, args, kwargs)
+        pending, winner = {primary, hedge}, None
+        # The first success wins; a failure only counts if both requests fail
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in done if f.exception() is None), None)
+
+        if winner is None:
+            return primary.result()
+        loser = hedge if winner is primary else primary
+        self._abandon(loser)
+        if winner is hedge:
+            with self._lock:
+                self.hedge_wins += 1
+        return winner.result()
+
+    def report(self) -> Dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'hedge_cost': self.hedge_cost,
+                'hedges_without_slot': self.hedges_without_slot,
+                'abandoned_in_flight': self.abandoned_in_flight,
+            }
+
+    def close(self, timeout: float = HEDGE_DRAIN_SECONDS) -> None:
+        """Wait up to timeout for abandoned requests to return, so report() includes their cost
+
+        Any still running after that are counted in abandoned_in_flight; their
+        cost is recorded in the usage ledger when they return.
+        """
+        with self._settled:
+            self._settled.wait_for(lambda: not self.abandoned_in_flight, timeout)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,69 @@
+"""
+Change detection for incremental title regeneration.
+
+Each input row is fingerprinted from everything that shapes its prompt: the
+old title, the bullet points, the few-shot examples and the prompt version.
+Rows whose fingerprint already exists in a previous run's results are reused
+instead of being sent to the API again.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+FINGERPRINT_COLUMN = 'fingerprint'
+
+# Per-marketplace outputs of multi-marketplace runs (title_DE, issues_DE, ...)
+MARKETPLACE_COLUMN_PREFIXES = ('title_', 'issues_')
+
+# create_prompt only ever uses the first five custom examples
+PROMPT_EXAMPLE_LIMIT = 5
+
+
+def examples_fingerprint(examples: Optional[List[Dict]]) -> str:
+    """Stable hash of the examples that actually reach the prompt"""
+    used = [
+        {'Title': str(e.get('Title', '')), 'Bullet Points': str(e.get('Bullet Points', ''))}
+        for e in (examples or [])[:PROMPT_EXAMPLE_LIMIT]
+    ]
+    payload = json.dumps(used, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def row_fingerprint(old_title: str, bullet_points: str, examples_key: str, prompt_version: str) -> str:
+    """Hash of a single row's prompt inputs"""
+    payload = '\x1f'.join([
+        (old_title or '').strip(),
+        (bullet_points or '').strip(),
+        examples_key,
+        prompt_version,
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def previous_results_index(previous_results: Optional[pd.DataFrame]) -> Dict[str, Dict]:
+    """Map fingerprint -> stored result row for a previous run"""
+    if previous_results is None or previous_results.empty or FINGERPRINT_COLUMN not in previous_results.columns:
+        return {}
+
+    previous = previous_results.dropna(subset=[FINGERPRINT_COLUMN, 'new_title'])
+    previous = previous.drop_duplicates(subset=[FINGERPRINT_COLUMN], keep='last')
+    return previous.set_index(FINGERPRINT_COLUMN, drop=False).to_dict(orient='index')
+
+
+def reuse_result(previous_row: Dict) -> Dict:
+    """Carry a previous title into this run without charging it again (outputs only)"""
+    return {
+        'new_title': previous_row['new_title'],
+        'cost': 0.0,
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'model': previous_row.get('model'),
+        'guideline_issues': previous_row.get('guideline_issues'),
+        FINGERPRINT_COLUMN: previous_row[FINGERPRINT_COLUMN],
+        'reused': True,
+        **{column: value for column, value in previous_row.items()
+           if column.startswith(MARKETPLACE_COLUMN_PREFIXES)},
+    }
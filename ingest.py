@@ -0,0 +1,115 @@
+"""
+Parallel Excel ingestion for multi-sheet, multi-file catalogues.
+
+Each sheet is parsed in its own worker process, converted to an Arrow table
+and merged into a single catalogue with a category column (the sheet name,
+e.g. BULB) and the file it came from.
+"""
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+CATEGORY_COLUMN = 'category'
+SOURCE_COLUMN = 'source_file'
+
+
+def read_source(source) -> Tuple[str, bytes]:
+    """Return (name, raw bytes) for a file path or an uploaded file object"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return os.path.basename(source), f.read()
+
+    data = source.getvalue() if hasattr(source, 'getvalue') else source.read()
+    return getattr(source, 'name', 'upload.xlsx'), data
+
+
+def list_sheets(data: bytes) -> List[str]:
+    """List sheet names without parsing any cell data"""
+    workbook = load_workbook(io.BytesIO(data), read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def dataframe_to_arrow(df: pd.DataFrame) -> pa.Table:
+    """Convert a parsed sheet to Arrow, normalising mixed-type text columns"""
+    df = df.dropna(how='all')
+    df.columns = [str(col) for col in df.columns]
+
+    # Excel columns such as ASINs mix numbers and strings, which Arrow rejects
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: str(v) if pd.notna(v) else None)
+
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _parse_sheet(file_name: str, data: bytes, sheet_name: str) -> pa.Table:
+    """Worker: parse a single sheet and tag it with its category and file"""
+    df = pd.read_excel(io.BytesIO(data), sheet_name=sheet_name)
+    table = dataframe_to_arrow(df)
+    table = table.append_column(CATEGORY_COLUMN, pa.array([sheet_name] * table.num_rows, pa.string()))
+    table = table.append_column(SOURCE_COLUMN, pa.array([file_name] * table.num_rows, pa.string()))
+    return table
+
+
+def _select_sheets(available: List[str], sheets: Optional[Sequence[Union[str, int]]]) -> List[str]:
+    """Resolve sheet names/indices against the sheets present in a workbook"""
+    if sheets is None:
+        return available
+
+    selected = []
+    for sheet in sheets:
+        if isinstance(sheet, int):
+            if sheet < len(available):
+                selected.append(available[sheet])
+        elif sheet in available:
+            selected.append(sheet)
+    return selected
+
+
+def load_catalogue_table(sources: Sequence, sheets: Optional[Sequence[Union[str, int]]] = None,
+                         max_workers: Optional[int] = None) -> pa.Table:
+    """Parse every selected sheet of every source in parallel and merge them into one Arrow table
+
+    Sources may be file paths, uploaded file objects or (name, bytes) pairs.
+    """
+    tasks = []
+    for source in sources:
+        file_name, data = source if isinstance(source, tuple) else read_source(source)
+        for sheet_name in _select_sheets(list_sheets(data), sheets):
+            tasks.append((file_name, data, sheet_name))
+
+    if not tasks:
+        return pa.table({CATEGORY_COLUMN: pa.array([], pa.string()), SOURCE_COLUMN: pa.array([], pa.string())})
+
+    # A single sheet is not worth the process start-up cost
+    if len(tasks) == 1:
+        tables = [_parse_sheet(*tasks[0])]
+    else:
+        workers = min(len(tasks), max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            tables = list(executor.map(_parse_sheet, *zip(*tasks)))
+
+    # Sheets may carry different columns; missing ones become nulls
+    return pa.concat_tables(tables, promote_options='permissive')
+
+
+def load_catalogue(sources: Sequence, sheets: Optional[Sequence[Union[str, int]]] = None,
+                   max_workers: Optional[int] = None, parquet_path: Optional[str] = None) -> pd.DataFrame:
+    """Load a merged catalogue as a DataFrame, optionally persisting it as Parquet"""
+    table = load_catalogue_table(sources, sheets=sheets, max_workers=max_workers)
+
+    if parquet_path:
+        os.makedirs(os.path.dirname(parquet_path) or '.', exist_ok=True)
+        pq.write_table(table, parquet_path)
+
+    return table.to_pandas()
@@ -0,0 +1,152 @@
+"""
+Compact keyword index mined from the competitors file.
+
+Instead of pasting full competitor bullet points and titles into every prompt,
+the competitors sheet is reduced once (vectorized pandas) to, per category:
+
+- term and bigram weights: the share of competitor titles using them
+- typical title patterns: common opening words, median length, separators
+
+Each row's prompt then only carries the handful of high-value keywords that
+are relevant to that product.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from guidelines import BRAND_NAMES, STOPWORDS, TOKEN_PATTERN
+
+ALL_CATEGORIES = '__all__'
+
+
+def _title_tokens(titles: pd.Series) -> tuple:
+    """Integer-coded tokens: (doc ids, token codes, vocabulary, content-word mask per code)"""
+    tokens = titles.fillna('').astype(str).str.lower().str.findall(TOKEN_PATTERN.pattern).explode().dropna()
+    codes, vocabulary = pd.factorize(tokens, sort=False)
+    excluded = STOPWORDS | BRAND_NAMES
+    is_content = np.array([len(t) > 1 and t not in excluded for t in vocabulary], dtype=bool)
+    return tokens.index.to_numpy(), codes.astype(np.int64), np.asarray(vocabulary, dtype=object), is_content
+
+
+def _doc_share(doc: np.ndarray, keys: np.ndarray, n_docs: int, top_n: int) -> tuple:
+    """Top keys by the share of titles (docs) containing them"""
+    if not len(keys) or not n_docs:
+        return np.array([], dtype=np.int64), np.array([])
+    pairs = pd.DataFrame({'doc': doc, 'key': keys}).drop_duplicates()
+    counts = pairs['key'].value_counts().head(top_n)
+    return counts.index.to_numpy(), (counts.to_numpy() / n_docs).round(4)
+
+
+def _category_entry(titles: pd.Series, top_terms: int, top_bigrams: int) -> Dict:
+    doc, codes, vocabulary, is_content = _title_tokens(titles)
+    n_docs = int(titles.notna().sum())
+    size = max(len(vocabulary), 1)
+
+    content = is_content[codes] if len(codes) else np.array([], dtype=bool)
+    term_keys, term_shares = _doc_share(doc[content], codes[content], n_docs, top_terms)
+
+    # Bigrams: adjacent content words of the same title, packed into one integer key
+    adjacent = (doc[:-1] == doc[1:]) & content[:-1] & content[1:]
+    bigram_keys = codes[:-1][adjacent] * size + codes[1:][adjacent]
+    bigram_keys, bigram_shares = _doc_share(doc[:-1][adjacent], bigram_keys, n_docs, top_bigrams)
+
+    # Opening words say what competitors lead with: the first three content words
+    content_doc = pd.Series(codes[content], index=doc[content])
+    rank = content_doc.groupby(level=0).cumcount().to_numpy()
+    firsts = content_doc[rank < 3]
+    firsts = pd.DataFrame({'doc': firsts.index, 'rank': rank[rank < 3], 'code': firsts.to_numpy()})
+    openings = firsts.pivot(index='doc', columns='rank', values='code').dropna()
+    opening_counts = openings.value_counts().head(3).index if not openings.empty else []
+
+    present = titles.dropna().astype(str)
+    lengths = present.str.len()
+    dash_share = float(present.str.contains(' - ', regex=False).mean()) if len(present) else 0.0
+
+    return {
+        'titles': n_docs,
+        'terms': dict(zip(vocabulary[term_keys].tolist(), term_shares.tolist())),
+        'bigrams': {
+            f"{vocabulary[k // size]} {vocabulary[k % size]}": share
+            for k, share in zip(bigram_keys.tolist(), bigram_shares.tolist())
+        },
+        'patterns': {
+            'common_openings': [' '.join(vocabulary[int(c)] for c in opening) for opening in opening_counts],
+            'median_length': int(np.median(lengths)) if len(lengths) else 0,
+            'dash_separator_share': round(dash_share, 3),
+        },
+    }
+
+
+def build_keyword_index(competitors_df: pd.DataFrame, category_column: str = 'category',
+                        top_terms: int = 200, top_bigrams: int = 100) -> Dict:
+    """Mine competitor titles into a per-category keyword index"""
+    categories = {ALL_CATEGORIES: _category_entry(competitors_df['Title'], top_terms, top_bigrams)}
+
+    if category_column in competitors_df.columns:
+        for category, group in competitors_df.groupby(category_column):
+            categories[str(category)] = _category_entry(group['Title'], top_terms, top_bigrams)
+
+    index = {'categories': categories}
+    payload = json.dumps(index, sort_keys=True, ensure_ascii=False)
+    index['version'] = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    return index
+
+
+def save_keyword_index(index: Dict, path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+
+def load_keyword_index(path: str) -> Dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def relevant_keywords(index: Dict, old_title: str, description: str,
+                      category: Optional[str] = None, top_k: int = 12) -> List[str]:
+    """Competitor keywords this product actually has, strongest first
+
+    Bigrams are preferred over their individual words.
+    """
+    entry = index['categories'].get(str(category)) if category is not None else None
+    entry = entry or index['categories'][ALL_CATEGORIES]
+
+    text = ' '.join(TOKEN_PATTERN.findall(f"{old_title or ''} {description or ''}".lower()))
+    words = set(text.split())
+
+    bigrams = [(b, w) for b, w in entry['bigrams'].items() if f" {b} " in f" {text} "]
+    terms = [(t, w) for t, w in entry['terms'].items() if t in words]
+
+    selected, covered = [], set()
+    for phrase, _ in sorted(bigrams, key=lambda x: -x[1]):
+        if len(selected) >= top_k // 2:
+            break
+        selected.append(phrase)
+        covered.update(phrase.split())
+
+    for term, _ in sorted(terms, key=lambda x: -x[1]):
+        if len(selected) >= top_k:
+            break
+        if term not in covered:
+            selected.append(term)
+
+    return selected
+
+
+def title_pattern(index: Dict, category: Optional[str] = None) -> str:
+    """One-line description of how competitor titles are typically built"""
+    entry = index['categories'].get(str(category)) if category is not None else None
+    patterns = (entry or index['categories'][ALL_CATEGORIES])['patterns']
+
+    parts = []
+    if patterns['common_openings']:
+        parts.append("often starts with '" + "', '".join(patterns['common_openings']) + "'")
+    if patterns['median_length']:
+        parts.append(f"around {patterns['median_length']} characters")
+    if patterns['dash_separator_share'] >= 0.5:
+        parts.append("uses ' - ' to separate features")
+    return '; '.join(parts)
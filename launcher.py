@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Production launcher: several Streamlit workers behind a local reverse proxy.
+
+One `streamlit run app.py` serves every user from one Python process, so
+rendering, Excel parsing and result building all share one GIL. This starts
+N workers on 127.0.0.1 (ports from --base-port) and a proxy on --port that
+pins each browser session to one worker with a cookie; new sessions go to
+the healthy worker with the fewest open sessions.
+
+Workers share everything that lives on disk: the results store, the usage
+ledger and Streamlit's st.cache_data entries (persisted to disk for workers,
+so a catalogue parsed by one worker is reused by the others).
+
+    python launcher.py --workers 4 --port 8503
+
+    GET  /_proxy/health     worker status (503 when no worker takes new sessions)
+    POST /_proxy/restart    rolling restart (from localhost), same as SIGHUP
+
+A restart drains each worker in turn: it takes no new sessions, its open
+sessions are given up to DRAIN_SECONDS to finish, then it is restarted and
+must pass its health check before the next one drains. SIGTERM / Ctrl+C
+drain every worker the same way before exiting; a second Ctrl+C stops at once.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpserver import HTTPServer
+from tornado.web import Application, RequestHandler
+from tornado.websocket import WebSocketClosedError, WebSocketHandler, websocket_connect
+
+from cassette import CASSETTE_PATH, worker_cassette_path
+
+# Seconds an open session may keep a draining worker alive
+DRAIN_SECONDS = float(os.getenv('DRAIN_SECONDS', '300'))
+HEALTH_INTERVAL = float(os.getenv('HEALTH_INTERVAL', '5'))
+STARTUP_TIMEOUT = 60
+
+COOKIE = 'title_worker'
+# Requests that belong to an existing session and must reach its worker even while it drains
+SESSION_PATHS = ('/_stcore/', '/media/', '/component/')
+# Above Streamlit's maxUploadSize (200 MB)
+MAX_BODY_BYTES = 256 * 1024 * 1024
+
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailer',
+              'transfer-encoding', 'upgrade', 'content-length', 'host'}
+
+
+class Worker:
+    """One `streamlit run` process and its routing state"""
+
+    def __init__(self, index: int, port: int, app_path: str):
+        self.index = index
+        self.port = port
+        self.app_path = app_path
+        self.process = None
+        self.healthy = False
+        self.draining = False
+        # Open session websockets (a set, so sockets of a replaced process can't skew the count)
+        self.streams = set()
+
+    @property
+    def sessions(self) -> int:
+        return len(self.streams)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        env = dict(os.environ, TITLE_WORKER=str(self.index))
+        # st.cache_data entries on disk are shared by all workers
+        env.setdefault('TITLE_CACHE_PERSIST', 'disk')
+        if env.get('TITLE_CASSETTE_MODE') == 'record':
+            # One gzip stream per process, as concurrent appends would interleave; replay reads them all back
+            env['TITLE_CASSETTE'] = worker_cassette_path(env.get('TITLE_CASSETTE', CASSETTE_PATH), self.index)
+        self.process = subprocess.Popen([
+            sys.executable, '-m', 'streamlit', 'run', self.app_path,
+            '--server.port', str(self.port),
+            '--server.address', '127.0.0.1',
+            '--server.headless', 'true',
+            '--server.fileWatcherType', 'none',
+            '--browser.gatherUsageStats', 'false',
+        # Own process group, so Ctrl+C reaches only the launcher, which drains before stopping workers
+        ], env=env, start_new_session=True)
+        self.healthy = False
+
+    def stop(self, timeout: float = 10) -> None:
+        if not self.alive():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class WorkerPool:
+    """Routing, health checks and drains for the workers"""
+
+    def __init__(self, n_workers: int, base_port: int, app_path: str):
+        self.workers = [Worker(i, base_port + i, app_path) for i in range(n_workers)]
+        self.stopping = False
+        self._restarting = asyncio.Lock()
+
+    def get(self, cookie: Optional[str]) -> Optional[Worker]:
+        if cookie and cookie.isdigit() and int(cookie) < len(self.workers):
+            return self.workers[int(cookie)]
+        return None
+
+    def pick(self) -> Optional[Worker]:
+        """Healthy worker with the fewest open sessions, for a new session"""
+        if self.stopping:
+            return None
+        candidates = [w for w in self.workers if w.healthy and not w.draining]
+        return min(candidates, key=lambda w: w.sessions) if candidates else None
+
+    def route(self, cookie: Optional[str], new_session: bool) -> Optional[Worker]:
+        worker = self.get(cookie)
+        if worker is not None and worker.alive():
+            # A draining worker still serves its own sessions; only new page loads move on
+            if not (new_session and (worker.draining or not worker.healthy)):
+                return worker
+        return self.pick()
+
+    async def check(self, worker: Worker) -> bool:
+        if not worker.alive():
+            return False
+        try:
+            response = await AsyncHTTPClient().fetch(f"{worker.url}/_stcore/health", request_timeout=2)
+        except Exception:
+            return False
+        return response.code == 200
+
+    async def wait_healthy(self, worker: Worker, timeout: float = STARTUP_TIMEOUT) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if await self.check(worker):
+                worker.healthy = True
+                return True
+            await asyncio.sleep(0.5)
+        return False
+
+    async def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
+        results = await asyncio.gather(*(self.wait_healthy(w) for w in self.workers))
+        if not any(results):
+            raise RuntimeError("No worker passed its health check; see the worker output above")
+
+    async def monitor(self) -> None:
+        """Mark workers healthy or not, and restart workers that exited on their own"""
+        while not self.stopping:
+            for worker in self.workers:
+                if worker.draining or self.stopping:
+                    continue
+                if worker.process is not None and not worker.alive():
+                    print(f"⚠️ Worker {worker.index} exited ({worker.process.returncode}); restarting")
+                    worker.streams.clear()
+                    worker.start()
+                    continue
+                worker.healthy = await self.check(worker)
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    async def drain(self, worker: Worker, timeout: float = DRAIN_SECONDS) -> None:
+        worker.draining = True
+        deadline = time.monotonic() + timeout
+        while worker.sessions and time.monotonic() < deadline:
+            await asyncio.sleep(1)
+        if worker.sessions:
+            print(f"⚠️ Worker {worker.index}: {worker.sessions} sessions still open after {timeout:.0f}s")
+
+    async def rolling_restart(self) -> None:
+        """Drain, restart and health-check one worker at a time"""
+        async with self._restarting:
+            for worker in self.workers:
+                if self.stopping:
+                    return
+                print(f"🔄 Draining worker {worker.index} ({worker.sessions} open sessions)")
+                await self.drain(worker)
+                await asyncio.get_running_loop().run_in_executor(None, worker.stop)
+                worker.streams.clear()
+                worker.start()
+                healthy = await self.wait_healthy(worker)
+                worker.draining = False
+                print(f"{'✅' if healthy else '❌'} Worker {worker.index} restarted on port {worker.port}")
+
+    async def shutdown(self, timeout: float = DRAIN_SECONDS) -> None:
+        self.stopping = True
+        print(f"⏹️ Draining {sum(w.sessions for w in self.workers)} open sessions before stopping")
+        await asyncio.gather(*(self.drain(w, timeout) for w in self.workers))
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, w.stop) for w in self.workers))
+
+    def status(self) -> List[dict]:
+        return [
+            {'worker': w.index, 'port': w.port, 'alive': w.alive(), 'healthy': w.healthy,
+             'draining': w.draining, 'sessions': w.sessions}
+            for w in self.workers
+        ]
+
+
+class HealthHandler(RequestHandler):
+    def initialize(self, pool: WorkerPool):
+        self.pool = pool
+
+    def get(self):
+        accepting = self.pool.pick() is not None
+        self.set_status(200 if accepting else 503)
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps({'accepting_sessions': accepting, 'workers': self.pool.status()}))
+
+
+class RestartHandler(RequestHandler):
+    def initialize(self, pool: WorkerPool):
+        self.pool = pool
+
+    def post(self):
+        if self.request.remote_ip not in ('127.0.0.1', '::1'):
+            self.set_status(403)
+            return
+        asyncio.ensure_future(self.pool.rolling_restart())
+        self.set_status(202)
+        self.write("Rolling restart started\n")
+
+
+class StreamHandler(WebSocketHandler):
+    """Streamlit's session websocket, relayed to the session's worker"""
+
+    def initialize(self, pool: WorkerPool):
+        self.pool = pool
+        self.worker = None
+        self.upstream = None
+
+    def select_subprotocol(self, subprotocols):
+        # Streamlit passes its session details as subprotocols; the worker sees the full list
+        return subprotocols[0] if subprotocols else None
+
+    async def open(self):
+        self.worker = self.pool.route(self.get_cookie(COOKIE), new_session=False)
+        if self.worker is None:
+            self.close(1013, "No app worker available")
+            return
+        headers = {name: value for name, value in self.request.headers.get_all()
+                   if name.lower() in ('cookie', 'user-agent', 'accept-language')}
+        request = HTTPRequest(f"ws://127.0.0.1:{self.worker.port}{self.request.uri}", headers=headers)
+        try:
+            self.upstream = await websocket_connect(
+                request, on_message_callback=self._from_worker, subprotocols=self._subprotocols(),
+                max_message_size=MAX_BODY_BYTES
+            )
+        except Exception as e:
+            print(f"⚠️ Worker {self.worker.index}: websocket connect failed ({e})")
+            self.close(1011, "App worker unavailable")
+            return
+        self.worker.streams.add(self)
+
+    def _subprotocols(self) -> Optional[List[str]]:
+        header = self.request.headers.get('Sec-WebSocket-Protocol')
+        return [p.strip() for p in header.split(',')] if header else None
+
+    def _from_worker(self, message) -> None:
+        if message is None:
+            # The worker closed the session
+            self.close()
+            return
+        try:
+            self.write_message(message, binary=isinstance(message, bytes))
+        except WebSocketClosedError:
+            pass
+
+    async def on_message(self, message):
+        if self.upstream is not None:
+            await self.upstream.write_message(message, binary=isinstance(message, bytes))
+
+    def on_close(self):
+        if self.upstream is not None:
+            self.upstream.close()
+            self.upstream = None
+            self.worker.streams.discard(self)
+
+
+class ProxyHandler(RequestHandler):
+    """Every other request: pages, static files, uploads, health and media"""
+
+    SUPPORTED_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+    def initialize(self, pool: WorkerPool):
+        self.pool = pool
+
+    def compute_etag(self):
+        # Caching headers are the worker's
+        return None
+
+    async def _proxy(self):
+        new_session = self.request.method == 'GET' and not self.request.path.startswith(SESSION_PATHS)
+        worker = self.pool.route(self.get_cookie(COOKIE), new_session)
+        if worker is None:
+            self.set_status(503)
+            self.write("No app worker available; try again shortly\n")
+            return
+        if self.get_cookie(COOKIE) != str(worker.index):
+            self.set_cookie(COOKIE, str(worker.index), httponly=True, samesite='Lax')
+
+        headers = {name: value for name, value in self.request.headers.get_all()
+                   if name.lower() not in HOP_BY_HOP}
+        headers['X-Forwarded-For'] = self.request.remote_ip
+        headers['X-Forwarded-Host'] = self.request.host
+        headers['X-Forwarded-Proto'] = self.request.protocol
+        has_body = self.request.method in ('POST', 'PUT', 'PATCH')
+        request = HTTPRequest(
+            worker.url + self.request.uri, method=self.request.method, headers=headers,
+            body=self.request.body if has_body else None, allow_nonstandard_methods=True,
+            follow_redirects=False, decompress_response=False, request_timeout=600
+        )
+        try:
+            response = await AsyncHTTPClient().fetch(request, raise_error=False)
+        except Exception:
+            response = None
+        if response is None or response.code == 599:
+            self.set_status(502)
+            self.write(f"App worker {worker.index} did not answer\n")
+            return
+
+        self.set_status(response.code, response.reason)
+        self.clear_header('Content-Type')
+        for name, value in response.headers.get_all():
+            if name.lower() in HOP_BY_HOP:
+                continue
+            if name.lower() == 'set-cookie':
+                self.add_header(name, value)
+            else:
+                self.set_header(name, value)
+        if response.body and response.code not in (204, 304) and self.request.method != 'HEAD':
+            self.write(response.body)
+
+    get = head = post = put = patch = delete = options = _proxy
+
+
+def make_app(pool: WorkerPool) -> Application:
+    args = {'pool': pool}
+    return Application([
+        (r"/_proxy/health", HealthHandler, args),
+        (r"/_proxy/restart", RestartHandler, args),
+        (r"/_stcore/stream", StreamHandler, args),
+        (r".*", ProxyHandler, args),
+    ], websocket_ping_interval=20, websocket_max_message_size=MAX_BODY_BYTES)
+
+
+async def serve(workers: int, port: int, address: str, base_port: int, app_path: str) -> None:
+    AsyncHTTPClient.configure(None, max_clients=200, max_body_size=MAX_BODY_BYTES)
+    pool = WorkerPool(workers, base_port, app_path)
+    print(f"🚀 Starting {workers} app workers on ports {base_port}-{base_port + workers - 1}...")
+    try:
+        await pool.start()
+    except Exception:
+        for worker in pool.workers:
+            worker.stop()
+        raise
+
+    server = HTTPServer(make_app(pool), max_body_size=MAX_BODY_BYTES, xheaders=False)
+    server.listen(port, address)
+    print(f"🌐 Serving at http://{address}:{port} ({sum(w.healthy for w in pool.workers)} healthy workers)")
+    print("⏹️  Ctrl+C drains open sessions and stops; SIGHUP or POST /_proxy/restart restarts workers one by one")
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    interrupts = 0
+
+    def on_stop(*_):
+        nonlocal interrupts
+        interrupts += 1
+        if interrupts > 1:
+            print("\n⏹️ Stopping now")
+            for worker in pool.workers:
+                if worker.alive():
+                    worker.process.kill()
+            os._exit(1)
+        loop.call_soon_threadsafe(stop.set)
+
+    def on_restart(*_):
+        loop.call_soon_threadsafe(lambda: asyncio.ensure_future(pool.rolling_restart()))
+
+    # signal.signal works on every platform; SIGHUP only exists on Unix
+    signal.signal(signal.SIGINT, on_stop)
+    signal.signal(signal.SIGTERM, on_stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, on_restart)
+
+    monitor = asyncio.ensure_future(pool.monitor())
+    await stop.wait()
+    # Open sessions keep working (uploads included) while new ones are turned away
+    await pool.shutdown()
+    server.stop()
+    monitor.cancel()
+    print("👋 All workers stopped")
+
+
+def run(workers: int = None, port: int = 8503, address: str = 'localhost', base_port: int = 8601,
+        app_path: str = 'app.py') -> None:
+    asyncio.run(serve(workers or os.cpu_count() or 1, port, address, base_port, app_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="app worker processes")
+    parser.add_argument('--port', type=int, default=8503)
+    parser.add_argument('--address', default='localhost')
+    parser.add_argument('--base-port', type=int, default=8601, help="first worker port")
+    parser.add_argument('--app', default='app.py')
+    args = parser.parse_args()
+    run(args.workers, args.port, args.address, args.base_port, args.app)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Persistent usage ledger: every completion, plus daily rollups for fast reports.
+
+Each completion (single titles, batch rows, packed requests, hedged duplicates
+and title_FSL.py runs) is recorded with its job, user, marketplace, backend,
+model, tokens, cost and latency in an indexed SQLite file (USAGE_LEDGER,
+default output/usage.sqlite). The same transaction adds it to a daily rollup
+keyed by (day, job, user, marketplace, backend, model), so reports over months
+of history read the small rollup table instead of every completion.
+
+Job, user and marketplace come from usage_context(), which follows the work
+into scheduler and hedging threads. The ledger is bookkeeping: if its file
+can't be opened or written, a warning is printed and completions go on
+unrecorded rather than failing.
+"""
+
+import atexit
+import contextvars
+import getpass
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+LEDGER_PATH = os.getenv('USAGE_LEDGER', os.path.join('output', 'usage.sqlite'))
+DEFAULT_MARKETPLACE = os.getenv('AMAZON_MARKETPLACE', 'UK')
+
+# Completions are written in small batches rather than one transaction each
+FLUSH_ROWS = 50
+FLUSH_SECONDS = 2.0
+
+DIMENSIONS = ('job', 'user', 'marketplace', 'backend', 'model')
+
+# SQL for each reporting period, computed from the rollup's ISO day
+PERIODS = {
+    'day': "day",
+    # Monday of the week, so a week spanning New Year stays one week
+    'week': "date(day, '-6 days', 'weekday 1')",
+    'month': "substr(day, 1, 7)",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    job TEXT NOT NULL,
+    user TEXT NOT NULL,
+    marketplace TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    latency REAL NOT NULL,
+    ok INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_ts ON completions (ts);
+CREATE INDEX IF NOT EXISTS completions_job ON completions (job);
+
+CREATE TABLE IF NOT EXISTS daily_usage (
+    day TEXT NOT NULL,
+    job TEXT NOT NULL,
+    user TEXT NOT NULL,
+    marketplace TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    latency_sum REAL NOT NULL,
+    PRIMARY KEY (day, job, user, marketplace, backend, model)
+);
+"""
+
+_context = contextvars.ContextVar('usage_context', default={})
+
+
+@contextmanager
+def usage_context(**fields):
+    """Attribute completions made inside the block to a job / user / marketplace"""
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def default_user() -> str:
+    try:
+        return os.getenv('USAGE_USER') or getpass.getuser()
+    except (KeyError, OSError):
+        return 'unknown'
+
+
+class UsageLedger:
+    """Buffered, thread-safe writer and rollup reader for the ledger file"""
+
+    def __init__(self, path: str = LEDGER_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+    def record(self, backend: str, model: str, input_tokens: int, output_tokens: int, cost: float,
+               latency: float, ok: bool = True, marketplaces: List[str] = None) -> None:
+        """One completion, attributed to the current usage_context()
+
+        A completion that served several marketplaces is recorded once for each,
+        with an even share of its tokens and cost and its full latency.
+        """
+        context = _context.get()
+        now = time.time()
+        day = datetime.fromtimestamp(now, timezone.utc).date().isoformat()
+        marketplaces = marketplaces or [context.get('marketplace', DEFAULT_MARKETPLACE)]
+        n = len(marketplaces)
+        rows = [
+            (
+                now,
+                day,
+                context.get('job', 'interactive'),
+                context.get('user') or default_user(),
+                marketplace,
+                backend,
+                model,
+                # Integer shares; the first marketplace takes the remainder so totals still add up
+                int(input_tokens) // n + (int(input_tokens) % n if i == 0 else 0),
+                int(output_tokens) // n + (int(output_tokens) % n if i == 0 else 0),
+                float(cost) / n,
+                float(latency),
+                int(ok),
+            )
+            for i, marketplace in enumerate(marketplaces)
+        ]
+        with self._lock:
+            self._buffer.extend(rows)
+            due = len(self._buffer) >= FLUSH_ROWS or time.monotonic() - self._last_flush >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered completions and their rollups in one transaction; on a write error they are dropped"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not rows:
+                return
+
+            rollup = {}
+            for _, day, job, user, marketplace, backend, model, tokens_in, tokens_out, cost, latency, ok in rows:
+                totals = rollup.setdefault((day, job, user, marketplace, backend, model), [0, 0, 0, 0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += 1 - ok
+                totals[2] += tokens_in
+                totals[3] += tokens_out
+                totals[4] += cost
+                totals[5] += latency
+
+            try:
+                self._write(rows, rollup)
+            except (sqlite3.Error, OSError) as e:
+                warn_unavailable(self.path, e)
+
+    def _write(self, rows: List[tuple], rollup: dict) -> None:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.executemany("INSERT INTO completions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.executemany(
+                "INSERT INTO daily_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (day, job, user, marketplace, backend, model) DO UPDATE SET"
+                " requests = requests + excluded.requests, failed = failed + excluded.failed,"
+                " input_tokens = input_tokens + excluded.input_tokens,"
+                " output_tokens = output_tokens + excluded.output_tokens,"
+                " cost = cost + excluded.cost, latency_sum = latency_sum + excluded.latency_sum",
+                [key + tuple(totals) for key, totals in rollup.items()]
+            )
+            self._db.execute("COMMIT")
+        except Exception:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            raise
+
+    def rollup(self, start: date, end: date, period: str = 'day', by: Sequence[str] = ()) -> pd.DataFrame:
+        """Requests, tokens, cost and latency per period (and per dimension in by) between two days"""
+        unknown = set(by) - set(DIMENSIONS)
+        if period not in PERIODS or unknown:
+            raise ValueError(f"Unknown period '{period}' or dimensions {sorted(unknown)}")
+        self.flush()
+        group = ', '.join([f"{PERIODS[period]} AS {period}", *by])
+        query = (
+            f"SELECT {group}, SUM(requests) AS requests, SUM(failed) AS failed,"
+            " SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens, SUM(cost) AS cost,"
+            " SUM(latency_sum) / SUM(requests) AS avg_latency"
+            f" FROM daily_usage WHERE day BETWEEN ? AND ? GROUP BY {', '.join([period, *by])}"
+            f" ORDER BY {period}, cost DESC"
+        )
+        with self._lock:
+            return pd.read_sql_query(query, self._db, params=(start.isoformat(), end.isoformat()))
+
+    def completions(self, job: str) -> pd.DataFrame:
+        """Every recorded completion of one job"""
+        self.flush()
+        with self._lock:
+            return pd.read_sql_query("SELECT * FROM completions WHERE job = ? ORDER BY ts", self._db, params=(job,))
+
+
+_ledger = None
+_ledger_failed = False
+_ledger_lock = threading.Lock()
+_warned = set()
+
+
+def warn_unavailable(path: str, error: Exception) -> None:
+    """Print once per ledger file that completions aren't being recorded"""
+    if path not in _warned:
+        _warned.add(path)
+        print(f"⚠️ Usage ledger {path} unavailable, completions are not recorded: {error}")
+
+
+def get_ledger() -> Optional[UsageLedger]:
+    """Process-wide ledger; None when USAGE_LEDGER is set to an empty string or can't be opened"""
+    global _ledger, _ledger_failed
+    if not LEDGER_PATH:
+        return None
+    with _ledger_lock:
+        if _ledger is None and not _ledger_failed:
+            try:
+                _ledger = UsageLedger(LEDGER_PATH)
+            except (sqlite3.Error, OSError) as e:
+                # Not retried per completion; the warning says why usage is missing
+                _ledger_failed = True
+                warn_unavailable(LEDGER_PATH, e)
+        return _ledger
+
+
+def record_usage(backend: str, model: str, input_tokens: int, output_tokens: int, cost: float,
+                 latency: float, ok: bool = True, marketplaces: List[str] = None) -> None:
+    """Record one completion; never raises, so bookkeeping can't fail a paid completion"""
+    ledger = get_ledger()
+    if ledger is not None:
+        ledger.record(backend, model, input_tokens, output_tokens, cost, latency, ok, marketplaces)
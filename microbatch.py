@@ -0,0 +1,87 @@
+"""
+Micro-batching of concurrent single-title requests.
+
+Requests arriving within max_wait_ms of each other (up to max_batch) are
+coalesced into one upstream call; each caller awaits its own future, which
+is resolved from the shared response. generate_batch may return an exception
+in place of a result, which is raised to that item's caller only.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+
+class MicroBatcher:
+    """Coalesce awaitable submissions into batched calls of generate_batch(items)"""
+
+    def __init__(self, generate_batch: Callable[[List[Dict]], List[Any]], max_batch: int = 8,
+                 max_wait_ms: float = 5, max_workers: int = 16):
+        self.generate_batch = generate_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        # generate_batch blocks on network I/O, so it runs off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+        self.requests = 0
+        self.batches = 0
+
+    async def submit(self, item: Dict) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]) -> None:
+        self.batches += 1
+        items = [item for item, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self.generate_batch, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+        }
+
+    async def close(self) -> None:
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,69 @@
+import time
+from datetime import date, timedelta
+
+import streamlit as st
+
+from ledger import DIMENSIONS, PERIODS, get_ledger
+
+st.set_page_config(page_title="Usage Ledger", page_icon="📒", layout="wide")
+
+
+def main():
+    st.title("📒 Usage Ledger")
+    st.markdown("Spend, tokens and latency of every completion, from the daily rollups in the usage ledger")
+
+    ledger = get_ledger()
+    if ledger is None:
+        st.info("The usage ledger is disabled (USAGE_LEDGER is empty) or its file can't be opened")
+        return
+
+    col1, col2, col3 = st.columns([2, 1, 2])
+    with col1:
+        today = date.today()
+        span = st.date_input("Date range", value=(today - timedelta(days=90), today))
+    with col2:
+        period = st.selectbox("Period", options=list(PERIODS), index=0)
+    with col3:
+        by = st.multiselect("Group by", options=list(DIMENSIONS), default=['model'])
+
+    # The date input returns one date while the range is being picked
+    if not isinstance(span, (tuple, list)) or len(span) != 2:
+        st.stop()
+    start, end = span
+
+    started = time.perf_counter()
+    usage = ledger.rollup(start, end, period, by)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if usage.empty:
+        st.info("No completions recorded in this range")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Cost", f"${usage['cost'].sum():.4f}")
+    with col2:
+        st.metric("Requests", f"{int(usage['requests'].sum()):,}")
+    with col3:
+        st.metric("Failed", f"{int(usage['failed'].sum()):,}")
+    with col4:
+        st.metric("Tokens (in / out)", f"{int(usage['input_tokens'].sum()):,} / {int(usage['output_tokens'].sum()):,}")
+
+    if by:
+        series = usage.assign(group=usage[list(by)].astype(str).agg(' · '.join, axis=1))
+        chart = series.pivot_table(index=period, columns='group', values='cost', aggfunc='sum', fill_value=0)
+    else:
+        chart = usage.set_index(period)[['cost']]
+    st.bar_chart(chart)
+
+    st.dataframe(usage, use_container_width=True)
+    st.caption(f"⚡ Queried in {elapsed_ms:.1f} ms")
+
+    with st.expander("Completions of one job"):
+        job = st.text_input("Job id")
+        if job:
+            st.dataframe(ledger.completions(job), use_container_width=True)
+
+
+if __name__ == "__main__":
+    main()
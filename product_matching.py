@@ -0,0 +1,404 @@
+"""
+Ledsone-to-competitor product matching with a blocking index.
+
+Comparing every Ledsone product with every competitor listing is quadratic.
+Instead each product gets a handful of blocking keys:
+
+- attributes parsed from its title and bullet points: shape, pack size,
+  wattage and lamp cap (E27, B22, GU10, ...);
+- its rarest title words, so products without attributes still find peers.
+
+Keys are scoped to the product's category when both files have one. Only
+pairs that share a key are scored, and keys shared by more than max_block
+competitors are skipped as non-discriminative, so the work grows roughly
+linearly with catalogue size. Candidates are ranked by cosine similarity of
+TF-IDF weighted word unigrams and bigrams from title and bullet points
+(each Ledsone product's heaviest n-grams against the full competitor vector).
+
+Words are integer-coded once against a shared vocabulary; bigrams, sparse
+vectors and blocking keys are packed int64 arrays, and Ledsone products are
+scored in chunks so memory stays bounded on 100k-row catalogues.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from guidelines import BRAND_NAMES, STOPWORDS, TOKEN_PATTERN
+
+SHAPES = (
+    'round', 'square', 'rectangle', 'rectangular', 'oval', 'globe', 'cone', 'dome', 'drum',
+    'cylinder', 'cylindrical', 'hexagon', 'hexagonal', 'octagon', 'triangle', 'star', 'heart',
+    'bell', 'teardrop', 'cage', 'ring', 'sphere', 'tube', 'lantern', 'spiral',
+)
+
+LAMP_CAPS = ('e14', 'e27', 'e26', 'e12', 'b22', 'b15', 'gu10', 'gu5.3', 'g9', 'g4', 'mr16')
+
+WATTAGE_WORD = re.compile(r"(\d+(?:\.\d+)?)w(?:att|atts)?")
+PACK_PATTERN = r"\b(?:pack|set|box) of (\d+)\b|\b(\d+)\s*-?\s*(?:pack|pcs|pieces|piece|pk)\b"
+
+# Rarest title words added as blocking keys per product
+RARE_WORDS = 3
+
+# Title words count more than bullet-point words in the similarity vectors
+TITLE_WEIGHT = 2.0
+
+# Leading bullet-point text used for blocking and similarity; the rest rarely identifies a product
+MAX_BULLET_CHARS = 500
+
+# Heaviest n-grams of each Ledsone product looked up when scoring a candidate
+QUERY_FEATURES = 40
+
+# Rows tokenized per chunk, and Ledsone products scored per chunk
+CHUNK_SIZE = 20000
+SCORE_CHUNK_SIZE = 2000
+
+
+def column_text(df: pd.DataFrame, column: str) -> pd.Series:
+    """Text of a column, tolerating header whitespace ('Title ') and missing columns"""
+    matches = [c for c in df.columns if str(c).strip().lower() == column.lower()]
+    if not matches:
+        return pd.Series('', index=df.index)
+    return df[matches[0]].fillna('').astype(str)
+
+
+def product_text(df: pd.DataFrame, column: str) -> pd.Series:
+    return column_text(df, column).str.lower()
+
+
+def _categories(df: pd.DataFrame, category_column: Optional[str]) -> pd.Series:
+    if category_column and category_column in df.columns:
+        return df[category_column].fillna('').astype(str).reset_index(drop=True)
+    return pd.Series('', index=range(len(df)))
+
+
+def word_attributes(words: List[str]) -> np.ndarray:
+    """Blocking key for each vocabulary word that is a shape, lamp cap or wattage (else None)"""
+    attributes = np.full(len(words), None, dtype=object)
+    shapes, caps = set(SHAPES), set(LAMP_CAPS)
+    for code, word in enumerate(words):
+        wattage = WATTAGE_WORD.fullmatch(word)
+        if word in shapes:
+            attributes[code] = f"shape:{word}"
+        elif word in caps:
+            attributes[code] = f"cap:{word}"
+        elif wattage:
+            attributes[code] = f"watt:{wattage.group(1).removesuffix('.0')}"
+    return attributes
+
+
+def attribute_keys(codes: List[tuple], attributes: np.ndarray, titles: pd.Series) -> pd.DataFrame:
+    """(doc, key) pairs for shape/cap/wattage words in the encoded texts and pack sizes in titles"""
+    docs = np.concatenate([doc_codes[0] for doc_codes in codes])
+    words = np.concatenate([doc_codes[1] for doc_codes in codes])
+    keys = attributes[words] if len(words) else np.array([], dtype=object)
+    found = keys != None  # noqa: E711 (element-wise)
+
+    packs = titles.reset_index(drop=True).str.extractall(PACK_PATTERN)
+    pack_sizes = packs.bfill(axis=1).iloc[:, 0] if not packs.empty else pd.Series(dtype=object)
+
+    return pd.DataFrame({
+        'doc': np.concatenate([docs[found], packs.index.get_level_values(0).to_numpy(dtype=np.int64)]),
+        'key': np.concatenate([keys[found], ('pack:' + pack_sizes).to_numpy(dtype=object)]),
+    }).drop_duplicates()
+
+
+class _Vocabulary:
+    """Shared word -> integer code mapping, filled chunk by chunk"""
+
+    def __init__(self):
+        self.codes = {}
+        self.words = []
+        self.is_content = []
+        self._excluded = STOPWORDS | BRAND_NAMES
+
+    def _code(self, word: str) -> int:
+        code = self.codes.get(word)
+        if code is None:
+            code = self.codes[word] = len(self.words)
+            self.words.append(word)
+            self.is_content.append(len(word) > 1 and word not in self._excluded)
+        return code
+
+    def encode(self, texts: pd.Series) -> tuple:
+        """Content words of each text as (doc positions, word codes), in text order"""
+        texts = texts.reset_index(drop=True)
+        doc_parts, code_parts = [], []
+        for start in range(0, len(texts), CHUNK_SIZE):
+            tokens = texts.iloc[start:start + CHUNK_SIZE].str.findall(TOKEN_PATTERN.pattern).explode().dropna()
+            local, uniques = pd.factorize(tokens, sort=False)
+            mapping = np.array([self._code(word) for word in uniques], dtype=np.int64)
+            doc_parts.append(tokens.index.to_numpy(dtype=np.int64))
+            code_parts.append(mapping[local] if len(local) else np.array([], dtype=np.int64))
+
+        docs = np.concatenate(doc_parts) if doc_parts else np.array([], dtype=np.int64)
+        codes = np.concatenate(code_parts) if code_parts else np.array([], dtype=np.int64)
+        keep = np.asarray(self.is_content, dtype=bool)[codes] if len(codes) else np.array([], dtype=bool)
+        return docs[keep], codes[keep]
+
+
+def _sum_by_key(keys: np.ndarray, weights: np.ndarray = None) -> tuple:
+    """Sorted distinct keys with the summed weights (or counts) of each"""
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+    if weights is None:
+        return keys[starts], np.diff(np.r_[starts, len(keys)])
+    return keys[starts], np.add.reduceat(weights[order], starts) if len(starts) else np.array([])
+
+
+def _ngram_keys(docs: np.ndarray, codes: np.ndarray, n_words: int) -> tuple:
+    """(doc, feature key) for unigrams (the word code) and adjacent bigrams (packed above n_words)"""
+    same_doc = docs[:-1] == docs[1:]
+    bigrams = (codes[:-1][same_doc] + 1) * n_words + codes[1:][same_doc]
+    return np.concatenate([docs, docs[:-1][same_doc]]), np.concatenate([codes, bigrams])
+
+
+def rare_word_keys(docs: np.ndarray, codes: np.ndarray, word_frequency: np.ndarray,
+                   words: List[str], n_words: int = RARE_WORDS) -> pd.DataFrame:
+    """(doc, key) pairs for each title's rarest words that still occur in other titles"""
+    n_codes = max(len(words), 1)
+    pairs, _ = _sum_by_key(docs * n_codes + codes)
+    docs, codes = pairs // n_codes, pairs % n_codes
+    frequency = word_frequency[codes]
+    usable = frequency > 1
+    docs, codes, frequency = docs[usable], codes[usable], frequency[usable]
+
+    order = np.lexsort((frequency, docs))
+    docs, codes = docs[order], codes[order]
+    position = np.arange(len(docs)) - np.searchsorted(docs, docs)
+    keep = position < n_words
+    return pd.DataFrame({
+        'doc': docs[keep],
+        'key': 'word:' + pd.Series(np.asarray(words, dtype=object)[codes[keep]], dtype=object),
+    })
+
+
+def _title_and_bullet_features(title_codes: tuple, bullet_codes: tuple, n_words: int) -> tuple:
+    """(doc, feature key, weight) for every n-gram occurrence, title n-grams weighted up"""
+    title_docs, title_keys = _ngram_keys(*title_codes, n_words)
+    bullet_docs, bullet_keys = _ngram_keys(*bullet_codes, n_words)
+    return (
+        np.concatenate([title_docs, bullet_docs]),
+        np.concatenate([title_keys, bullet_keys]),
+        np.concatenate([np.full(len(title_docs), TITLE_WEIGHT), np.ones(len(bullet_docs))]),
+    )
+
+
+def tfidf_vectors(docs: np.ndarray, features: np.ndarray, weights: np.ndarray, n_docs: int,
+                  n_features: int, idf: np.ndarray) -> tuple:
+    """L2-normalised sparse vectors: (sorted doc * n_features + feature keys, docs, features, weights)"""
+    keys, tf = _sum_by_key(docs * n_features + features, weights)
+    docs, features = keys // n_features, keys % n_features
+    weights = (1 + np.log(tf)) * idf[features]
+
+    norms = np.sqrt(np.bincount(docs, weights=weights ** 2, minlength=n_docs))
+    weights = weights / np.where(norms[docs] > 0, norms[docs], 1)
+    return keys, docs, features, weights
+
+
+def _top_features(vectors: tuple, n_features: int, top_n: int) -> tuple:
+    """Keep each document's top_n heaviest features (still sorted by doc)"""
+    keys, docs, features, weights = vectors
+    order = np.lexsort((-weights, docs))
+    position = np.arange(len(docs)) - np.searchsorted(docs[order], docs[order])
+    keep = np.sort(order[position < top_n])
+    return keys[keep], docs[keep], features[keep], weights[keep]
+
+
+def _expand_ranges(starts: np.ndarray, ends: np.ndarray) -> tuple:
+    """Owner index and position for every element of the ranges [start, end)"""
+    lengths = ends - starts
+    owners = np.repeat(np.arange(len(starts)), lengths)
+    positions = np.repeat(starts - np.cumsum(np.r_[0, lengths[:-1]]), lengths) + np.arange(lengths.sum())
+    return owners, positions
+
+
+def _candidate_pairs(ledsone_docs: np.ndarray, ledsone_keys: np.ndarray, competitor_docs: np.ndarray,
+                     competitor_keys: np.ndarray, n_competitors: int, max_candidates: int) -> tuple:
+    """(ledsone, competitor, shared key count) for pairs sharing a key, most shared keys first
+
+    competitor_keys must be sorted, with competitor_docs in the same order.
+    """
+    starts = np.searchsorted(competitor_keys, ledsone_keys)
+    ends = np.searchsorted(competitor_keys, ledsone_keys, side='right')
+    owners, positions = _expand_ranges(starts, ends)
+
+    pairs, shared = _sum_by_key(ledsone_docs[owners] * n_competitors + competitor_docs[positions])
+    ledsone, competitor = pairs // n_competitors, pairs % n_competitors
+
+    order = np.lexsort((-shared, ledsone))
+    ledsone, competitor, shared = ledsone[order], competitor[order], shared[order]
+    keep = np.arange(len(ledsone)) - np.searchsorted(ledsone, ledsone) < max_candidates
+    return ledsone[keep], competitor[keep], shared[keep]
+
+
+def _pair_cosine(ledsone: np.ndarray, competitor: np.ndarray, ledsone_vectors: tuple,
+                 competitor_index: pd.Index, competitor_weights: np.ndarray, n_features: int) -> np.ndarray:
+    """Dot products of candidate pairs: each Ledsone feature is looked up in the competitor vector
+
+    competitor_index is a hash index over the competitor vector keys; random
+    lookups into it are much faster than binary searches over millions of keys.
+    """
+    _, l_docs, l_features, l_weights = ledsone_vectors
+    pair_ids, positions = _expand_ranges(np.searchsorted(l_docs, ledsone), np.searchsorted(l_docs, ledsone, side='right'))
+    found = competitor_index.get_indexer(competitor[pair_ids] * n_features + l_features[positions])
+    products = np.where(found >= 0, l_weights[positions] * competitor_weights[found], 0.0)
+    return np.bincount(pair_ids, weights=products, minlength=len(ledsone))
+
+
+def match_products(ledsone_df: pd.DataFrame, competitor_df: pd.DataFrame, category_column: Optional[str] = 'category',
+                   top_k: int = 3, max_block: int = 200, max_candidates: int = 20,
+                   min_similarity: float = 0.05) -> pd.DataFrame:
+    """Nearest competitor listings for each Ledsone product
+
+    Returns one row per match: ledsone_row and competitor_row (positions in
+    the input frames), rank, similarity and the blocking keys they share.
+    """
+    columns = ['ledsone_row', 'competitor_row', 'rank', 'similarity', 'shared_keys']
+    n_ledsone, n_competitors = len(ledsone_df), len(competitor_df)
+    l_titles, c_titles = product_text(ledsone_df, 'Title'), product_text(competitor_df, 'Title')
+    l_bullets = product_text(ledsone_df, 'Bullet Points').str.slice(0, MAX_BULLET_CHARS)
+    c_bullets = product_text(competitor_df, 'Bullet Points').str.slice(0, MAX_BULLET_CHARS)
+
+    vocabulary = _Vocabulary()
+    l_title_codes, c_title_codes = vocabulary.encode(l_titles), vocabulary.encode(c_titles)
+    l_bullet_codes, c_bullet_codes = vocabulary.encode(l_bullets), vocabulary.encode(c_bullets)
+    n_words = max(len(vocabulary.words), 1)
+
+    # Title word document frequency over both catalogues, for rare-word blocking
+    title_pairs, _ = _sum_by_key(np.concatenate([
+        l_title_codes[0] * n_words + l_title_codes[1],
+        (c_title_codes[0] + n_ledsone) * n_words + c_title_codes[1],
+    ]))
+    word_frequency = np.bincount(title_pairs % n_words, minlength=n_words)
+
+    attributes = word_attributes(vocabulary.words)
+    # A category on one side only (e.g. competitor sheet names) would make no key match
+    scoped = bool(category_column) and category_column in ledsone_df.columns \
+        and category_column in competitor_df.columns
+
+    def blocking_keys(titles, title_codes, bullet_codes, df):
+        keys = pd.concat([
+            attribute_keys([title_codes, bullet_codes], attributes, titles),
+            rare_word_keys(*title_codes, word_frequency, vocabulary.words),
+        ], ignore_index=True)
+        categories = _categories(df, category_column if scoped else None).to_numpy(dtype=object)
+        keys['key'] = categories[keys['doc'].to_numpy(dtype=np.int64)] + '|' + keys['key']
+        return keys
+
+    ledsone_keys = blocking_keys(l_titles, l_title_codes, l_bullet_codes, ledsone_df)
+    competitor_keys = blocking_keys(c_titles, c_title_codes, c_bullet_codes, competitor_df)
+
+    # Integer key ids; keys shared by too many competitors don't narrow anything down
+    key_ids, key_labels = pd.factorize(pd.concat([ledsone_keys['key'], competitor_keys['key']], ignore_index=True))
+    l_key_ids, c_key_ids = key_ids[:len(ledsone_keys)], key_ids[len(ledsone_keys):]
+    block_sizes = np.bincount(c_key_ids, minlength=len(key_labels))
+    l_usable, c_usable = block_sizes[l_key_ids] <= max_block, block_sizes[c_key_ids] <= max_block
+
+    l_block_docs = ledsone_keys['doc'].to_numpy(dtype=np.int64)[l_usable]
+    l_block_keys = l_key_ids[l_usable].astype(np.int64)
+    order = np.argsort(c_key_ids[c_usable], kind='stable')
+    c_block_keys = c_key_ids[c_usable].astype(np.int64)[order]
+    c_block_docs = competitor_keys['doc'].to_numpy(dtype=np.int64)[c_usable][order]
+
+    # Shared n-gram feature ids and IDF over both catalogues
+    l_features = _title_and_bullet_features(l_title_codes, l_bullet_codes, n_words)
+    c_features = _title_and_bullet_features(c_title_codes, c_bullet_codes, n_words)
+    feature_ids, feature_keys = pd.factorize(np.concatenate([l_features[1], c_features[1]]))
+    n_features = max(len(feature_keys), 1)
+    l_feature_ids = feature_ids[:len(l_features[1])].astype(np.int64)
+    c_feature_ids = feature_ids[len(l_features[1]):].astype(np.int64)
+    doc_features, _ = _sum_by_key(np.concatenate([
+        l_features[0] * n_features + l_feature_ids,
+        (c_features[0] + n_ledsone) * n_features + c_feature_ids,
+    ]))
+    document_frequency = np.bincount(doc_features % n_features, minlength=n_features)
+    idf = np.log((1 + n_ledsone + n_competitors) / (1 + document_frequency)) + 1
+
+    ledsone_vectors = tfidf_vectors(l_features[0], l_feature_ids, l_features[2], n_ledsone, n_features, idf)
+    ledsone_vectors = _top_features(ledsone_vectors, n_features, QUERY_FEATURES)
+    competitor_vectors = tfidf_vectors(c_features[0], c_feature_ids, c_features[2], n_competitors, n_features, idf)
+
+    competitor_index = pd.Index(competitor_vectors[0])
+
+    # Score Ledsone products in chunks so candidate arrays stay bounded
+    block_order = np.argsort(l_block_docs, kind='stable')
+    l_block_docs, l_block_keys = l_block_docs[block_order], l_block_keys[block_order]
+    matches = []
+    for start in range(0, n_ledsone, SCORE_CHUNK_SIZE):
+        lo, hi = np.searchsorted(l_block_docs, [start, start + SCORE_CHUNK_SIZE])
+        ledsone, competitor, _ = _candidate_pairs(
+            l_block_docs[lo:hi], l_block_keys[lo:hi], c_block_docs, c_block_keys, n_competitors, max_candidates
+        )
+        similarity = _pair_cosine(ledsone, competitor, ledsone_vectors, competitor_index,
+                                  competitor_vectors[3], n_features)
+
+        keep = similarity >= min_similarity
+        ledsone, competitor, similarity = ledsone[keep], competitor[keep], similarity[keep]
+        order = np.lexsort((-similarity, ledsone))
+        ledsone, competitor, similarity = ledsone[order], competitor[order], similarity[order]
+        rank = np.arange(len(ledsone)) - np.searchsorted(ledsone, ledsone) + 1
+        keep = rank <= top_k
+        matches.append(pd.DataFrame({
+            'ledsone_row': ledsone[keep],
+            'competitor_row': competitor[keep],
+            'rank': rank[keep],
+            'similarity': similarity[keep].round(4),
+        }))
+
+    matches = pd.concat(matches, ignore_index=True) if matches else pd.DataFrame(columns=columns[:-1])
+    if matches.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Label each final pair with the blocking keys it shares (few rows by now)
+    n_keys = max(len(key_labels), 1)
+    owners, positions = _expand_ranges(
+        np.searchsorted(l_block_docs, matches['ledsone_row'].to_numpy(dtype=np.int64)),
+        np.searchsorted(l_block_docs, matches['ledsone_row'].to_numpy(dtype=np.int64), side='right'),
+    )
+    shared_keys = l_block_keys[positions]
+    shared = np.isin(matches['competitor_row'].to_numpy(dtype=np.int64)[owners] * n_keys + shared_keys,
+                     c_block_docs * n_keys + c_block_keys)
+    labels = pd.Series(np.asarray(key_labels, dtype=object)[shared_keys[shared]]).str.split('|', n=1).str[1] + ', '
+    owners = owners[shared]
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]]) if len(owners) else np.array([], dtype=np.int64)
+    joined = np.add.reduceat(labels.to_numpy(dtype=object), starts) if len(starts) else np.array([], dtype=object)
+    matches['shared_keys'] = pd.Series(joined, index=owners[starts]).str[:-2].reindex(range(len(matches)), fill_value='').to_numpy()
+    return matches[columns]
+
+
+def matched_comparison(ledsone_df: pd.DataFrame, competitor_df: pd.DataFrame, matches: pd.DataFrame) -> pd.DataFrame:
+    """Side-by-side sheet of matched pairs, with any shared columns from both files"""
+    ledsone = ledsone_df.reset_index(drop=True).iloc[matches['ledsone_row'].to_numpy()].reset_index(drop=True)
+    competitor = competitor_df.reset_index(drop=True).iloc[matches['competitor_row'].to_numpy()].reset_index(drop=True)
+
+    comparison = pd.DataFrame({
+        'Ledsone Title': column_text(ledsone, 'Title').str.strip().to_numpy(),
+        'Competitor Title': column_text(competitor, 'Title').str.strip().to_numpy(),
+        'Match Rank': matches['rank'].to_numpy(),
+        'Similarity': matches['similarity'].to_numpy(),
+        'Shared Blocking Keys': matches['shared_keys'].to_numpy(),
+    })
+    for column in ledsone.columns:
+        if column in competitor.columns and str(column).strip().lower() not in ('title', 'bullet points'):
+            comparison[f'{column} (Ledsone)'] = ledsone[column].to_numpy()
+            comparison[f'{column} (Competitor)'] = competitor[column].to_numpy()
+    return comparison
+
+
+def matched_examples(matches: pd.DataFrame, competitor_df: pd.DataFrame) -> Dict[int, List[Dict]]:
+    """Few-shot examples per Ledsone row position: its matched competitors, best first"""
+    competitor = competitor_df.reset_index(drop=True)
+    titles, bullets = column_text(competitor, 'Title'), column_text(competitor, 'Bullet Points')
+
+    examples = {}
+    for ledsone_row, group in matches.sort_values(['ledsone_row', 'rank']).groupby('ledsone_row'):
+        rows = group['competitor_row'].to_numpy()
+        examples[int(ledsone_row)] = [
+            {'Title': title, 'Bullet Points': bullet_points}
+            for title, bullet_points in zip(titles.iloc[rows], bullets.iloc[rows])
+        ]
+    return examples
@@ -0,0 +1,142 @@
+"""
+Throughput / ETA estimation and coalesced progress reporting for batch runs.
+
+Batch rows finish many times per second under concurrency, and every Streamlit
+progress call is a websocket message to the browser. The reporter records each
+finished row cheaply and only re-renders at a fixed refresh rate, showing
+rows/sec, an ETA from a moving average of the rate, spend so far against the
+projected total, and failed / retried counts.
+"""
+
+import os
+import time
+from typing import Callable, Dict, Optional
+
+# Seconds between UI refreshes
+REFRESH_SECONDS = float(os.getenv('PROGRESS_REFRESH_SECONDS', '0.5'))
+
+# Half-life (seconds) of the moving-average throughput used for the ETA
+RATE_HALF_LIFE = 15.0
+
+
+class ThroughputEstimator:
+    """Rows/sec, ETA and projected cost for a run of total_rows rows"""
+
+    def __init__(self, total_rows: int, already_done: int = 0, half_life: float = RATE_HALF_LIFE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.total_rows = total_rows
+        self.already_done = already_done
+        self.half_life = half_life
+        self.clock = clock
+
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+        self.spend = 0.0
+        self.started = clock()
+
+        self._rate = None
+        self._sample_time = self.started
+        self._sample_done = 0
+
+    def record(self, cost: float = 0.0, failed: bool = False) -> None:
+        """One row finished (successfully or not) in this run"""
+        self.done += 1
+        self.failed += failed
+        self.spend += cost
+
+    @property
+    def finished(self) -> int:
+        return self.already_done + self.done
+
+    @property
+    def remaining(self) -> int:
+        return max(self.total_rows - self.finished, 0)
+
+    def _update_rate(self, now: float) -> None:
+        """Fold rows finished since the last sample into a time-weighted moving average"""
+        elapsed = now - self._sample_time
+        if elapsed <= 0:
+            return
+        sample = (self.done - self._sample_done) / elapsed
+        if self._rate is None:
+            self._rate = sample
+        else:
+            alpha = 1 - 0.5 ** (elapsed / self.half_life)
+            self._rate += alpha * (sample - self._rate)
+        self._sample_time, self._sample_done = now, self.done
+
+    def snapshot(self) -> Dict:
+        now = self.clock()
+        self._update_rate(now)
+        elapsed = now - self.started
+        rate = self._rate or 0.0
+        generated = self.done - self.failed
+        cost_per_row = self.spend / generated if generated else None
+
+        return {
+            'finished': self.finished,
+            'total': self.total_rows,
+            'failed': self.failed,
+            'retried': self.retried,
+            'rows_per_sec': self.done / elapsed if elapsed > 0 else 0.0,
+            'eta_seconds': self.remaining / rate if rate > 0 else None,
+            'spend': self.spend,
+            'projected_cost': self.spend + cost_per_row * self.remaining if cost_per_row is not None else None,
+            'elapsed': elapsed,
+        }
+
+
+class ProgressReporter:
+    """Records every row but calls render(snapshot) at most once per refresh_seconds"""
+
+    def __init__(self, estimator: ThroughputEstimator, render: Callable[[Dict], None],
+                 refresh_seconds: float = REFRESH_SECONDS):
+        self.estimator = estimator
+        self.render = render
+        self.refresh_seconds = refresh_seconds
+        self.renders = 0
+        self._last_render = None
+
+    def update(self, cost: float = 0.0, failed: bool = False, retried: Optional[int] = None) -> None:
+        self.estimator.record(cost, failed)
+        if retried is not None:
+            self.estimator.retried = retried
+        now = self.estimator.clock()
+        if self._last_render is None or now - self._last_render >= self.refresh_seconds:
+            self.flush(now)
+
+    def flush(self, now: float = None) -> Dict:
+        """Render the current state immediately (e.g. at the start and end of a run)"""
+        snapshot = self.estimator.snapshot()
+        self.render(snapshot)
+        self.renders += 1
+        self._last_render = now if now is not None else self.estimator.clock()
+        return snapshot
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '–'
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+def format_progress(snapshot: Dict) -> str:
+    """One status line for a progress snapshot"""
+    line = (
+        f"Processed {snapshot['finished']} of {snapshot['total']} rows · "
+        f"{snapshot['rows_per_sec']:.1f} rows/s · ETA {format_duration(snapshot['eta_seconds'])} · "
+        f"spent ${snapshot['spend']:.4f}"
+    )
+    if snapshot['projected_cost'] is not None:
+        line += f" of ~${snapshot['projected_cost']:.4f} projected"
+    if snapshot['failed'] or snapshot['retried']:
+        line += f" · {snapshot['failed']} failed, {snapshot['retried']} retried"
+    return line
@@ -0,0 +1,112 @@
+"""
+Token-budgeted prompt assembly.
+
+Competitor bullet points vary wildly in length, so pasting them verbatim makes
+prompt size (and cost and latency) unpredictable. fit_examples() keeps each
+prompt within a per-request token budget by, in order:
+
+1. ranking the competitor examples by word overlap with the row,
+2. trimming example bullet points to their leading sentences,
+3. dropping the least relevant examples.
+
+Tokens are counted locally with tiktoken when it is installed, otherwise with
+a ~4 characters/token estimate.
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+from guidelines import keywords
+from title_engine import create_prompt
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('o200k_base')
+except Exception:  # tiktoken is optional
+    _ENCODING = None
+
+# create_prompt only uses the first five custom examples
+MAX_EXAMPLES = 5
+
+# Per-example bullet point caps tried before examples are dropped
+TRIM_STEPS = (160, 100, 60, 30)
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+|\s*[✔•]\s*')
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text or ''))
+    return max(1, len(text or '') // 4)
+
+
+def trim_text(text: str, max_tokens: int) -> str:
+    """Keep whole leading sentences/bullets up to max_tokens, cutting the last one if needed"""
+    text = str(text or '')
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    kept, used = [], 0
+    for sentence in (s.strip() for s in SENTENCE_SPLIT.split(text)):
+        if not sentence:
+            continue
+        size = count_tokens(sentence)
+        if used + size > max_tokens:
+            if not kept:
+                kept.append(sentence[:max_tokens * 4].rsplit(' ', 1)[0])
+            break
+        kept.append(sentence)
+        used += size
+    return ' '.join(kept)
+
+
+def example_keywords(examples: List[Dict]) -> List[set]:
+    """Keyword sets for each example; compute once per batch and pass to fit_examples"""
+    return [keywords(f"{e.get('Title', '')} {e.get('Bullet Points', '')}") for e in examples]
+
+
+def rank_examples(examples: List[Dict], old_title: str, description: str,
+                  example_words: List[set] = None) -> List[Dict]:
+    """Examples ordered by keyword overlap with the row, most relevant first"""
+    row_words = keywords(f"{old_title} {description}")
+    if not row_words:
+        return list(examples)
+
+    example_words = example_words or example_keywords(examples)
+    scores = [len(words & row_words) / (len(words) or 1) for words in example_words]
+    order = sorted(range(len(examples)), key=lambda i: scores[i], reverse=True)
+    return [examples[i] for i in order]
+
+
+def fit_examples(old_title: str, description: str, examples: List[Dict], budget: int,
+                 prompt_vars: Dict = None, example_words: List[set] = None) -> Tuple[List[Dict], int]:
+    """Choose and trim examples so the rendered prompt fits the budget
+
+    Returns (examples, prompt_tokens). If even an example-free prompt is over
+    budget the examples are dropped and the unavoidable size is returned.
+    """
+    prompt_vars = prompt_vars or {}
+
+    def size(selected):
+        return count_tokens(create_prompt(old_title, description, selected, **prompt_vars))
+
+    selected = rank_examples(examples or [], old_title, description, example_words)[:MAX_EXAMPLES]
+    tokens = size(selected)
+    if tokens <= budget or not selected:
+        return selected, tokens
+
+    for cap in TRIM_STEPS:
+        selected = [
+            {'Title': e.get('Title', ''), 'Bullet Points': trim_text(e.get('Bullet Points', ''), cap)}
+            for e in selected
+        ]
+        tokens = size(selected)
+        if tokens <= budget:
+            return selected, tokens
+
+    while selected:
+        selected = selected[:-1]
+        tokens = size(selected)
+        if tokens <= budget:
+            break
+    return selected, tokens
@@ -0,0 +1,114 @@
+"""
+Compact columnar buffer for batch results.
+
+A batch used to keep one dict per finished row, each repeating the row's old
+title and bullet points, and build a DataFrame from the list at the end. The
+buffer instead preallocates one array per output column, indexed by input row
+position, and stores only what the API produced. Inputs are joined back once,
+in to_frame(), when the results are exported.
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from incremental import FINGERPRINT_COLUMN
+
+# Optional per-row columns, allocated the first time a row sets them
+EXTRA_COLUMNS = {
+    FINGERPRINT_COLUMN: 'S64',   # sha256 hex digest
+    'reused': np.bool_,
+    'prompt_tokens': np.int32,
+}
+
+
+class _Labels:
+    """Small-cardinality strings (model names, issue lists) stored as integer codes"""
+
+    def __init__(self, n_rows: int):
+        self.codes = np.full(n_rows, -1, dtype=np.int32)
+        self.labels: List = []
+        self._index: Dict = {}
+
+    def set(self, row: int, value) -> None:
+        if pd.isna(value):
+            self.codes[row] = -1
+            return
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.labels)
+            self.labels.append(value)
+        self.codes[row] = code
+
+    def column(self, rows: np.ndarray) -> np.ndarray:
+        # Code -1 (never set or missing) picks the trailing None
+        return np.array(self.labels + [None], dtype=object)[self.codes[rows]]
+
+
+class ResultBuffer:
+    """Per-row generation outputs in preallocated columns, keyed by input row position"""
+
+    def __init__(self, n_rows: int):
+        self.n_rows = n_rows
+        self.filled = np.zeros(n_rows, dtype=bool)
+        self.new_title = np.empty(n_rows, dtype=object)
+        self.cost = np.zeros(n_rows, dtype=np.float64)
+        self.input_tokens = np.zeros(n_rows, dtype=np.int64)
+        self.output_tokens = np.zeros(n_rows, dtype=np.int64)
+        self.model = _Labels(n_rows)
+        self.guideline_issues = _Labels(n_rows)
+        self.extra: Dict[str, np.ndarray] = {}
+
+    def set(self, row: int, new_title: str, cost: float, input_tokens: int, output_tokens: int,
+            model: str, guideline_issues: str, **extra) -> None:
+        self.filled[row] = True
+        self.new_title[row] = new_title
+        self.cost[row] = cost
+        self.input_tokens[row] = input_tokens
+        self.output_tokens[row] = output_tokens
+        self.model.set(row, model)
+        self.guideline_issues.set(row, guideline_issues)
+        self.set_extra(row, **extra)
+
+    def set_extra(self, row: int, **values) -> None:
+        """Per-row metadata (e.g. fingerprint), which may be recorded before the row is generated"""
+        for name, value in values.items():
+            if name not in self.extra:
+                self.extra[name] = np.zeros(self.n_rows, dtype=EXTRA_COLUMNS.get(name, object))
+            self.extra[name][row] = value
+
+    def __len__(self) -> int:
+        return int(self.filled.sum())
+
+    @property
+    def total_cost(self) -> float:
+        return float(self.cost[self.filled].sum())
+
+    def column(self, name: str, rows: Sequence[int] = None) -> np.ndarray:
+        """One extra column for the given rows (default: the filled rows, in row order)"""
+        return _decode(self.extra[name][self.filled if rows is None else np.asarray(rows, dtype=np.int64)])
+
+    def to_frame(self, old_titles: Sequence[str], bullet_points: Sequence[str]) -> pd.DataFrame:
+        """Filled rows joined with their inputs, in input order"""
+        rows = np.flatnonzero(self.filled)
+        frame = pd.DataFrame({
+            'old_title': np.asarray(old_titles, dtype=object)[rows],
+            'bullet_points': np.asarray(bullet_points, dtype=object)[rows],
+            'new_title': self.new_title[rows],
+            'cost': self.cost[rows],
+            'input_tokens': self.input_tokens[rows],
+            'output_tokens': self.output_tokens[rows],
+            'model': self.model.column(rows),
+            'guideline_issues': self.guideline_issues.column(rows),
+        })
+        for name, values in self.extra.items():
+            frame[name] = _decode(values[rows])
+        return frame
+
+
+def _decode(values: np.ndarray) -> np.ndarray:
+    """Fixed-width byte strings back to Python str (without a wide unicode temporary)"""
+    if values.dtype.kind != 'S':
+        return values
+    return np.array([value.decode('ascii') for value in values.tolist()], dtype=object)
@@ -0,0 +1,256 @@
+"""
+Process-wide fair scheduler for title requests.
+
+Every batch job (from any Streamlit session) submits its rows here instead of
+running its own thread pool, so all jobs share one AIMD rate budget:
+
+- bulk rows are dispatched by start-time weighted fair queuing, so a 50k-row
+  job gets its weighted share of the in-flight slots instead of starving
+  smaller jobs that start after it;
+- interactive single-title requests have their own lane, served before any
+  queued bulk row and allowed a few slots above the bulk limit, so they never
+  wait behind a batch.
+"""
+
+import contextvars
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from concurrency import AIMDController, _timed_call, is_throttle_error
+
+# Extra in-flight slots reserved for the interactive lane
+INTERACTIVE_HEADROOM = 2
+
+PRIORITY_WEIGHTS = {'Low': 0.5, 'Normal': 1.0, 'High': 2.0}
+
+
+class _Job:
+    def __init__(self, job_id: int, name: str, weight: float, tasks: Iterable, fn: Callable):
+        self.job_id = job_id
+        self.fn = fn
+        self.name = name
+        self.weight = weight
+        self.queue = deque((task, 0) for task in tasks)
+        self.outcomes = queue.Queue()
+        self.finish_tag = 0.0
+        self.in_flight = 0
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+        self.started = time.monotonic()
+        self.cancelled = False
+
+    @property
+    def remaining(self) -> int:
+        return len(self.queue) + self.in_flight
+
+
+class JobScheduler:
+    """Weighted fair queuing of bulk rows plus a priority lane, under one AIMD limit"""
+
+    def __init__(self, controller: AIMDController = None, max_retries: int = 3,
+                 interactive_headroom: int = INTERACTIVE_HEADROOM):
+        self.controller = controller or AIMDController()
+        self.max_retries = max_retries
+        self.interactive_headroom = interactive_headroom
+
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._interactive = deque()
+        self._ids = itertools.count(1)
+        self._virtual_time = 0.0
+        self._in_flight = 0
+        self._interactive_in_flight = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=self.controller.max_limit + interactive_headroom)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='title-scheduler', daemon=True)
+        self._dispatcher.start()
+
+    # Submission
+
+    def submit_job(self, tasks: Iterable, fn: Callable, name: str = None, weight: float = 1.0) -> _Job:
+        """Queue fn(task) for every task; outcomes arrive on job.outcomes as (task, result, error)"""
+        # Workers run fn in the submitter's context, so e.g. its usage_context() applies
+        context = contextvars.copy_context()
+        with self._cond:
+            job_id = next(self._ids)
+            job = _Job(job_id, name or f"job-{job_id}", max(weight, 0.01), tasks,
+                       lambda task: context.copy().run(fn, task))
+            # A new job starts at the current virtual time, not at zero
+            job.finish_tag = self._virtual_time
+            self._jobs[job_id] = job
+            self._cond.notify_all()
+        return job
+
+    def run_job(self, tasks: Iterable, fn: Callable, on_done: Callable[[Any, Any, Optional[Exception]], None],
+                name: str = None, weight: float = 1.0) -> _Job:
+        """Blocking drop-in for run_adaptive: on_done runs on the calling thread"""
+        tasks = list(tasks)
+        job = self.submit_job(tasks, fn, name, weight)
+        try:
+            for _ in range(len(tasks)):
+                task, result, error = job.outcomes.get()
+                on_done(task, result, error)
+        finally:
+            # Also reached when the caller is interrupted (e.g. a Streamlit rerun)
+            self.cancel(job)
+        return job
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run one interactive request ahead of all bulk work and return its result"""
+        outcome = queue.Queue(maxsize=1)
+        context = contextvars.copy_context()
+        with self._cond:
+            self._interactive.append((lambda _: context.copy().run(fn, *args, **kwargs), outcome, 0))
+            self._cond.notify_all()
+        result, error = outcome.get()
+        if error is not None:
+            raise error
+        return result
+
+    def try_acquire_slot(self) -> bool:
+        """Take a bulk in-flight slot if one is free right now, for work sent outside a job (e.g. a hedge)"""
+        with self._cond:
+            if self._in_flight >= self.controller.current_limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release_slot(self, latency: float, error: Optional[Exception] = None) -> None:
+        """Give back a try_acquire_slot() slot; its outcome feeds the AIMD limit like any request"""
+        with self._cond:
+            self._in_flight -= 1
+            if error is None:
+                self.controller.record_success(latency)
+            else:
+                self.controller.record_error(error)
+            self._cond.notify_all()
+
+    def cancel(self, job: _Job) -> None:
+        """Drop a job's queued rows; rows already in flight finish and are discarded"""
+        with self._cond:
+            job.cancelled = True
+            job.queue.clear()
+            if not job.in_flight:
+                self._jobs.pop(job.job_id, None)
+
+    # Dispatch
+
+    def _next_bulk(self) -> Optional[_Job]:
+        """Backlogged job with the smallest virtual start tag"""
+        backlogged = [job for job in self._jobs.values() if job.queue]
+        if not backlogged:
+            return None
+        return min(backlogged, key=lambda job: max(job.finish_tag, self._virtual_time))
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    limit = self.controller.current_limit
+                    if self._interactive and self._in_flight < limit + self.interactive_headroom:
+                        fn, outcome, attempt = self._interactive.popleft()
+                        self._in_flight += 1
+                        self._interactive_in_flight += 1
+                        item = ('interactive', fn, outcome, attempt)
+                        break
+                    job = self._next_bulk() if self._in_flight < limit else None
+                    if job is not None:
+                        task, attempt = job.queue.popleft()
+                        start = max(job.finish_tag, self._virtual_time)
+                        self._virtual_time = start
+                        job.finish_tag = start + 1.0 / job.weight
+                        job.in_flight += 1
+                        self._in_flight += 1
+                        item = ('bulk', job, task, attempt)
+                        break
+                    self._cond.wait()
+
+            lane, target, payload, attempt = item
+            fn = target if lane == 'interactive' else target.fn
+            delay = min(2 ** attempt, 10) if attempt else 0
+            future = self._executor.submit(_timed_call, fn, payload if lane == 'bulk' else None, delay)
+            future.add_done_callback(lambda f, item=item: self._complete(item, *f.result()))
+
+    def _complete(self, item: tuple, result: Any, error: Optional[Exception], latency: float) -> None:
+        lane, target, payload, attempt = item
+        retry = error is not None and is_throttle_error(error) and attempt < self.max_retries
+
+        with self._cond:
+            self._in_flight -= 1
+            if error is None:
+                self.controller.record_success(latency)
+            else:
+                self.controller.record_error(error)
+
+            if lane == 'interactive':
+                self._interactive_in_flight -= 1
+                if retry:
+                    self._interactive.appendleft((target, payload, attempt + 1))
+                else:
+                    payload.put((result, error))
+            else:
+                job = target
+                job.in_flight -= 1
+                if job.cancelled:
+                    if not job.in_flight:
+                        self._jobs.pop(job.job_id, None)
+                elif retry:
+                    job.retried += 1
+                    job.queue.appendleft((payload, attempt + 1))
+                else:
+                    job.done += 1
+                    job.failed += error is not None
+                    job.outcomes.put((payload, result, error))
+                    if not job.remaining:
+                        self._jobs.pop(job.job_id, None)
+            self._cond.notify_all()
+
+    # Reporting
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._interactive) + sum(len(job.queue) for job in self._jobs.values())
+
+    def job_stats(self, job: _Job) -> Dict:
+        elapsed = time.monotonic() - job.started
+        return {
+            'job': job.name,
+            'weight': job.weight,
+            'queued': len(job.queue),
+            'in_flight': job.in_flight,
+            'done': job.done,
+            'failed': job.failed,
+            'retried': job.retried,
+            'rows_per_sec': round(job.done / elapsed, 2) if elapsed else 0.0,
+        }
+
+    def stats(self) -> List[Dict]:
+        """Per-job throughput and queue depth, plus the interactive lane"""
+        with self._cond:
+            rows = [self.job_stats(job) for job in self._jobs.values()]
+            rows.append({
+                'job': 'interactive',
+                'weight': None,
+                'queued': len(self._interactive),
+                'in_flight': self._interactive_in_flight,
+            })
+            return rows
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> JobScheduler:
+    """Process-wide scheduler shared by every session and job"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
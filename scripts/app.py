@@ -1,16 +1,28 @@
 import streamlit as st
 import pandas as pd
 import io
+import os
+import sys
 from datetime import datetime
 
-def process_excel_files(ledsone_file, competitor_file):
+# Product matching and the title tokenizer are shared with the title generator in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from keyword_gap import (  # noqa: E402
+    default_group_column, find_title_column, gap_summary, keyword_gaps, product_keyword_coverage
+)
+from product_matching import match_products, matched_comparison  # noqa: E402
+
+def read_excel_file(uploaded_file):
+    """
+    Read an uploaded Excel file
     """
-    Process the uploaded Excel files and create analysis
+    return pd.read_excel(uploaded_file)
+
+def process_excel_files(ledsone_df, competitor_df, group_column=None):
+    """
+    Process the uploaded catalogues and create analysis
     """
     try:
-        # Read the Excel files
-        ledsone_df = pd.read_excel(ledsone_file)
-        competitor_df = pd.read_excel(competitor_file)
         
         # Basic info about the datasets
         analysis_results = {
@@ -26,6 +38,19 @@ def process_excel_files(ledsone_file, competitor_file):
             }
         }
         
+        # Keyword gaps need a title column in both files
+        if find_title_column(ledsone_df) is not None and find_title_column(competitor_df) is not None:
+            gaps = keyword_gaps(ledsone_df, competitor_df, group_column)
+            analysis_results['keyword_gaps'] = gaps
+            analysis_results['keyword_coverage'] = product_keyword_coverage(ledsone_df, gaps, group_column)
+            analysis_results['gap_summary'] = gap_summary(gaps)
+            analysis_results['group_column'] = group_column
+            
+            # Link each Ledsone product to its nearest competitor listings
+            matches = match_products(ledsone_df, competitor_df, group_column)
+            analysis_results['matches'] = matches
+            analysis_results['matched_comparison'] = matched_comparison(ledsone_df, competitor_df, matches)
+        
         return ledsone_df, competitor_df, analysis_results
         
     except Exception as e:
@@ -55,12 +80,26 @@ def create_output_excel(ledsone_df, competitor_df, analysis_results):
             'Value': [
                 analysis_results['ledsone_summary']['total_products'],
                 analysis_results['competitor_summary']['total_products'],
-                ', '.join(analysis_results['ledsone_summary']['columns']),
-                ', '.join(analysis_results['competitor_summary']['columns']),
+                ', '.join(map(str, analysis_results['ledsone_summary']['columns'])),
+                ', '.join(map(str, analysis_results['competitor_summary']['columns'])),
                 datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             ]
         }
         
+        if 'gap_summary' in analysis_results:
+            summary_data['Metric'] += [
+                'Product Grouping',
+                'Product Groups',
+                'Gap Keywords',
+                'Gap Keywords Missing From All Ledsone Titles'
+            ]
+            summary_data['Value'] += [
+                analysis_results['group_column'] or 'All products',
+                analysis_results['gap_summary']['groups'],
+                analysis_results['gap_summary']['gap_keywords'],
+                analysis_results['gap_summary']['missing_entirely']
+            ]
+        
         summary_df = pd.DataFrame(summary_data)
         summary_df.to_excel(writer, sheet_name='Analysis_Summary', index=False)
         
@@ -72,6 +111,15 @@ def create_output_excel(ledsone_df, competitor_df, analysis_results):
                 'Record_Count': [len(ledsone_df), len(competitor_df)]
             }
             
+            if 'matches' in analysis_results:
+                matches = analysis_results['matches']
+                comparison_data['Matched_Products'] = [
+                    matches['ledsone_row'].nunique(), matches['competitor_row'].nunique()
+                ]
+                comparison_data['Avg_Match_Similarity'] = [
+                    matches.loc[matches['rank'] == 1, 'similarity'].mean() if not matches.empty else None, None
+                ]
+            
             for col in common_columns:
                 if col in ledsone_df.columns and col in competitor_df.columns:
                     # Add basic statistics for numeric columns
@@ -81,6 +129,15 @@ def create_output_excel(ledsone_df, competitor_df, analysis_results):
             
             comparison_df = pd.DataFrame(comparison_data)
             comparison_df.to_excel(writer, sheet_name='Quick_Comparison', index=False)
+        
+        # Keyword gap analysis
+        if 'keyword_gaps' in analysis_results:
+            analysis_results['keyword_gaps'].to_excel(writer, sheet_name='Keyword_Gaps', index=False)
+            analysis_results['keyword_coverage'].to_excel(writer, sheet_name='Title_Keyword_Coverage', index=False)
+        
+        # Matched Ledsone/competitor pairs side by side
+        if 'matched_comparison' in analysis_results:
+            analysis_results['matched_comparison'].to_excel(writer, sheet_name='Matched_Comparison', index=False)
     
     output.seek(0)
     return output
@@ -118,8 +175,25 @@ def main():
     if ledsone_file is not None and competitor_file is not None:
         st.success("Both files uploaded successfully!")
         
+        try:
+            ledsone_df = read_excel_file(ledsone_file)
+            competitor_df = read_excel_file(competitor_file)
+        except Exception as e:
+            st.error(f"Error processing files: {str(e)}")
+            return
+        
+        common_columns = [c for c in ledsone_df.columns if c in set(competitor_df.columns)]
+        default_group = default_group_column(ledsone_df, competitor_df)
+        group_options = ['All products'] + common_columns
+        group_choice = st.selectbox(
+            "Group products by (for keyword gaps)",
+            options=group_options,
+            index=group_options.index(default_group) if default_group else 0
+        )
+        group_column = None if group_choice == 'All products' else group_choice
+        
         with st.spinner("Processing files..."):
-            ledsone_df, competitor_df, analysis_results = process_excel_files(ledsone_file, competitor_file)
+            ledsone_df, competitor_df, analysis_results = process_excel_files(ledsone_df, competitor_df, group_column)
         
         if ledsone_df is not None and competitor_df is not None:
             # Display file information
@@ -149,6 +223,26 @@ def main():
                 with st.expander("Preview Competitor Data"):
                     st.dataframe(analysis_results['competitor_summary']['sample_data'])
             
+            if 'keyword_gaps' in analysis_results:
+                st.subheader("🔑 Keyword Gaps")
+                summary = analysis_results['gap_summary']
+                gap_col1, gap_col2, gap_col3 = st.columns(3)
+                with gap_col1:
+                    st.metric("Product Groups", summary['groups'])
+                with gap_col2:
+                    st.metric("Gap Keywords", summary['gap_keywords'])
+                with gap_col3:
+                    st.metric("Missing From All Our Titles", summary['missing_entirely'])
+                st.dataframe(analysis_results['keyword_gaps'], use_container_width=True)
+                
+                st.subheader("🔗 Matched Competitors")
+                matches = analysis_results['matches']
+                st.write(f"{matches['ledsone_row'].nunique()} of {len(ledsone_df)} Ledsone products "
+                         f"matched to competitor listings")
+                st.dataframe(analysis_results['matched_comparison'].head(100), use_container_width=True)
+            else:
+                st.warning("Keyword gap analysis and matching need a 'Title' column in both files")
+            
             # Generate output file
             st.subheader("⬇️ Download Analysis")
             
@@ -176,6 +270,9 @@ def main():
                 - **Competitor_Products**: Original competitor data  
                 - **Analysis_Summary**: Key metrics and information
                 - **Quick_Comparison**: Basic comparison (if common columns exist)
+                - **Keyword_Gaps**: Competitor title keywords our titles lack, per product group
+                - **Title_Keyword_Coverage**: Gap keywords each Ledsone title includes or misses
+                - **Matched_Comparison**: Each Ledsone product next to its nearest competitor listings
                 """)
     
     else:
@@ -190,6 +287,7 @@ def main():
             - Data should start from the second row
             
             **Common columns for better analysis:**
+            - Title (used for the keyword gap analysis)
             - Product Name/ID
             - Price
             - Category
@@ -0,0 +1,177 @@
+"""
+Vectorized keyword-gap analysis between Ledsone and competitor titles.
+
+Both catalogues are tokenized once into a shared vocabulary and held as a
+sparse (document, term) matrix in coordinate form: two integer arrays with
+one entry per distinct term in each title. Document frequencies per product
+group are then counted by sorting packed (group, term) integer keys, so no
+step loops over rows in Python and 100k x 100k catalogues take seconds.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Tokenized like the guideline checks, so a gap keyword is one the checks would see
+from guidelines import BRAND_NAMES, STOPWORDS, TOKEN_PATTERN
+
+EXCLUDED_TERMS = STOPWORDS | BRAND_NAMES
+
+ALL_PRODUCTS = 'All products'
+
+GROUP_COLUMN_CANDIDATES = ('category', 'Category', 'Product Type', 'product_type', 'Product Group')
+
+
+def find_title_column(df: pd.DataFrame) -> Optional[str]:
+    """'Title' column, tolerating stray whitespace in the header (e.g. 'Title ')"""
+    for column in df.columns:
+        if str(column).strip().lower() == 'title':
+            return column
+    return None
+
+
+def default_group_column(ledsone_df: pd.DataFrame, competitor_df: pd.DataFrame) -> Optional[str]:
+    common = set(ledsone_df.columns) & set(competitor_df.columns)
+    return next((c for c in GROUP_COLUMN_CANDIDATES if c in common), None)
+
+
+def term_matrix(titles: pd.Series) -> tuple:
+    """Sparse binary title-term matrix: (doc ids, term codes, vocabulary)
+
+    doc ids are positions in titles; each (doc, term) pair appears once.
+    """
+    tokens = (
+        titles.reset_index(drop=True).fillna('').astype(str).str.lower()
+        .str.findall(TOKEN_PATTERN.pattern).explode().dropna()
+    )
+    codes, vocabulary = pd.factorize(tokens, sort=False)
+    docs = tokens.index.to_numpy(dtype=np.int64)
+
+    # Filter on the (small) vocabulary rather than on every token
+    keep = np.array([len(t) > 1 and t not in EXCLUDED_TERMS for t in vocabulary], dtype=bool)
+    if len(codes):
+        mask = keep[codes]
+        docs, codes = docs[mask], codes[mask]
+
+    # Binary matrix: a word repeated within one title counts once
+    keys, _ = _unique_counts(docs * len(vocabulary) + codes)
+    return keys // max(len(vocabulary), 1), keys % max(len(vocabulary), 1), np.asarray(vocabulary, dtype=object)
+
+
+def _unique_counts(keys: np.ndarray) -> tuple:
+    """Sorted distinct keys and their counts (sort-based; faster than np.unique here)"""
+    keys = np.sort(keys)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+    return keys[starts], np.diff(np.r_[starts, len(keys)])
+
+
+def _group_codes(df: pd.DataFrame, group_column: Optional[str], groups: pd.Index) -> np.ndarray:
+    if group_column is None:
+        return np.zeros(len(df), dtype=np.int64)
+    labels = df[group_column].fillna('Unknown').astype(str)
+    return groups.get_indexer(labels).astype(np.int64)
+
+
+def _document_frequency(doc_groups: np.ndarray, docs: np.ndarray, terms: np.ndarray,
+                        n_terms: int) -> pd.Series:
+    """Titles containing each term, per group, indexed by packed group * n_terms + term keys"""
+    keys, counts = _unique_counts(doc_groups[docs] * n_terms + terms)
+    return pd.Series(counts, index=keys)
+
+
+def keyword_gaps(ledsone_df: pd.DataFrame, competitor_df: pd.DataFrame, group_column: Optional[str] = None,
+                 top_n: int = 25, min_share: float = 0.02) -> pd.DataFrame:
+    """Per group, competitor title keywords that Ledsone titles use less (or never)
+
+    Returns one row per (group, keyword) with the share of competitor and
+    Ledsone titles containing it; gap = competitor share - Ledsone share.
+    Keywords used by fewer than min_share of a group's competitor titles are
+    ignored as noise.
+    """
+    ledsone_titles = ledsone_df[find_title_column(ledsone_df)]
+    competitor_titles = competitor_df[find_title_column(competitor_df)]
+
+    # One vocabulary for both catalogues so term codes are comparable
+    docs, terms, vocabulary = term_matrix(pd.concat([ledsone_titles, competitor_titles], ignore_index=True))
+    n_ledsone, n_terms = len(ledsone_titles), max(len(vocabulary), 1)
+
+    if group_column is None:
+        groups = pd.Index([ALL_PRODUCTS])
+    else:
+        labels = pd.concat([ledsone_df[group_column], competitor_df[group_column]]).fillna('Unknown').astype(str)
+        groups = pd.Index(labels.unique())
+    doc_groups = np.concatenate([
+        _group_codes(ledsone_df, group_column, groups),
+        _group_codes(competitor_df, group_column, groups),
+    ])
+
+    is_competitor = docs >= n_ledsone
+    competitor_df_counts = _document_frequency(doc_groups, docs[is_competitor], terms[is_competitor], n_terms)
+    ledsone_df_counts = _document_frequency(doc_groups, docs[~is_competitor], terms[~is_competitor], n_terms)
+
+    competitor_sizes = np.bincount(doc_groups[n_ledsone:], minlength=len(groups))
+    ledsone_sizes = np.bincount(doc_groups[:n_ledsone], minlength=len(groups))
+
+    group_ids = competitor_df_counts.index.to_numpy() // n_terms
+    gaps = pd.DataFrame({
+        'group_id': group_ids,
+        'term_id': competitor_df_counts.index.to_numpy() % n_terms,
+        'competitor_titles': competitor_df_counts.to_numpy(),
+        'ledsone_titles': ledsone_df_counts.reindex(competitor_df_counts.index, fill_value=0).to_numpy(),
+    })
+    gaps['competitor_share'] = gaps['competitor_titles'] / competitor_sizes[group_ids]
+    ledsone_size = ledsone_sizes[group_ids]
+    gaps['ledsone_share'] = np.divide(gaps['ledsone_titles'], ledsone_size,
+                                      out=np.zeros(len(gaps)), where=ledsone_size > 0)
+    gaps['gap'] = gaps['competitor_share'] - gaps['ledsone_share']
+
+    gaps = gaps[(gaps['competitor_share'] >= min_share) & (gaps['gap'] > 0)]
+    gaps = gaps.sort_values(['group_id', 'gap'], ascending=[True, False]).groupby('group_id').head(top_n)
+
+    return pd.DataFrame({
+        'Product Group': groups[gaps['group_id']].to_numpy(),
+        'Keyword': vocabulary[gaps['term_id'].to_numpy()],
+        'Competitor Titles Using': gaps['competitor_titles'].to_numpy(),
+        'Competitor Share': gaps['competitor_share'].round(4).to_numpy(),
+        'Ledsone Titles Using': gaps['ledsone_titles'].to_numpy(),
+        'Ledsone Share': gaps['ledsone_share'].round(4).to_numpy(),
+        'Gap': gaps['gap'].round(4).to_numpy(),
+        'Missing From All Ledsone Titles': (gaps['ledsone_titles'] == 0).to_numpy(),
+    })
+
+
+def product_keyword_coverage(ledsone_df: pd.DataFrame, gaps: pd.DataFrame,
+                             group_column: Optional[str] = None) -> pd.DataFrame:
+    """For each Ledsone title, how many of its group's gap keywords it lacks"""
+    titles = ledsone_df[find_title_column(ledsone_df)]
+    docs, terms, vocabulary = term_matrix(titles)
+    n_terms = max(len(vocabulary), 1)
+    groups = ledsone_df[group_column].fillna('Unknown').astype(str).to_numpy() if group_column \
+        else np.full(len(ledsone_df), ALL_PRODUCTS, dtype=object)
+
+    # (group, keyword) pairs as packed integer keys, matched against the gap list
+    group_index = pd.Index(pd.unique(np.concatenate([groups, gaps['Product Group'].to_numpy()])))
+    group_ids = group_index.get_indexer(groups).astype(np.int64)
+    wanted_terms = pd.Index(vocabulary).get_indexer(gaps['Keyword'])
+    known = wanted_terms >= 0
+    wanted = group_index.get_indexer(gaps['Product Group'])[known] * n_terms + wanted_terms[known]
+
+    hits = np.bincount(docs[np.isin(group_ids[docs] * n_terms + terms, wanted)], minlength=len(ledsone_df))
+    gap_keywords = gaps.groupby('Product Group').size().reindex(groups, fill_value=0).to_numpy()
+
+    return pd.DataFrame({
+        'Title': titles.to_numpy(),
+        'Product Group': groups,
+        'Gap Keywords In Title': hits,
+        'Gap Keywords Missing': gap_keywords - hits,
+        'Gap Keyword Coverage': np.divide(hits, gap_keywords, out=np.ones(len(hits)), where=gap_keywords > 0).round(3),
+    })
+
+
+def gap_summary(gaps: pd.DataFrame) -> Dict[str, int]:
+    return {
+        'groups': int(gaps['Product Group'].nunique()) if not gaps.empty else 0,
+        'gap_keywords': len(gaps),
+        'missing_entirely': int(gaps['Missing From All Ledsone Titles'].sum()) if not gaps.empty else 0,
+    }
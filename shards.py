@@ -0,0 +1,272 @@
+"""
+Shard-and-merge execution of a catalogue across several machines.
+
+A run lives in a directory every node can reach (e.g. a network share):
+
+    <run_dir>/plan.parquet           catalogue rows with position, row key and shard
+    <run_dir>/coordination.sqlite    which node holds / finished which shard
+    <run_dir>/shard-<n>.parquet      one shard's generated titles
+
+Rows are assigned to shards by a hash of their content, so the same catalogue
+always gives the same shards. Any number of workers on any node claim shards
+from the SQLite file; a shard whose worker stops heart-beating for longer
+than the lease is handed to the next worker, and a shard with failed rows is
+marked failed so it is claimed again (up to SHARD_MAX_ATTEMPTS times). Shard
+files are replaced atomically, so re-running a shard is harmless, and the
+merge puts rows back in catalogue order and reports missing, duplicated or
+foreign rows.
+"""
+
+import glob
+import hashlib
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from incremental import row_fingerprint
+from ingest import dataframe_to_arrow
+
+# Seconds without a heartbeat after which a claimed shard can be taken over
+LEASE_SECONDS = float(os.getenv('SHARD_LEASE_SECONDS', '600'))
+# Claims of a failed shard before it is left for the merge to report as missing
+MAX_ATTEMPTS = int(os.getenv('SHARD_MAX_ATTEMPTS', '3'))
+
+PLAN_FILE = 'plan.parquet'
+DB_FILE = 'coordination.sqlite'
+
+ROW = 'row'
+ROW_KEY = 'row_key'
+SHARD = 'shard'
+
+# Shard status values
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def row_key(old_title: str, description: str) -> str:
+    return row_fingerprint(old_title, description, '', '')
+
+
+def shard_of(key: str, n_shards: int) -> int:
+    # Not hash(): Python salts string hashes per process
+    return int(key[:15], 16) % n_shards
+
+
+def shard_path(run_dir: str, shard: int) -> str:
+    return os.path.join(run_dir, f"shard-{shard:04d}.parquet")
+
+
+def _write_atomic(df: pd.DataFrame, path: str) -> None:
+    """Write to a temporary file and rename, so readers never see half a file"""
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    pq.write_table(dataframe_to_arrow(df.copy()), tmp)
+    os.replace(tmp, path)
+
+
+def plan_run(catalogue: pd.DataFrame, run_dir: str, n_shards: int,
+             title_column: str = 'Title ', description_column: str = 'Bullet Points') -> pd.DataFrame:
+    """Split a catalogue into n_shards and register the shards; re-planning the same catalogue is a no-op"""
+    old_titles = catalogue[title_column].fillna('').astype(str).tolist()
+    descriptions = catalogue[description_column].fillna('').astype(str).tolist()
+    keys = [row_key(t, d) for t, d in zip(old_titles, descriptions)]
+    plan = pd.DataFrame({
+        ROW: range(len(catalogue)),
+        ROW_KEY: keys,
+        SHARD: [shard_of(k, n_shards) for k in keys],
+        'old_title': old_titles,
+        'bullet_points': descriptions,
+    })
+
+    os.makedirs(run_dir, exist_ok=True)
+    path = os.path.join(run_dir, PLAN_FILE)
+    if os.path.exists(path):
+        existing = pd.read_parquet(path, columns=[ROW_KEY, SHARD])
+        if existing[ROW_KEY].tolist() != keys or existing[SHARD].tolist() != plan[SHARD].tolist():
+            raise ValueError(f"{run_dir} already holds a different plan; use a new run directory")
+    else:
+        _write_atomic(plan, path)
+
+    coordinator = ShardCoordinator(run_dir)
+    coordinator.register(plan[SHARD].value_counts().reindex(range(n_shards), fill_value=0).to_dict())
+    return plan
+
+
+def run_job_id(run_dir: str) -> str:
+    """Stable job id of a sharded run, for the usage ledger and the results store"""
+    keys = pd.read_parquet(os.path.join(run_dir, PLAN_FILE), columns=[ROW_KEY])[ROW_KEY]
+    plan_hash = hashlib.sha256('\n'.join(keys).encode('utf-8')).hexdigest()[:8]
+    return f"shards-{os.path.basename(os.path.normpath(run_dir))}-{plan_hash}"
+
+
+def read_plan(run_dir: str, shard: Optional[int] = None) -> pd.DataFrame:
+    filters = [(SHARD, '=', shard)] if shard is not None else None
+    return pd.read_parquet(os.path.join(run_dir, PLAN_FILE), filters=filters)
+
+
+class ShardCoordinator:
+    """Shard claims and status in a SQLite file next to the plan"""
+
+    def __init__(self, run_dir: str, lease_seconds: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit; claim() opens its own write transaction
+        self.db = sqlite3.connect(os.path.join(run_dir, DB_FILE), timeout=60, isolation_level=None)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " shard INTEGER PRIMARY KEY, rows INTEGER, status TEXT, node TEXT,"
+            " attempts INTEGER DEFAULT 0, claimed_at REAL, heartbeat REAL,"
+            " finished_at REAL, cost REAL, error TEXT)"
+        )
+
+    def register(self, rows_per_shard: Dict[int, int]) -> None:
+        self.db.executemany(
+            "INSERT OR IGNORE INTO shards (shard, rows, status) VALUES (?, ?, ?)",
+            [(int(shard), int(rows), PENDING) for shard, rows in rows_per_shard.items()]
+        )
+
+    def claim(self, node: str) -> Optional[int]:
+        """Atomically take the next pending, failed or abandoned shard; None when nothing is left"""
+        now = time.time()
+        # Write lock up front, so two nodes can't pick the same shard
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT shard FROM shards WHERE status = ? OR (status = ? AND attempts < ?)"
+                " OR (status = ? AND heartbeat < ?) ORDER BY attempts, shard LIMIT 1",
+                (PENDING, FAILED, self.max_attempts, RUNNING, now - self.lease_seconds)
+            ).fetchone()
+            if row is not None:
+                self.db.execute(
+                    "UPDATE shards SET status = ?, node = ?, attempts = attempts + 1,"
+                    " claimed_at = ?, heartbeat = ?, error = NULL WHERE shard = ?",
+                    (RUNNING, node, now, now, row[0])
+                )
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        return row[0] if row is not None else None
+
+    def heartbeat(self, shard: int, node: str) -> bool:
+        """Extend the lease; False if another node has taken the shard over"""
+        updated = self.db.execute("UPDATE shards SET heartbeat = ? WHERE shard = ? AND node = ? AND status = ?",
+                                  (time.time(), shard, node, RUNNING)).rowcount
+        return bool(updated)
+
+    def finish(self, shard: int, node: str, cost: float) -> None:
+        self.db.execute("UPDATE shards SET status = ?, node = ?, finished_at = ?, cost = ? WHERE shard = ?",
+                        (DONE, node, time.time(), cost, shard))
+
+    def fail(self, shard: int, node: str, error: str) -> None:
+        self.db.execute("UPDATE shards SET status = ?, error = ? WHERE shard = ? AND node = ?",
+                        (FAILED, error, shard, node))
+
+    def status(self) -> pd.DataFrame:
+        return pd.read_sql_query("SELECT * FROM shards ORDER BY shard", self.db)
+
+
+def default_node() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_shard(run_dir: str, shard: int, generate: Callable[[str, str], Tuple[Optional[str], float]],
+              on_row: Callable[[], None] = None) -> pd.DataFrame:
+    """Generate every row of one shard and write its results file"""
+    rows = read_plan(run_dir, shard)
+    titles, costs = [], []
+    for old_title, description in zip(rows['old_title'], rows['bullet_points']):
+        title, cost = generate(old_title, description)
+        titles.append(title)
+        costs.append(cost)
+        if on_row:
+            on_row()
+
+    results = rows[[ROW, ROW_KEY, SHARD, 'old_title', 'bullet_points']].assign(new_title=titles, cost=costs)
+    _write_atomic(results, shard_path(run_dir, shard))
+    return results
+
+
+class LeaseLost(Exception):
+    """Another node took over a shard whose heartbeat had lapsed"""
+
+
+def work(run_dir: str, generate: Callable[[str, str], Tuple[Optional[str], float]],
+         node: str = None, max_shards: int = None) -> int:
+    """Claim and run shards until none are left; returns the number of shards finished"""
+    if not os.path.exists(os.path.join(run_dir, PLAN_FILE)):
+        raise FileNotFoundError(f"No shard plan in {run_dir}; plan the run first")
+    node = node or default_node()
+    coordinator = ShardCoordinator(run_dir)
+    finished = 0
+    while max_shards is None or finished < max_shards:
+        shard = coordinator.claim(node)
+        if shard is None:
+            break
+        print(f"🔄 {node}: shard {shard}")
+
+        def on_row():
+            if not coordinator.heartbeat(shard, node):
+                raise LeaseLost(f"shard {shard} was taken over by another node")
+
+        try:
+            results = run_shard(run_dir, shard, generate, on_row)
+        except LeaseLost as e:
+            print(f"⚠️ {e}")
+            continue
+        except Exception as e:
+            coordinator.fail(shard, node, str(e))
+            print(f"❌ Shard {shard} failed: {e}")
+            continue
+        failed_rows = int(results['new_title'].isna().sum())
+        if failed_rows:
+            # The rows that did succeed stay in the shard file; the re-run replaces it
+            coordinator.fail(shard, node, f"{failed_rows} of {len(results)} rows failed")
+            print(f"❌ Shard {shard}: {failed_rows} of {len(results)} rows failed")
+            continue
+        coordinator.finish(shard, node, float(results['cost'].sum()))
+        finished += 1
+        print(f"✅ Shard {shard}: {len(results)} rows, ${results['cost'].sum():.4f}")
+    return finished
+
+
+def merge_shards(run_dir: str) -> Tuple[pd.DataFrame, Dict[str, list]]:
+    """All shard results in catalogue order, and the problems found
+
+    problems lists 'missing' rows (no title), 'duplicate' rows (conflicting
+    results for one row) and 'foreign' rows (a row key the plan doesn't have
+    at that position, e.g. a results file from another run). Identical
+    copies of a row, from re-running a shard, are merged silently.
+    """
+    plan = read_plan(run_dir)
+    files = sorted(glob.glob(os.path.join(run_dir, 'shard-*.parquet')))
+    if not files:
+        return plan.iloc[:0], {'missing': plan[ROW].tolist(), 'duplicate': [], 'foreign': []}
+    plan = plan[[ROW, ROW_KEY]]
+    results = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+
+    checked = results.merge(plan, on=ROW, how='left', suffixes=('', '_planned'))
+    foreign = checked[checked[ROW_KEY] != checked[f"{ROW_KEY}_planned"]]
+    results = results.loc[checked.index.difference(foreign.index)]
+    # A row whose generation failed has no title; it counts as missing, not as a result
+    results = results[results['new_title'].notna()]
+
+    results = results.drop_duplicates(subset=[ROW, ROW_KEY, 'new_title', 'cost'])
+    duplicate = results[results.duplicated(subset=[ROW], keep=False)]
+    results = results.drop_duplicates(subset=[ROW], keep='last')
+
+    missing = sorted(set(plan[ROW]) - set(results[ROW]))
+    problems = {
+        'missing': missing,
+        'duplicate': sorted(set(duplicate[ROW])),
+        'foreign': sorted(set(foreign[ROW])),
+    }
+    merged = results.sort_values(ROW, ignore_index=True)
+    return merged, problems
@@ -28,4 +28,14 @@ def start_app():
         print(f"❌ Error starting app: {e}")
 
 if __name__ == "__main__":
-    start_app() 
+    import argparse
+    parser = argparse.ArgumentParser(description="Start the Amazon Title Generator")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="more than 1 starts that many app workers behind a local proxy (see launcher.py)")
+    args = parser.parse_args()
+    if args.workers > 1:
+        from launcher import run
+        run(args.workers)
+    else:
+        start_app()
+
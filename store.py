@@ -0,0 +1,139 @@
+"""
+Columnar Parquet store for catalogues, generated titles and job metadata.
+
+Layout (hive partitioned by job):
+
+    <root>/inputs/job_id=<id>/<name>-<part>.parquet
+    <root>/results/job_id=<id>/part-<part>.parquet
+    <root>/jobs/job_id=<id>/meta.parquet
+
+Reads are memory-mapped and results are appended per job, so re-runs and
+analytics never touch Excel. Excel is only produced by export_excel().
+"""
+
+import io
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingest import dataframe_to_arrow
+
+STORE_DIR = os.getenv('TITLE_STORE_DIR', os.path.join('output', 'store'))
+
+INPUTS = 'inputs'
+RESULTS = 'results'
+JOBS = 'jobs'
+
+
+def new_job_id() -> str:
+    """Sortable, collision-free job identifier"""
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+class ResultStore:
+    """Append-per-job Parquet store with memory-mapped reads"""
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def _partition(self, dataset: str, job_id: str) -> str:
+        path = os.path.join(self.root, dataset, f"job_id={job_id}")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _write(self, dataset: str, job_id: str, df: pd.DataFrame, name: str) -> str:
+        # Time-ordered part names keep appended chunks in write order
+        part = f"{time.time_ns():020d}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(self._partition(dataset, job_id), f"{name}-{part}.parquet")
+        pq.write_table(dataframe_to_arrow(df.copy()), path)
+        return path
+
+    def write_inputs(self, job_id: str, df: pd.DataFrame, name: str = 'catalogue') -> str:
+        """Persist an input sheet (catalogue or examples) for a job"""
+        return self._write(INPUTS, job_id, df, name)
+
+    def append_results(self, job_id: str, df: pd.DataFrame) -> Optional[str]:
+        """Append a chunk of generated titles to a job; safe to call repeatedly"""
+        if df.empty:
+            return None
+        return self._write(RESULTS, job_id, df, 'part')
+
+    def delete_job(self, job_id: str) -> None:
+        """Remove a job's inputs, results and metadata, e.g. before rewriting a job under a stable id"""
+        for dataset in (INPUTS, RESULTS, JOBS):
+            shutil.rmtree(os.path.join(self.root, dataset, f"job_id={job_id}"), ignore_errors=True)
+
+    def write_job_metadata(self, job_id: str, **metadata) -> str:
+        """Record (or overwrite) the one-row metadata for a job"""
+        row = {'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+        row.update(metadata)
+        path = os.path.join(self._partition(JOBS, job_id), 'meta.parquet')
+        pq.write_table(pa.Table.from_pylist([row]), path)
+        return path
+
+    def read(self, dataset: str, job_id: Optional[str] = None,
+             columns: Optional[List[str]] = None, name: Optional[str] = None) -> pd.DataFrame:
+        """Memory-mapped read of one job or of every job in a dataset"""
+        base = os.path.join(self.root, dataset)
+        if job_id is not None:
+            base = os.path.join(base, f"job_id={job_id}")
+        if not os.path.isdir(base):
+            return pd.DataFrame(columns=columns or [])
+
+        if job_id is not None:
+            files = sorted(
+                os.path.join(base, f) for f in os.listdir(base)
+                if f.endswith('.parquet') and (name is None or f.startswith(f"{name}-"))
+            )
+            if not files:
+                return pd.DataFrame(columns=columns or [])
+            tables = [pq.read_table(f, columns=columns, memory_map=True) for f in files]
+            df = pa.concat_tables(tables, promote_options='permissive').to_pandas()
+            if columns is None:
+                df['job_id'] = job_id
+            return df
+
+        table = pq.read_table(base, columns=columns, memory_map=True, partitioning='hive')
+        df = table.to_pandas()
+        if 'job_id' in df.columns:
+            df['job_id'] = df['job_id'].astype(str)
+        return df
+
+    def read_results(self, job_id: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return self.read(RESULTS, job_id, columns)
+
+    def read_inputs(self, job_id: str, name: str = 'catalogue') -> pd.DataFrame:
+        return self.read(INPUTS, job_id, name=name)
+
+    def list_jobs(self) -> pd.DataFrame:
+        """All jobs, newest first"""
+        jobs = self.read(JOBS)
+        if jobs.empty:
+            return jobs
+        # Not every job id is a timestamp (e.g. a sharded run's), so order by creation time first
+        return jobs.sort_values(['created_at', 'job_id'], ascending=False, ignore_index=True)
+
+    def latest_job_id(self, **match) -> Optional[str]:
+        """Most recent job, optionally restricted to jobs whose metadata matches"""
+        jobs = self.list_jobs()
+        for key, value in match.items():
+            if jobs.empty or key not in jobs.columns:
+                return None
+            jobs = jobs[jobs[key] == value]
+        return None if jobs.empty else str(jobs['job_id'].iloc[0])
+
+    def export_excel(self, job_id: str, sheet_name: str = 'Generated Titles') -> bytes:
+        """Render a job's results as an .xlsx file on demand"""
+        results = self.read_results(job_id).drop(columns=['job_id'], errors='ignore')
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            results.to_excel(writer, index=False, sheet_name=sheet_name)
+        output.seek(0)
+        return output.getvalue()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Synonym lexicon and one-pass redundancy matcher for generated titles.
+
+The lexicon is a plain text file (data/synonyms.txt by default, or
+SYNONYM_LEXICON), one group per line with the preferred term first:
+
+    vintage, retro
+    lampshade, lamp shade
+
+All terms are compiled into one trie-shaped regular expression, so a batch of
+titles is scanned in a single pass: the titles are joined and matched once,
+and matches are mapped back to their titles by offset. A title using two
+different terms of a group (e.g. "Vintage Retro Style") has the later ones
+removed locally; only titles where that would drop a required old-title
+keyword are left for the model to redo.
+
+Build a lexicon from a catalogue, or audit a results file:
+    python synonyms.py build data/Amazon_Competitors.xlsx data/Amazon_Data.xlsx
+    python synonyms.py check output/results.xlsx
+"""
+
+import argparse
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+LEXICON_PATH = os.getenv('SYNONYM_LEXICON', os.path.join('data', 'synonyms.txt'))
+
+# Hand-picked groups kept in every lexicon (preferred term first)
+SEED_GROUPS = [
+    ['vintage', 'retro'],
+    ['modern', 'contemporary'],
+    ['light fitting', 'light fixture'],
+    ['pieces', 'pcs'],
+]
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+# Connectors that go with a removed term, e.g. "Vintage / Retro" -> "Vintage"
+_CONNECTOR_AFTER = re.compile(r"\s*(?:[/&+,-]|\band\b)?\s*", re.IGNORECASE)
+_CONNECTORS = ('/', '&', '+', ',', '-')
+
+_SPACES = re.compile(r"\s{2,}")
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"\s+([,.;:)])")
+_REPEATED_SEPARATORS = re.compile(r"([-,/&])(\s*[-,/&])+")
+
+# Action codes
+OK = ''
+COLLAPSED = 'collapsed'
+REPROMPT = 'reprompt'
+
+
+def read_lexicon(path: str = LEXICON_PATH) -> List[List[str]]:
+    """Synonym groups from a lexicon file; the seed groups if the file doesn't exist"""
+    if not path or not os.path.exists(path):
+        return [list(group) for group in SEED_GROUPS]
+    groups = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            terms = [term.strip().lower() for term in line.split(',') if term.strip()]
+            if len(terms) > 1:
+                groups.append(terms)
+    return groups
+
+
+def write_lexicon(groups: List[List[str]], path: str = LEXICON_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# One synonym group per line, preferred term first. Terms may be phrases.\n")
+        for group in groups:
+            f.write(', '.join(group) + '\n')
+
+
+def build_lexicon(titles: Iterable[str], seed: List[List[str]] = None) -> List[List[str]]:
+    """Seed groups plus spelling variants found in the catalogue's own titles
+
+    A two-word phrase whose words also appear joined ('lamp shade' /
+    'lampshade') is a variant pair; the more frequent form is preferred.
+    """
+    counts = Counter()
+    for title in titles:
+        words = WORD_PATTERN.findall(str(title).lower())
+        counts.update(words)
+        counts.update(f"{a} {b}" for a, b in zip(words, words[1:]) if len(a) > 2 and len(b) > 2)
+
+    groups = [list(group) for group in (seed if seed is not None else SEED_GROUPS)]
+    known = {term for group in groups for term in group}
+    for phrase, phrase_count in sorted(counts.items()):
+        if ' ' not in phrase:
+            continue
+        joined = phrase.replace(' ', '')
+        if counts.get(joined) and phrase not in known and joined not in known:
+            groups.append(sorted([phrase, joined], key=lambda term: -counts[term]))
+            known.update((phrase, joined))
+    return groups
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """Regex alternation factored by shared prefixes, so matching never retries a prefix"""
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def render(node: Dict) -> str:
+        branches = [re.escape(char).replace('\\ ', r'[\s-]+') + render(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A term ends here, so the longer continuations are optional
+        return f"(?:{body})?" if '' in node else body
+
+    return render(trie)
+
+
+class SynonymMatcher:
+    """All lexicon terms compiled into one word-bounded, case-insensitive pattern"""
+
+    def __init__(self, groups: List[List[str]]):
+        self.groups = [list(group) for group in groups]
+        self.group_of = {}
+        for group_id, group in enumerate(self.groups):
+            for term in group:
+                self.group_of.setdefault(self.normalize(term), group_id)
+        self.pattern = re.compile(r"\b" + _trie_pattern(self.group_of) + r"\b", re.IGNORECASE)
+
+    @staticmethod
+    def normalize(term: str) -> str:
+        return re.sub(r"[\s-]+", ' ', term.lower()).strip()
+
+    def scan(self, titles: Sequence[str]) -> pd.DataFrame:
+        """Every lexicon term in every title, in one pass: (title, start, end, group, term)"""
+        titles = ['' if title is None or title != title else str(title) for title in titles]
+        # Newlines never occur inside a match, so joined titles can't produce cross-title hits
+        text = '\n'.join(title.replace('\n', ' ') for title in titles)
+        offsets = np.cumsum([0] + [len(title) + 1 for title in titles[:-1]]) if titles else np.array([0])
+
+        matches = [(m.start(), m.end(), m.group()) for m in self.pattern.finditer(text)]
+        if not matches:
+            return pd.DataFrame(columns=['title', 'start', 'end', 'group', 'term'])
+        starts, ends, spellings = zip(*matches)
+        # Few distinct spellings occur, so normalize each once
+        normalized = {spelling: self.normalize(spelling) for spelling in set(spellings)}
+        terms = [normalized[spelling] for spelling in spellings]
+        title_ids = np.searchsorted(offsets, starts, side='right') - 1
+        return pd.DataFrame({
+            'title': title_ids,
+            'start': np.asarray(starts) - offsets[title_ids],
+            'end': np.asarray(ends) - offsets[title_ids],
+            'group': [self.group_of[term] for term in terms],
+            'term': terms,
+        })
+
+    def redundant_groups(self, title: str) -> List[List[str]]:
+        """Terms of each group that a single title uses more than one of"""
+        used = {}
+        for match in self.pattern.finditer(title or ''):
+            term = self.normalize(match.group())
+            terms = used.setdefault(self.group_of[term], [])
+            if term not in terms:
+                terms.append(term)
+        return [terms for terms in used.values() if len(terms) > 1]
+
+    def collapse(self, titles: Sequence[str], protected: Sequence[Optional[Set[str]]] = None) -> tuple:
+        """(titles, actions): later synonyms of an earlier term are removed
+
+        protected holds, per title, terms that must stay (e.g. the old title's
+        missing keywords); when a group has two protected terms the title is
+        left as is with action REPROMPT.
+        """
+        titles = list(titles)
+        actions = [OK] * len(titles)
+        found = self.scan(titles)
+        if found.empty:
+            return titles, actions
+
+        # Only (title, group) pairs using two different terms need work
+        distinct = found.drop_duplicates(['title', 'group', 'term'])
+        pairs = distinct.groupby(['title', 'group']).size()
+        redundant = pairs[pairs > 1].index
+        found = found.set_index(['title', 'group']).loc[redundant].reset_index() if len(redundant) else found.iloc[:0]
+
+        # Matches are in text order, so each title's hits are contiguous and sorted
+        hits_by_title = {}
+        for title_id, group, start, end, term in zip(found['title'].tolist(), found['group'].tolist(),
+                                                     found['start'].tolist(), found['end'].tolist(),
+                                                     found['term'].tolist()):
+            hits_by_title.setdefault(title_id, {}).setdefault(group, []).append((start, end, term))
+
+        for title_id, groups in hits_by_title.items():
+            required_terms = {self.normalize(t) for t in (protected[title_id] or ())} if protected else set()
+            cuts = []
+            for hits in groups.values():
+                required = {term for _, _, term in hits} & required_terms
+                if len(required) > 1:
+                    cuts = None
+                    break
+                # Keep the required term, otherwise the first one used
+                keep = required.pop() if required else min(hits)[2]
+                cuts += [(start, end) for start, end, term in hits if term != keep]
+            if cuts is None:
+                actions[title_id] = REPROMPT
+                continue
+            titles[title_id] = _remove_spans(titles[title_id], cuts)
+            actions[title_id] = COLLAPSED
+        return titles, actions
+
+
+def _remove_spans(title: str, spans: List[tuple]) -> str:
+    """Cut spans (right to left) with one adjoining connector, then tidy spacing"""
+    for start, end in sorted(spans, reverse=True):
+        after = _CONNECTOR_AFTER.match(title, end)
+        if after.group().strip():
+            end = after.end()
+        else:
+            head = title[:start].rstrip()
+            if head.endswith(_CONNECTORS):
+                start = len(head) - 1
+            elif head.lower().endswith(' and'):
+                start = len(head) - 4
+        title = title[:start] + ' ' + title[end:]
+    title = _SPACES.sub(' ', title)
+    title = _SPACE_BEFORE_PUNCTUATION.sub(r"\1", title)
+    title = _REPEATED_SEPARATORS.sub(r"\1", title)
+    title = title.strip(' ,/&-')
+    # A removed first word leaves the next one in lower case
+    return title[:1].upper() + title[1:]
+
+
+_default_matcher = None
+
+
+def default_matcher() -> SynonymMatcher:
+    """Matcher for the lexicon at LEXICON_PATH (seed groups if there is none)"""
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = SynonymMatcher(read_lexicon())
+    return _default_matcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="write a lexicon from catalogue titles")
+    build.add_argument('workbooks', nargs='+')
+    build.add_argument('--output', default=LEXICON_PATH)
+    check = commands.add_parser('check', help="report and collapse synonym pairs in a results file")
+    check.add_argument('results')
+    check.add_argument('--column', default='new_title')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        titles = []
+        for path in args.workbooks:
+            for df in pd.read_excel(path, sheet_name=None).values():
+                column = next((c for c in df.columns if str(c).strip().lower() == 'title'), None)
+                if column is not None:
+                    titles += df[column].dropna().astype(str).tolist()
+        groups = build_lexicon(titles, read_lexicon(args.output) if os.path.exists(args.output) else None)
+        write_lexicon(groups, args.output)
+        print(f"✅ {len(groups)} synonym groups from {len(titles)} titles written to {args.output}")
+
+    else:
+        df = pd.read_excel(args.results)
+        titles, actions = default_matcher().collapse(df[args.column].tolist())
+        changed = [i for i, action in enumerate(actions) if action]
+        print(f"🔍 {len(changed)} of {len(df)} titles use redundant synonyms")
+        for i in changed:
+            print(f"  {actions[i]:>9}: {df[args.column].iloc[i]}\n{'':>13}{titles[i]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -72,7 +72,8 @@ def test_app_functions():
     print("\nTesting app functions...")
     
     try:
-        from app import create_prompt, generate_title
+        from app import generate_title
+        from title_engine import create_prompt
         
         # Test create_prompt
         prompt = create_prompt("Test Title", "Test description")
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import api_server
+import backends
+import ledger
+
+
+class MockUpstream(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat completions; packed prompts get an unparseable reply, 'FAIL' descriptions a 500"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][-1]['content']
+        if 'FAIL' in prompt and 'JSON array' not in prompt:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        content = 'not a JSON array' if 'JSON array' in prompt else 'Mock Title'
+        payload = json.dumps({
+            'choices': [{'message': {'content': content}}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 5},
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('LOCAL_LLM_URL', f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(backends, 'DEFAULT_BACKEND', 'local')
+    monkeypatch.setattr(backends, '_instances', {})
+    monkeypatch.setattr(ledger, 'LEDGER_PATH', '')
+    yield
+    server.shutdown()
+
+
+async def call(app, method, path, payload=None):
+    """Drive the ASGI app directly; returns (status, json body)"""
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({'type': 'http', 'method': method, 'path': path}, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+def post_titles(app, payloads):
+    async def run():
+        try:
+            return await asyncio.gather(*(call(app, 'POST', '/v1/title', payload) for payload in payloads))
+        finally:
+            await app.batcher.close()
+    return asyncio.run(run())
+
+
+def test_failed_item_in_fallback_only_fails_its_caller(upstream):
+    responses = post_titles(api_server.TitleAPI(), [
+        {'old_title': 'Lamp A', 'description': 'E27 pendant'},
+        {'old_title': 'Lamp B', 'description': 'FAIL'},
+        {'old_title': 'Lamp C', 'description': 'Wall light'},
+    ])
+
+    assert [status for status, _ in responses] == [200, 502, 200]
+    assert responses[0][1]['title'] == 'Mock Title'
+    assert responses[0][1]['batch_size'] == 1
+    assert 'error' in responses[1][1]
+
+
+def test_invalid_payload_is_400(upstream):
+    [(status, body)] = post_titles(api_server.TitleAPI(), [{'old_title': 'Lamp'}])
+    assert status == 400
+    assert body['error'] == "'description' is required"
+
+
+def test_backend_configuration_error_is_502(upstream, monkeypatch):
+    monkeypatch.setattr(backends, 'DEFAULT_BACKEND', 'missing')
+    [(status, body)] = post_titles(api_server.TitleAPI(), [{'description': 'E27 pendant'}])
+    assert status == 502
+    assert 'Unknown backend' in body['error']
@@ -0,0 +1,83 @@
+import openai
+import pytest
+import requests
+
+from backends import CompletionBackend
+from cassette import RECORD, REPLAY, Cassette, CassetteBackend, ReplayedError, worker_cassette_path
+from concurrency import is_throttle_error
+
+MESSAGES = [{'role': 'user', 'content': 'Title for an E27 pendant'}]
+
+
+class FailingBackend(CompletionBackend):
+    name = 'failing'
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+    def complete(self, messages, model, **params):
+        raise self.error
+
+
+class TitleBackend(CompletionBackend):
+    name = 'fake'
+
+    def __init__(self, title: str):
+        self.title = title
+
+    def complete(self, messages, model, **params):
+        return self.title, 10, 5
+
+
+def record_and_replay(path, error: Exception) -> Exception:
+    recorder = Cassette(str(path), RECORD)
+    backend = CassetteBackend('failing', False, recorder, lambda: FailingBackend(error))
+    with pytest.raises(type(error)):
+        backend.complete(MESSAGES, 'gpt-4o-mini')
+    recorder.close()
+
+    player = CassetteBackend('failing', False, Cassette(str(path), REPLAY, latency_scale=0), None)
+    with pytest.raises(Exception) as replayed:
+        player.complete(MESSAGES, 'gpt-4o-mini')
+    return replayed.value
+
+
+def test_rate_limit_replays_as_throttle(tmp_path):
+    error = record_and_replay(tmp_path / 'run.jsonl.gz', openai.error.RateLimitError("Slow down", http_status=429))
+    assert isinstance(error, openai.error.RateLimitError)
+    assert error.http_status == 429
+    assert is_throttle_error(error)
+
+
+def test_other_failure_keeps_its_http_status(tmp_path):
+    recorded = RuntimeError("Bad gateway")
+    recorded.http_status = 503
+    error = record_and_replay(tmp_path / 'run.jsonl.gz', recorded)
+    assert isinstance(error, ReplayedError)
+    assert error.http_status == 503
+    assert is_throttle_error(error)
+
+
+def test_replay_reads_every_workers_cassette(tmp_path):
+    path = str(tmp_path / 'run.jsonl.gz')
+    for worker, title in ((1, 'Cage Pendant'), (2, 'Globe Wall Light')):
+        recorder = Cassette(worker_cassette_path(path, worker), RECORD)
+        messages = [{'role': 'user', 'content': title}]
+        CassetteBackend('fake', False, recorder, lambda: TitleBackend(title)).complete(messages, 'gpt-4o-mini')
+        recorder.close()
+
+    player = CassetteBackend('fake', False, Cassette(path, REPLAY, latency_scale=0), None)
+    for title in ('Cage Pendant', 'Globe Wall Light'):
+        assert player.complete([{'role': 'user', 'content': title}], 'gpt-4o-mini')[0] == title
+
+
+def test_local_backend_throttles_replay_as_throttles(tmp_path):
+    response = requests.Response()
+    response.status_code = 429
+    http_error = record_and_replay(tmp_path / 'http.jsonl.gz', requests.HTTPError("429 Too Many Requests",
+                                                                                   response=response))
+    timeout = record_and_replay(tmp_path / 'timeout.jsonl.gz', requests.ReadTimeout("Read timed out"))
+
+    assert http_error.http_status == 429
+    assert isinstance(timeout, requests.ReadTimeout)
+    assert is_throttle_error(http_error) and is_throttle_error(timeout)
@@ -0,0 +1,22 @@
+import pytest
+
+from client_pool import ClientPool
+
+
+@pytest.mark.parametrize('raw, detail', [
+    ('[{"api_key": "sk-1",}]', 'Expecting property name'),
+    ('[{"api_key": "sk-1", "region": "eu"}]', "unexpected keyword argument 'region'"),
+    ('["sk-1"]', "'str' object has no attribute 'pop'"),
+])
+def test_malformed_backends_name_the_variable(monkeypatch, raw, detail):
+    monkeypatch.setenv('OPENAI_BACKENDS', raw)
+    with pytest.raises(ValueError, match='OPENAI_BACKENDS') as error:
+        ClientPool.from_env()
+    assert detail in str(error.value)
+
+
+def test_missing_key_says_which_variables_to_set(monkeypatch):
+    for name in ('OPENAI_BACKENDS', 'OPENAI_API_KEYS', 'OPENAI_API_KEY'):
+        monkeypatch.delenv(name, raising=False)
+    with pytest.raises(ValueError, match='OPENAI_API_KEY'):
+        ClientPool.from_env()
@@ -0,0 +1,20 @@
+import requests
+
+from concurrency import is_throttle_error
+
+
+def http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} from the local server", response=response)
+
+
+def test_local_backend_throttles_are_recognised():
+    assert is_throttle_error(http_error(429))
+    assert is_throttle_error(http_error(503))
+    assert is_throttle_error(requests.ReadTimeout("Read timed out"))
+
+
+def test_local_backend_client_errors_are_not_throttles():
+    assert not is_throttle_error(http_error(400))
+    assert not is_throttle_error(requests.ConnectionError("refused"))
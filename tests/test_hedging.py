@@ -0,0 +1,62 @@
+import itertools
+import time
+
+from concurrency import AIMDController
+from hedging import Hedger
+from scheduler import JobScheduler
+
+
+def scripted(delays):
+    """fn sleeping for the next of delays on each call, returning (call number, cost)"""
+    calls = itertools.count()
+
+    def fn():
+        n = next(calls)
+        time.sleep(delays[n])
+        return n, 0.01
+    return fn
+
+
+def test_abandoned_duplicate_cost_is_in_report_after_close():
+    hedger = Hedger(max_fraction=1.0, min_samples=1)
+    fn = scripted([0.01, 0.3, 0.01])
+    hedger.call('gpt-4o-mini', fn)
+
+    # The slow primary is hedged, the duplicate wins and the primary is abandoned
+    assert hedger.call('gpt-4o-mini', fn) == (2, 0.01)
+    hedger.close()
+
+    report = hedger.report()
+    assert report['hedge_wins'] == 1
+    assert report['abandoned_in_flight'] == 0
+    assert report['hedge_cost'] == 0.01
+
+
+def test_hedge_holds_a_scheduler_slot_until_it_returns():
+    scheduler = JobScheduler(AIMDController(initial=2, max_limit=2))
+    hedger = Hedger(max_fraction=1.0, min_samples=1, scheduler=scheduler)
+    fn = scripted([0.01, 0.3, 0.01])
+    hedger.call('gpt-4o-mini', fn)
+
+    assert hedger.call('gpt-4o-mini', fn) == (2, 0.01)
+    assert hedger.report()['hedged'] == 1
+    # Returned and released: both slots are free again
+    time.sleep(0.05)
+    assert scheduler.try_acquire_slot() and scheduler.try_acquire_slot()
+
+
+def test_hedge_needs_a_free_scheduler_slot():
+    scheduler = JobScheduler(AIMDController(initial=1, max_limit=1))
+    hedger = Hedger(max_fraction=1.0, min_samples=1, scheduler=scheduler)
+    fn = scripted([0.01, 0.2])
+    hedger.call('gpt-4o-mini', fn)
+
+    # The only slot is held (as by the primary's own row), so no duplicate is sent
+    assert scheduler.try_acquire_slot()
+    assert hedger.call('gpt-4o-mini', fn) == (1, 0.01)
+    scheduler.release_slot(0.2)
+    hedger.close()
+
+    report = hedger.report()
+    assert report['hedged'] == 0
+    assert report['hedges_without_slot'] == 1
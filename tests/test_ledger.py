@@ -0,0 +1,62 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+import ledger as ledger_module
+from backends import CompletionBackend
+from ledger import UsageLedger, usage_context
+from title_engine import complete_and_record
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return UsageLedger(str(tmp_path / 'usage.sqlite'))
+
+
+def test_multi_marketplace_completion_is_split_per_marketplace(ledger):
+    with usage_context(job='job-1'):
+        ledger.record('openai', 'gpt-4o-mini', 1001, 80, 0.003, 1.5, marketplaces=['UK', 'DE', 'FR'])
+
+    today = date.today()
+    usage = ledger.rollup(today - timedelta(days=1), today + timedelta(days=1), by=['marketplace'])
+    assert sorted(usage['marketplace']) == ['DE', 'FR', 'UK']
+    assert usage['input_tokens'].sum() == 1001
+    assert usage['output_tokens'].sum() == 80
+    assert usage['cost'].sum() == pytest.approx(0.003)
+    assert usage['avg_latency'].tolist() == [1.5, 1.5, 1.5]
+
+
+def test_week_spanning_new_year_is_one_period(ledger, monkeypatch):
+    for day in (date(2024, 12, 30), date(2024, 12, 31), date(2025, 1, 2), date(2025, 1, 6)):
+        noon = datetime(day.year, day.month, day.day, 12, tzinfo=timezone.utc).timestamp()
+        monkeypatch.setattr(ledger_module.time, 'time', lambda: noon)
+        ledger.record('openai', 'gpt-4o-mini', 100, 10, 0.001, 1.0)
+    monkeypatch.undo()
+
+    usage = ledger.rollup(date(2024, 12, 1), date(2025, 1, 31), period='week')
+    assert usage['week'].tolist() == ['2024-12-30', '2025-01-06']
+    assert usage['requests'].tolist() == [3, 1]
+
+
+class FakeBackend(CompletionBackend):
+    name = 'fake'
+    billable = False
+
+    def complete(self, messages, model, **params):
+        return 'Cage Pendant Light E27', 100, 10
+
+
+def test_completion_returns_when_the_ledger_cannot_be_opened(monkeypatch, capsys):
+    monkeypatch.setattr(ledger_module, 'LEDGER_PATH', '/proc/nope/usage.sqlite')
+    monkeypatch.setattr(ledger_module, '_ledger', None)
+    monkeypatch.setattr(ledger_module, '_ledger_failed', False)
+
+    result = complete_and_record(FakeBackend(), [{'role': 'user', 'content': 'E27 pendant'}], 'gpt-4o-mini')
+    assert result == ('Cage Pendant Light E27', 0.0, 100, 10)
+    assert 'not recorded' in capsys.readouterr().out
+
+
+def test_failed_flush_drops_rows_without_raising(ledger):
+    ledger._db.close()
+    ledger.record('openai', 'gpt-4o-mini', 100, 10, 0.001, 1.0)
+    ledger.flush()
@@ -0,0 +1,25 @@
+import pandas as pd
+
+from product_matching import match_products
+
+LEDSONE = pd.DataFrame({
+    'Title': ['Vintage Cage Pendant Light E27 Black', 'Globe Glass Wall Light GU10 Brass'],
+    'Bullet Points': ['Industrial cage pendant, E27 lamp holder', 'Globe glass wall lamp, GU10 cap'],
+})
+COMPETITORS = pd.DataFrame({
+    'Title': ['Industrial Cage Pendant Lamp E27 Matt Black', 'Brass Globe Wall Lamp GU10 Glass Shade'],
+    'Bullet Points': ['Cage pendant light with E27 holder', 'Wall lamp with GU10 cap and glass globe'],
+})
+
+
+def test_category_on_one_side_only_does_not_block_matches():
+    unscoped = match_products(LEDSONE, COMPETITORS)
+    one_sided = match_products(LEDSONE, COMPETITORS.assign(category='MasterSheet'))
+    assert len(unscoped) > 0
+    pd.testing.assert_frame_equal(one_sided, unscoped)
+
+
+def test_category_on_both_sides_scopes_matches():
+    matches = match_products(LEDSONE.assign(category=['Pendant', 'Wall']),
+                             COMPETITORS.assign(category=['Wall', 'Pendant']))
+    assert matches.empty
@@ -0,0 +1,58 @@
+import pandas as pd
+
+import shards
+
+CATALOGUE = pd.DataFrame({
+    'Title ': ['Cage Pendant E27', 'Globe Wall Light GU10', 'Brass Spotlight'],
+    'Bullet Points': ['Industrial cage pendant', 'Glass globe wall lamp', 'Adjustable brass spot'],
+})
+
+
+def test_failed_rows_fail_the_shard_and_merge_as_missing(tmp_path):
+    run_dir = str(tmp_path)
+    shards.plan_run(CATALOGUE, run_dir, n_shards=1)
+
+    def generate(old_title, description):
+        return (None, 0.0) if 'GU10' in old_title else (f"New {old_title}", 0.01)
+
+    assert shards.work(run_dir, generate, node='a', max_shards=1) == 0
+    status = shards.ShardCoordinator(run_dir).status()
+    assert status['status'].tolist() == [shards.FAILED]
+    assert status['error'].tolist() == ["1 of 3 rows failed"]
+
+    merged, problems = shards.merge_shards(run_dir)
+    assert problems['missing'] == [1]
+    assert merged['row'].tolist() == [0, 2]
+
+
+def test_failed_shard_is_retried_until_max_attempts(tmp_path):
+    run_dir = str(tmp_path)
+    shards.plan_run(CATALOGUE, run_dir, n_shards=1)
+
+    assert shards.work(run_dir, lambda old_title, description: (None, 0.0), node='a') == 0
+    assert shards.ShardCoordinator(run_dir).status()['attempts'].tolist() == [shards.MAX_ATTEMPTS]
+
+    # A later worker can't claim it again; the merge reports every row missing
+    assert shards.work(run_dir, lambda old_title, description: ("Title", 0.0), node='b') == 0
+    assert shards.merge_shards(run_dir)[1]['missing'] == [0, 1, 2]
+
+
+def test_run_job_id_is_stable_and_merge_replaces_its_store_job(tmp_path):
+    from store import ResultStore
+
+    run_dir = str(tmp_path / 'refresh')
+    shards.plan_run(CATALOGUE, run_dir, n_shards=2)
+    shards.work(run_dir, lambda old_title, description: (f"New {old_title}", 0.01), node='a')
+    job_id = shards.run_job_id(run_dir)
+    assert job_id == shards.run_job_id(run_dir)
+    assert job_id.startswith('shards-refresh-')
+
+    store = ResultStore(str(tmp_path / 'store'))
+    for _ in range(2):
+        merged, _ = shards.merge_shards(run_dir)
+        store.delete_job(job_id)
+        store.append_results(job_id, merged)
+        store.write_job_metadata(job_id, mode='title_FSL', rows=len(merged))
+
+    assert store.list_jobs()['job_id'].tolist() == [job_id]
+    assert len(store.read_results(job_id)) == len(CATALOGUE)
@@ -0,0 +1,363 @@
+"""
+Streamlit-free title generation core shared by the UI, scripts and batch runners.
+
+Everything here is safe to call from worker threads: errors are raised to the
+caller instead of being rendered.
+"""
+
+import hashlib
+import json
+import math
+import re
+import time
+from typing import List, Dict
+
+from jinja2 import Template
+
+from backends import get_backend
+from ledger import record_usage
+from guidelines import MAX_TITLE_LENGTH, missing_title_keywords, missing_title_keywords_batch, pack_sizes
+
+# Pricing for gpt-4o-mini (June 2024)
+INPUT_COST_PER_1M = 0.06   # USD/1M
+OUTPUT_COST_PER_1M = 2.40  # USD/1M
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# (input, output) USD per 1M tokens for models usable in a cascade
+MODEL_PRICING = {
+    "gpt-4o-mini": (INPUT_COST_PER_1M, OUTPUT_COST_PER_1M),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Output tokens cost 40x input tokens, so completions are capped at what a
+# MAX_TITLE_LENGTH title can need (~3 characters per token for titles dense
+# with sizes and units) plus slack for framing that is stripped afterwards
+TITLE_CHARS_PER_TOKEN = 3
+TITLE_MAX_TOKENS = math.ceil(MAX_TITLE_LENGTH / TITLE_CHARS_PER_TOKEN) + 8
+
+# A new example means the model is running on. No blank-line stop: replies such as
+# "Here is the title:\n\n<title>" would be cut before the title
+TITLE_STOP_SEQUENCES = ["\nDescription:", "\nExample"]
+
+# "Title:", "**New Title:**", "Here is the title:" ... in front of the title
+_FRAMING_PREFIX = re.compile(
+    r"^(?:here(?:'s| is)[^:\n]*:|(?:\*\*)?(?:(?:new|amazon|product|generated|optimi[sz]ed)\s+)*title(?:\*\*)?\s*:(?:\*\*)?)\s*",
+    re.IGNORECASE
+)
+_QUOTE_PAIRS = {'"': '"', "'": "'", '“': '”', '‘': '’', '`': '`', '*': '*'}
+
+# Marketplaces a multi-marketplace request can target, with the language each title is written in
+MARKETPLACES = {
+    'UK': {'language': 'British English', 'english': True},
+    'US': {'language': 'American English (US spelling, e.g. "Color")', 'english': True},
+    'DE': {'language': 'German', 'english': False},
+    'FR': {'language': 'French', 'english': False},
+    'IT': {'language': 'Italian', 'english': False},
+    'ES': {'language': 'Spanish', 'english': False},
+}
+
+# Compound words and accents split into more tokens than English
+NON_ENGLISH_TOKEN_FACTOR = 1.5
+
+SYSTEM_PROMPT = "You are an expert at creating compelling Amazon product titles that drive sales and improve search visibility."
+
+TITLE_PROMPT_TEMPLATE = """Generate Amazon product titles from descriptions. Follow these examples:
+
+    {# Built-in few-shot examples #}
+    {% set builtin_examples = [
+      {
+        'Bullet Points': 'Wireless Bluetooth headphones with active noise cancellation, 30-hour battery life, premium leather ear cushions, compatible with iPhone and Android devices, includes carrying case',
+        'Title': 'Wireless Bluetooth Headphones with Active Noise Cancelling, 30H Battery Life, Premium Leather Cushions - Compatible iPhone Android with Carrying Case'
+      },
+      {
+        'Bullet Points': 'Stainless steel water bottle, double wall vacuum insulated, keeps drinks cold 24 hours hot 12 hours, leak-proof design, 32 oz capacity, BPA free, available in multiple colors',
+        'Title': 'Stainless Steel Water Bottle 32oz - Double Wall Vacuum Insulated, Keeps Cold 24H Hot 12H, Leak-Proof BPA Free'
+      },
+      {
+        'Bullet Points': 'Gaming mechanical keyboard with RGB backlighting, blue switches, anti-ghosting technology, aluminum frame, detachable USB-C cable, compatible with PC Mac',
+        'Title': 'Gaming Mechanical Keyboard RGB Backlit Blue Switches - Anti-Ghosting Aluminum Frame, Detachable USB-C Cable PC Mac Compatible'
+      },
+      {
+        'Bullet Points': 'Yoga mat non-slip surface, eco-friendly TPE material, 6mm thick extra cushioning, lightweight portable design, includes carrying strap, 72 inch length',
+        'Title': 'Yoga Mat Non-Slip 6mm Thick Extra Cushion - Eco-Friendly TPE Material 72" Lightweight Portable with Carrying Strap'
+      },
+      {
+        'Bullet Points': 'Smart fitness tracker with heart rate monitor, sleep tracking, waterproof IP68 rating, 7-day battery life, step counter, smartphone notifications',
+        'Title': 'Smart Fitness Tracker Heart Rate Monitor Sleep Tracking - Waterproof IP68, 7-Day Battery, Step Counter Smartphone Notifications'
+      }
+    ] %}
+
+    {% for example in builtin_examples %}
+    Example {{ loop.index }}:
+    Description: {{ example['Bullet Points'] }}
+    Title: {{ example['Title'] }}
+
+    {% endfor %}
+
+    {# Additional custom examples if provided #}
+    {% if examples %}
+    {% for example in examples[:5] %}
+    Example {{ loop.index + builtin_examples|length }}:
+    Description: {{ example['Bullet Points'] }}
+    Title: {{ example['Title'] }}
+
+    {% endfor %}
+    {% endif %}
+
+    {# Competitor keyword index, used instead of raw competitor examples #}
+    {% if keywords %}
+    High-value competitor keywords for this product (most used first): {{ keywords|join(', ') }}
+    {% endif %}
+    {% if title_pattern %}
+    Typical competitor title: {{ title_pattern }}
+    {% endif %}
+
+    Guidelines:
+    - Keep titles under 200 characters, with critical keywords in the first 80 characters.
+    {% if packed %}
+    - Each product lists old-title keywords missing from its description; MUST include them within the first 80 characters.
+    {% elif missing_keywords %}
+    - MUST include these keywords, missing from the description, within the first 80 characters: {{ missing_keywords|join(', ') }}.
+    {% endif %}
+    - Avoid brand names like Ledsone.
+    - Must include the shape and pack details if available.
+    - Avoid using synonyms (e.g., 'retro' and 'vintage' are synonyms).
+    - The first 80 characters should provide a clear description of the product; avoid compatibility information.
+    - Generate Amazon specific title considering above instructions.
+
+"""
+
+_SINGLE_PRODUCT_TAIL = """    Reply with the title only, on one line, without quotes, labels or explanations.
+
+    Now generate a title for:
+    Description: {{ description }}
+    Title:"""
+
+# Several products in one request: the examples and guidelines above are sent once
+_PACKED_PRODUCTS_TAIL = """    Now generate one title for each of the following products.
+    {% for item in items %}
+    Product {{ loop.index }}:
+    {% if item['missing_keywords'] %}
+    Missing keywords: {{ item['missing_keywords']|join(', ') }}
+    {% endif %}
+    Description: {{ item['description'] }}
+    {% endfor %}
+
+    Respond with only a JSON array of {{ items|length }} title strings, in product order."""
+
+# One product, one title per marketplace: the description and examples are sent once
+_MARKETPLACES_TAIL = """    Write one title for each of these Amazon marketplaces, in the marketplace's language:
+    {% for marketplace in marketplaces %}
+    - {{ marketplace['code'] }}: {{ marketplace['language'] }}
+    {% endfor %}
+    Translate keywords the way shoppers search for them in that language rather than word for word; keep sizes, pack details and model numbers unchanged.
+
+    Now generate the titles for:
+    Description: {{ description }}
+
+    Respond with only a JSON object mapping each marketplace code to its title."""
+
+PACKED_PROMPT_TEMPLATE = TITLE_PROMPT_TEMPLATE + _PACKED_PRODUCTS_TAIL
+MARKETPLACES_PROMPT_TEMPLATE = TITLE_PROMPT_TEMPLATE + _MARKETPLACES_TAIL
+TITLE_PROMPT_TEMPLATE = TITLE_PROMPT_TEMPLATE + _SINGLE_PRODUCT_TAIL
+
+# Changes whenever the prompt template changes; part of each row fingerprint
+PROMPT_VERSION = hashlib.sha256(TITLE_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:12]
+# The same for multi-marketplace rows, whose prompt also depends on the marketplace languages
+MARKETPLACES_PROMPT_VERSION = hashlib.sha256(
+    (MARKETPLACES_PROMPT_TEMPLATE + json.dumps(MARKETPLACES, sort_keys=True)).encode('utf-8')
+).hexdigest()[:12]
+
+_TEMPLATE = Template(TITLE_PROMPT_TEMPLATE)
+_PACKED_TEMPLATE = Template(PACKED_PROMPT_TEMPLATE)
+_MARKETPLACES_TEMPLATE = Template(MARKETPLACES_PROMPT_TEMPLATE)
+
+def missing_pack_phrases(old_title: str, description: str) -> List[str]:
+    """'pack of N' for pack sizes in the old title that the description doesn't state"""
+    return [f"pack of {size}" for size in sorted(pack_sizes(old_title) - pack_sizes(description), key=int)]
+
+def create_prompt(old_title: str, description: str, examples: List[Dict] = None,
+                  keywords: List[str] = None, title_pattern: str = None,
+                  missing_keywords: List[str] = None, marketplaces: List[str] = None) -> str:
+    """Create a few-shot prompt with examples (or competitor keywords) using Jinja2 template
+
+    missing_keywords are the old-title keywords the description lacks; batch
+    callers precompute them for the whole sheet, otherwise they are computed here.
+    With marketplaces (codes from MARKETPLACES), the prompt asks for one title
+    per marketplace as a JSON object instead of a single title.
+    """
+    if missing_keywords is None:
+        missing_keywords = missing_title_keywords(old_title, description)
+    missing_keywords = list(missing_keywords) + missing_pack_phrases(old_title, description)
+
+    template = _MARKETPLACES_TEMPLATE if marketplaces else _TEMPLATE
+    prompt = template.render(
+        old_title=old_title or '',
+        description=description or '',
+        examples=examples or [],
+        keywords=keywords or [],
+        title_pattern=title_pattern or '',
+        missing_keywords=missing_keywords,
+        marketplaces=[{'code': code, **MARKETPLACES[code]} for code in marketplaces or ()]
+    )
+    return prompt
+
+def create_packed_prompt(items: List[Dict], examples: List[Dict] = None) -> str:
+    """One prompt asking for a title per item ({'old_title', 'description'})"""
+    old_titles = [item.get('old_title', '') for item in items]
+    descriptions = [item.get('description', '') for item in items]
+    missing = [
+        keywords + missing_pack_phrases(old_title, description)
+        for keywords, old_title, description in zip(
+            missing_title_keywords_batch(old_titles, descriptions), old_titles, descriptions
+        )
+    ]
+    return _PACKED_TEMPLATE.render(
+        packed=True,
+        items=[{**item, 'missing_keywords': keywords} for item, keywords in zip(items, missing)],
+        examples=examples or [],
+        keywords=[],
+        title_pattern=''
+    )
+
+def parse_packed_titles(text: str, expected: int) -> List[str]:
+    """Titles from a packed response; raises ValueError if the list is missing or the wrong size"""
+    start, end = text.find('['), text.rfind(']')
+    if start == -1 or end <= start:
+        raise ValueError("Packed response contains no JSON array")
+    titles = json.loads(text[start:end + 1])
+    if not isinstance(titles, list) or len(titles) != expected:
+        raise ValueError(f"Expected {expected} titles, got {len(titles) if isinstance(titles, list) else 'none'}")
+    return [strip_title_framing(str(title)) for title in titles]
+
+def parse_marketplace_titles(text: str, marketplaces: List[str]) -> Dict[str, str]:
+    """Title per marketplace from a multi-marketplace response; raises ValueError if any is missing"""
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        raise ValueError("Marketplace response contains no JSON object")
+    titles = json.loads(text[start:end + 1])
+    if not isinstance(titles, dict):
+        raise ValueError("Marketplace response is not a JSON object")
+    titles = {str(code).strip().upper(): title for code, title in titles.items()}
+    missing = [code for code in marketplaces if not isinstance(titles.get(code), str)]
+    if missing:
+        raise ValueError(f"No title for marketplaces {missing}")
+    return {code: strip_title_framing(titles[code]) for code in marketplaces}
+
+def strip_title_framing(text: str) -> str:
+    """The bare title from a completion: no label lines, "Title:" prefixes or wrapping quotes"""
+    lines = [line.strip() for line in (text or '').splitlines() if line.strip()]
+    # A line such as "Here is the title:" announces the title on the next line
+    lines = [line for line in lines if not line.endswith(':')] or lines
+    title = _FRAMING_PREFIX.sub('', lines[0]) if lines else ''
+    # Strip matching pairs only, so a trailing inch mark (72") survives
+    while len(title) > 1 and _QUOTE_PAIRS.get(title[0]) == title[-1]:
+        title = title[1:-1].strip()
+    return title
+
+def calculate_cost(input_tokens: int, output_tokens: int, model: str = DEFAULT_MODEL) -> float:
+    """USD cost of a completion (unknown models are priced as gpt-4o-mini)"""
+    input_cost, output_cost = MODEL_PRICING.get(model, MODEL_PRICING[DEFAULT_MODEL])
+    return (
+        (input_tokens / 1000000) * input_cost +
+        (output_tokens / 1000000) * output_cost
+    )
+
+def build_messages(prompt: str) -> List[Dict]:
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def request_title(old_title: str, description: str, examples: List[Dict] = None,
+                  temperature: float = 1, model: str = DEFAULT_MODEL, timeout: float = 30,
+                  backend: str = None, prompt_vars: Dict = None) -> tuple:
+    """Generate one title; returns (title, cost, input_tokens, output_tokens) and raises on API errors
+
+    prompt_vars are extra create_prompt arguments, e.g. keywords and title_pattern.
+    """
+    prompt = create_prompt(old_title, description, examples, **(prompt_vars or {}))
+    return request_completion(prompt, temperature, model, timeout, backend)
+
+def request_completion(prompt: str, temperature: float = 1, model: str = DEFAULT_MODEL,
+                       timeout: float = 30, backend: str = None) -> tuple:
+    """Title for an already rendered prompt; returns (title, cost, input_tokens, output_tokens)"""
+    text, cost, input_tokens, output_tokens = complete_and_record(
+        get_backend(backend), build_messages(prompt), model, temperature=temperature,
+        max_tokens=TITLE_MAX_TOKENS, timeout=timeout, stop=TITLE_STOP_SEQUENCES
+    )
+    return strip_title_framing(text), cost, input_tokens, output_tokens
+
+def complete_and_record(completion_backend, messages: List[Dict], model: str,
+                        marketplaces: List[str] = None, **params) -> tuple:
+    """(text, cost, input_tokens, output_tokens) from a backend; every attempt goes into the usage ledger
+
+    A completion for several marketplaces is recorded once per marketplace.
+    """
+    start = time.monotonic()
+    try:
+        text, input_tokens, output_tokens = completion_backend.complete(messages, model, **params)
+    except Exception:
+        if completion_backend.records_usage:
+            record_usage(completion_backend.name, model, 0, 0, 0.0, time.monotonic() - start, ok=False,
+                         marketplaces=marketplaces)
+        raise
+
+    # Local backends are free to run
+    cost = calculate_cost(input_tokens, output_tokens, model) if completion_backend.billable else 0.0
+    if completion_backend.records_usage:
+        record_usage(completion_backend.name, model, input_tokens, output_tokens, cost, time.monotonic() - start,
+                     marketplaces=marketplaces)
+    return text, cost, input_tokens, output_tokens
+
+def request_titles_packed(items: List[Dict], examples: List[Dict] = None, temperature: float = 1,
+                          model: str = DEFAULT_MODEL, timeout: float = 30, backend: str = None) -> List[tuple]:
+    """Generate titles for several items in one completion
+
+    Returns one (title, cost, input_tokens, output_tokens) per item, with the
+    shared usage split evenly. Raises ValueError if the response can't be parsed.
+    """
+    prompt = create_packed_prompt(items, examples)
+
+    text, cost, input_tokens, output_tokens = complete_and_record(
+        get_backend(backend), build_messages(prompt), model, temperature=temperature,
+        # Per title: the title budget plus its JSON quotes and separator
+        max_tokens=(TITLE_MAX_TOKENS + 4) * len(items) + 4, timeout=timeout
+    )
+    titles = parse_packed_titles(text, len(items))
+
+    n = len(items)
+    return [(title, cost / n, input_tokens / n, output_tokens / n) for title in titles]
+
+def request_marketplace_titles(old_title: str, description: str, marketplaces: List[str],
+                               examples: List[Dict] = None, temperature: float = 1,
+                               model: str = DEFAULT_MODEL, timeout: float = 30, backend: str = None,
+                               prompt_vars: Dict = None) -> tuple:
+    """One title per marketplace from a single completion
+
+    Returns ({code: title}, cost, input_tokens, output_tokens); the shared
+    description and examples are paid for once rather than once per locale.
+    Raises ValueError if the response can't be parsed.
+    """
+    prompt = create_prompt(old_title, description, examples, marketplaces=marketplaces, **(prompt_vars or {}))
+    # Per marketplace: its title budget plus the JSON key, quotes and separators
+    max_tokens = sum(
+        math.ceil(TITLE_MAX_TOKENS * (1 if MARKETPLACES[code]['english'] else NON_ENGLISH_TOKEN_FACTOR)) + 8
+        for code in marketplaces
+    ) + 4
+
+    text, cost, input_tokens, output_tokens = complete_and_record(
+        get_backend(backend), build_messages(prompt), model, marketplaces=marketplaces,
+        temperature=temperature, max_tokens=max_tokens, timeout=timeout
+    )
+    return parse_marketplace_titles(text, marketplaces), cost, input_tokens, output_tokens